@@ -67,6 +67,8 @@ class BaseSoC(SoCCore):
                 origin                  = self.mem_map["main_ram"],
                 size                    = kwargs.get("max_sdram_size", 0x40000000),
                 l2_cache_size           = kwargs.get("l2_size", 8192),
+                l2_cache_ways           = kwargs.get("l2_ways", 1),
+                l2_cache_replacement    = kwargs.get("l2_replacement", "lru"),
                 l2_cache_min_data_width = kwargs.get("min_l2_data_width", 128),
                 l2_cache_reverse        = True
             )
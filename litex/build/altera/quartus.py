@@ -172,50 +172,46 @@ class AlteraQuartusToolchain:
         **kwargs):
 
         # Create build directory
-        cwd = os.getcwd()
         os.makedirs(build_dir, exist_ok=True)
-        os.chdir(build_dir)
-
-        # Finalize design
-        if not isinstance(fragment, _Fragment):
-            fragment = fragment.get_fragment()
-        platform.finalize(fragment)
-
-        # Generate verilog
-        v_output = platform.get_verilog(fragment, name=build_name, **kwargs)
-        named_sc, named_pc = platform.resolve_signals(v_output.ns)
-        v_file = build_name + ".v"
-        v_output.write(v_file)
-        platform.add_source(v_file)
-
-        # Generate design timing constraints file (.sdc)
-        _build_sdc(
-            clocks                  = self.clocks,
-            false_paths             = self.false_paths,
-            vns                     = v_output.ns,
-            named_sc                = named_sc,
-            build_name              = build_name,
-            additional_sdc_commands = self.additional_sdc_commands)
-
-        # Generate design project and location constraints file (.qsf)
-        _build_qsf(
-            device                  = platform.device,
-            ips                     = platform.ips,
-            sources                 = platform.sources,
-            vincpaths               = platform.verilog_include_paths,
-            named_sc                = named_sc,
-            named_pc                = named_pc,
-            build_name              = build_name,
-            additional_qsf_commands = self.additional_qsf_commands)
-
-        # Generate build script
-        script = _build_script(build_name, platform.create_rbf)
-
-        # Run
-        if run:
-            _run_script(script)
-
-        os.chdir(cwd)
+        with tools.chdir(build_dir):
+            # Finalize design
+            if not isinstance(fragment, _Fragment):
+                fragment = fragment.get_fragment()
+            platform.finalize(fragment)
+
+            # Generate verilog
+            v_output = platform.get_verilog(fragment, name=build_name, **kwargs)
+            named_sc, named_pc = platform.resolve_signals(v_output.ns)
+            v_file = build_name + ".v"
+            v_output.write(v_file)
+            platform.add_source(v_file)
+
+            # Generate design timing constraints file (.sdc)
+            _build_sdc(
+                clocks                  = self.clocks,
+                false_paths             = self.false_paths,
+                vns                     = v_output.ns,
+                named_sc                = named_sc,
+                build_name              = build_name,
+                additional_sdc_commands = self.additional_sdc_commands)
+
+            # Generate design project and location constraints file (.qsf)
+            _build_qsf(
+                device                  = platform.device,
+                ips                     = platform.ips,
+                sources                 = platform.sources,
+                vincpaths               = platform.verilog_include_paths,
+                named_sc                = named_sc,
+                named_pc                = named_pc,
+                build_name              = build_name,
+                additional_qsf_commands = self.additional_qsf_commands)
+
+            # Generate build script
+            script = _build_script(build_name, platform.create_rbf)
+
+            # Run
+            if run:
+                _run_script(script)
 
         return v_output.ns
 
@@ -159,41 +159,37 @@ class LatticeIceStormToolchain:
 
         # Create build directory
         os.makedirs(build_dir, exist_ok=True)
-        cwd = os.getcwd()
-        os.chdir(build_dir)
+        with tools.chdir(build_dir):
+            # Finalize design
+            if not isinstance(fragment, _Fragment):
+                fragment = fragment.get_fragment()
+            platform.finalize(fragment)
 
-        # Finalize design
-        if not isinstance(fragment, _Fragment):
-            fragment = fragment.get_fragment()
-        platform.finalize(fragment)
+            # Generate verilog
+            v_output = platform.get_verilog(fragment, name=build_name, **kwargs)
+            named_sc, named_pc = platform.resolve_signals(v_output.ns)
+            v_file = build_name + ".v"
+            v_output.write(v_file)
+            platform.add_source(v_file)
 
-        # Generate verilog
-        v_output = platform.get_verilog(fragment, name=build_name, **kwargs)
-        named_sc, named_pc = platform.resolve_signals(v_output.ns)
-        v_file = build_name + ".v"
-        v_output.write(v_file)
-        platform.add_source(v_file)
+            # Generate design io constraints file (.pcf)
+            tools.write_to_file(build_name + ".pcf",_build_pcf(named_sc, named_pc))
 
-        # Generate design io constraints file (.pcf)
-        tools.write_to_file(build_name + ".pcf",_build_pcf(named_sc, named_pc))
+            # Generate design timing constraints file (in pre_pack file)
+            tools.write_to_file(build_name + "_pre_pack.py", _build_pre_pack(v_output.ns, self.clocks))
 
-        # Generate design timing constraints file (in pre_pack file)
-        tools.write_to_file(build_name + "_pre_pack.py", _build_pre_pack(v_output.ns, self.clocks))
+            # Generate Yosys script
+            _build_yosys(self.yosys_template, platform, build_name, synth_opts=synth_opts)
 
-        # Generate Yosys script
-        _build_yosys(self.yosys_template, platform, build_name, synth_opts=synth_opts)
+            # Translate device to Nextpnr architecture/package
+            (family, architecture, package) = parse_device(platform.device)
 
-        # Translate device to Nextpnr architecture/package
-        (family, architecture, package) = parse_device(platform.device)
+            # Generate build script
+            script = _build_script(self.build_template, build_name, architecture, package, timingstrict)
 
-        # Generate build script
-        script = _build_script(self.build_template, build_name, architecture, package, timingstrict)
-
-        # Run
-        if run:
-            _run_script(script)
-
-        os.chdir(cwd)
+            # Run
+            if run:
+                _run_script(script)
 
         return v_output.ns
 
@@ -186,40 +186,36 @@ class LatticeTrellisToolchain:
 
         # Create build directory
         os.makedirs(build_dir, exist_ok=True)
-        cwd = os.getcwd()
-        os.chdir(build_dir)
-
-        # Finalize design
-        if not isinstance(fragment, _Fragment):
-            fragment = fragment.get_fragment()
-        platform.finalize(fragment)
-
-        # Generate verilog
-        v_output = platform.get_verilog(fragment, name=build_name, **kwargs)
-        named_sc, named_pc = platform.resolve_signals(v_output.ns)
-        top_file = build_name + ".v"
-        v_output.write(top_file)
-        platform.add_source(top_file)
-
-        # Generate design constraints file (.lpf)
-        _build_lpf(named_sc, named_pc, build_name)
-
-        # Generate Yosys script
-        _build_yosys(self.yosys_template, platform, nowidelut, build_name)
-
-        # Translate device to Nextpnr architecture/package/speed_grade
-        (family, size, speed_grade, package) = nextpnr_ecp5_parse_device(platform.device)
-        architecture = nextpnr_ecp5_architectures[(family + "-" + size)]
-
-        # Generate build script
-        script = _build_script(False, self.build_template, build_name, architecture, package,
-            speed_grade, timingstrict, ignoreloops)
-
-        # Run
-        if run:
-            _run_script(script)
-
-        os.chdir(cwd)
+        with tools.chdir(build_dir):
+            # Finalize design
+            if not isinstance(fragment, _Fragment):
+                fragment = fragment.get_fragment()
+            platform.finalize(fragment)
+
+            # Generate verilog
+            v_output = platform.get_verilog(fragment, name=build_name, **kwargs)
+            named_sc, named_pc = platform.resolve_signals(v_output.ns)
+            top_file = build_name + ".v"
+            v_output.write(top_file)
+            platform.add_source(top_file)
+
+            # Generate design constraints file (.lpf)
+            _build_lpf(named_sc, named_pc, build_name)
+
+            # Generate Yosys script
+            _build_yosys(self.yosys_template, platform, nowidelut, build_name)
+
+            # Translate device to Nextpnr architecture/package/speed_grade
+            (family, size, speed_grade, package) = nextpnr_ecp5_parse_device(platform.device)
+            architecture = nextpnr_ecp5_architectures[(family + "-" + size)]
+
+            # Generate build script
+            script = _build_script(False, self.build_template, build_name, architecture, package,
+                speed_grade, timingstrict, ignoreloops)
+
+            # Run
+            if run:
+                _run_script(script)
 
         return v_output.ns
 
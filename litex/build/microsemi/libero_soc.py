@@ -242,46 +242,43 @@ class MicrosemiLiberoSoCPolarfireToolchain:
             **kwargs):
 
         # Create build directory
+        build_dir = os.path.abspath(build_dir)
         os.makedirs(build_dir, exist_ok=True)
-        cwd = os.getcwd()
-        os.chdir(build_dir)
-
-        # Finalize design
-        if not isinstance(fragment, _Fragment):
-            fragment = fragment.get_fragment()
-        platform.finalize(fragment)
-
-        # Generate verilog
-        v_output = platform.get_verilog(fragment, name=build_name, **kwargs)
-        named_sc, named_pc = platform.resolve_signals(v_output.ns)
-        top_file = build_name + ".v"
-        v_output.write(top_file)
-        platform.add_source(top_file)
-
-        # Generate design script file (.tcl)
-        _build_tcl(platform, platform.sources, build_dir, build_name)
-
-        # Generate design io constraints file (.pdc)
-        _build_io_pdc(named_sc, named_pc, build_name, self.additional_io_constraints)
-
-        # Generate design placement constraints file (.pdc)
-        _build_fp_pdc(build_name, self.additional_fp_constraints)
-
-        # Generate design timing constraints file (.sdc)
-        _build_timing_sdc(v_output.ns, self.clocks, self.false_paths, build_name,
-            self.additional_timing_constraints)
-
-        # Generate build script
-        script = _build_script(build_name, platform.device)
-
-        # Run
-        if run:
-            # Delete previous impl
-            if os.path.exists("impl"):
-                shutil.rmtree("impl")
-            _run_script(script)
-
-        os.chdir(cwd)
+        with tools.chdir(build_dir):
+            # Finalize design
+            if not isinstance(fragment, _Fragment):
+                fragment = fragment.get_fragment()
+            platform.finalize(fragment)
+
+            # Generate verilog
+            v_output = platform.get_verilog(fragment, name=build_name, **kwargs)
+            named_sc, named_pc = platform.resolve_signals(v_output.ns)
+            top_file = build_name + ".v"
+            v_output.write(top_file)
+            platform.add_source(top_file)
+
+            # Generate design script file (.tcl)
+            _build_tcl(platform, platform.sources, build_dir, build_name)
+
+            # Generate design io constraints file (.pdc)
+            _build_io_pdc(named_sc, named_pc, build_name, self.additional_io_constraints)
+
+            # Generate design placement constraints file (.pdc)
+            _build_fp_pdc(build_name, self.additional_fp_constraints)
+
+            # Generate design timing constraints file (.sdc)
+            _build_timing_sdc(v_output.ns, self.clocks, self.false_paths, build_name,
+                self.additional_timing_constraints)
+
+            # Generate build script
+            script = _build_script(build_name, platform.device)
+
+            # Run
+            if run:
+                # Delete previous impl
+                if os.path.exists("impl"):
+                    shutil.rmtree("impl")
+                _run_script(script)
 
         return v_output.ns
 
@@ -177,45 +177,42 @@ class SimVerilatorToolchain:
 
         # create build directory
         os.makedirs(build_dir, exist_ok=True)
-        os.chdir(build_dir)
-
-        if build:
-            # finalize design
-            if not isinstance(fragment, _Fragment):
-                fragment = fragment.get_fragment()
-            platform.finalize(fragment)
-
-            # generate top module
-            top_output = platform.get_verilog(fragment,
-                name=build_name, dummy_signal=False, regular_comb=False, blocking_assign=True)
-            named_sc, named_pc = platform.resolve_signals(top_output.ns)
-            top_file = build_name + ".v"
-            top_output.write(top_file)
-            platform.add_source(top_file)
-
-            # generate cpp header/main/variables
-            _generate_sim_h(platform)
-            _generate_sim_cpp(platform, trace, trace_start, trace_end)
-            _generate_sim_variables(platform.verilog_include_paths)
-
-            # generate sim config
-            if sim_config:
-                _generate_sim_config(sim_config)
-
-            # build
-            _build_sim(build_name, platform.sources, threads, coverage, opt_level, trace_fst)
-
-        # run
-        if run:
-            _compile_sim(build_name, verbose)
-            run_as_root = False
-            if sim_config.has_module("ethernet"):
-                run_as_root = True
-            if sim_config.has_module("xgmii_ethernet"):
-                run_as_root = True
-            _run_sim(build_name, as_root=run_as_root)
-
-        os.chdir("../../")
+        with tools.chdir(build_dir):
+            if build:
+                # finalize design
+                if not isinstance(fragment, _Fragment):
+                    fragment = fragment.get_fragment()
+                platform.finalize(fragment)
+
+                # generate top module
+                top_output = platform.get_verilog(fragment,
+                    name=build_name, dummy_signal=False, regular_comb=False, blocking_assign=True)
+                named_sc, named_pc = platform.resolve_signals(top_output.ns)
+                top_file = build_name + ".v"
+                top_output.write(top_file)
+                platform.add_source(top_file)
+
+                # generate cpp header/main/variables
+                _generate_sim_h(platform)
+                _generate_sim_cpp(platform, trace, trace_start, trace_end)
+                _generate_sim_variables(platform.verilog_include_paths)
+
+                # generate sim config
+                if sim_config:
+                    _generate_sim_config(sim_config)
+
+                # build
+                _build_sim(build_name, platform.sources, threads, coverage, opt_level, trace_fst)
+
+            # run
+            if run:
+                _compile_sim(build_name, verbose)
+                run_as_root = False
+                if sim_config.has_module("ethernet"):
+                    run_as_root = True
+                if sim_config.has_module("xgmii_ethernet"):
+                    run_as_root = True
+                _run_sim(build_name, as_root=run_as_root)
 
         if build:
             return top_output.ns
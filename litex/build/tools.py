@@ -12,6 +12,19 @@ import sys
 import ctypes
 import time
 import datetime
+import functools
+from contextlib import contextmanager
+
+
+@contextmanager
+def chdir(path):
+    """Run a build step from `path`, the working directory is always restored (even on errors)."""
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
 
 
 def language_by_filename(name):
@@ -99,36 +112,78 @@ else:
     def cygpath(p):
         return p
 
-def get_migen_git_revision():
-    import migen
-    d = os.getcwd()
-    os.chdir(os.path.dirname(migen.__file__))
+# Provenance ---------------------------------------------------------------------------------------
+
+# Git revisions and build time are looked up once per process and shared by all the exporters and
+# toolchains. For reproducible outputs, the build time is taken from SOURCE_DATE_EPOCH when set and
+# set_reproducible()/reproducible_outputs() remove it from the banners.
+
+_build_time   = None
+_reproducible = False
+
+@functools.lru_cache(maxsize=None)
+def _get_git_revision(directory):
     try:
         r = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                cwd=directory,
                 stderr=subprocess.DEVNULL)[:-1].decode("utf-8")
     except:
         r = "--------"
-    os.chdir(d)
     return r
 
+def get_migen_git_revision():
+    import migen
+    return _get_git_revision(os.path.dirname(migen.__file__))
+
 def get_litex_git_revision():
     import litex
-    d = os.getcwd()
-    os.chdir(os.path.dirname(litex.__file__))
+    return _get_git_revision(os.path.dirname(litex.__file__))
+
+def get_build_time():
+    if _build_time is None:
+        set_build_time()
+    return _build_time
+
+def set_build_time(t=None):
+    """Capture the build time (now, or SOURCE_DATE_EPOCH when set), used until the next call."""
+    global _build_time
+    if t is None:
+        t = float(os.environ.get("SOURCE_DATE_EPOCH", time.time()))
+    _build_time = t
+
+def set_reproducible(reproducible=True):
+    global _reproducible
+    _reproducible = reproducible
+
+def is_reproducible():
+    return _reproducible
+
+@contextmanager
+def reproducible_outputs(reproducible=True):
+    """Set reproducible outputs for the files generated in the block, the previous setting is
+    restored on exit."""
+    global _reproducible
+    previous = _reproducible
+    _reproducible = reproducible
     try:
-        r = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
-                stderr=subprocess.DEVNULL)[:-1].decode("utf-8")
-    except:
-        r = "--------"
-    os.chdir(d)
-    return r
+        yield
+    finally:
+        _reproducible = previous
+
+def format_build_time(with_time=True):
+    fmt = "%Y-%m-%d %H:%M:%S" if with_time else "%Y-%m-%d"
+    if "SOURCE_DATE_EPOCH" in os.environ:
+        return datetime.datetime.fromtimestamp(get_build_time(), datetime.timezone.utc).strftime(fmt)
+    return datetime.datetime.fromtimestamp(get_build_time()).strftime(fmt)
 
 def generated_banner(line_comment="//"):
     r = line_comment + "-"*80 + "\n"
-    r += line_comment + " Auto-generated by Migen ({}) & LiteX ({}) on ".format(
+    r += line_comment + " Auto-generated by Migen ({}) & LiteX ({})".format(
         get_migen_git_revision(),
         get_litex_git_revision())
-    r += "{}\n".format(datetime.datetime.fromtimestamp(time.time()).strftime("%Y-%m-%d %H:%M:%S"))
+    if not _reproducible:
+        r += " on {}".format(format_build_time())
+    r += "\n"
     r += line_comment + "-"*80 + "\n"
     return r
 
@@ -189,16 +189,13 @@ class XilinxISEToolchain:
 
         # Create build directory
         os.makedirs(build_dir, exist_ok=True)
-        cwd = os.getcwd()
-        os.chdir(build_dir)
+        with tools.chdir(build_dir):
+            # Finalize design
+            if not isinstance(fragment, _Fragment):
+                fragment = fragment.get_fragment()
+            platform.finalize(fragment)
 
-        # Finalize design
-        if not isinstance(fragment, _Fragment):
-            fragment = fragment.get_fragment()
-        platform.finalize(fragment)
-
-        vns = None
-        try:
+            vns = None
             if mode in ["xst", "yosys", "cpld"]:
                 # Generate verilog
                 v_output = platform.get_verilog(fragment, name=build_name, **kwargs)
@@ -234,8 +231,6 @@ class XilinxISEToolchain:
             # Run ISE
             if run:
                 _run_ise(build_name, isemode, self.ngdbuild_opt, self, platform)
-        finally:
-            os.chdir(cwd)
 
         return vns
 
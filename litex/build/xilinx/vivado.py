@@ -296,44 +296,40 @@ class XilinxVivadoToolchain:
 
         # Create build directory
         os.makedirs(build_dir, exist_ok=True)
-        cwd = os.getcwd()
-        os.chdir(build_dir)
-
-        # Finalize design
-        if not isinstance(fragment, _Fragment):
-            fragment = fragment.get_fragment()
-        platform.finalize(fragment)
-
-        # Generate timing constraints
-        self._build_clock_constraints(platform)
-        self._build_false_path_constraints(platform)
-
-        # Generate verilog
-        v_output = platform.get_verilog(fragment, name=build_name, **kwargs)
-        named_sc, named_pc = platform.resolve_signals(v_output.ns)
-        v_file = build_name + ".v"
-        v_output.write(v_file)
-        platform.add_source(v_file)
-
-        # Generate design project (.tcl)
-        self._build_tcl(
-            platform   = platform,
-            build_name = build_name,
-            synth_mode = synth_mode,
-            enable_xpm = enable_xpm
-        )
-
-        # Generate design constraints (.xdc)
-        tools.write_to_file(build_name + ".xdc", _build_xdc(named_sc, named_pc))
-
-        # Run
-        if run:
-            if synth_mode == "yosys":
-                common._run_yosys(platform.device, platform.sources, platform.verilog_include_paths, build_name)
-            script = _build_script(build_name)
-            _run_script(script)
-
-        os.chdir(cwd)
+        with tools.chdir(build_dir):
+            # Finalize design
+            if not isinstance(fragment, _Fragment):
+                fragment = fragment.get_fragment()
+            platform.finalize(fragment)
+
+            # Generate timing constraints
+            self._build_clock_constraints(platform)
+            self._build_false_path_constraints(platform)
+
+            # Generate verilog
+            v_output = platform.get_verilog(fragment, name=build_name, **kwargs)
+            named_sc, named_pc = platform.resolve_signals(v_output.ns)
+            v_file = build_name + ".v"
+            v_output.write(v_file)
+            platform.add_source(v_file)
+
+            # Generate design project (.tcl)
+            self._build_tcl(
+                platform   = platform,
+                build_name = build_name,
+                synth_mode = synth_mode,
+                enable_xpm = enable_xpm
+            )
+
+            # Generate design constraints (.xdc)
+            tools.write_to_file(build_name + ".xdc", _build_xdc(named_sc, named_pc))
+
+            # Run
+            if run:
+                if synth_mode == "yosys":
+                    common._run_yosys(platform.device, platform.sources, platform.verilog_include_paths, build_name)
+                script = _build_script(build_name)
+                _run_script(script)
 
         return v_output.ns
 
@@ -14,6 +14,7 @@
 from functools import partial
 from operator import itemgetter
 import collections
+from io import StringIO
 
 from migen.fhdl.structure import *
 from migen.fhdl.structure import _Operator, _Slice, _Assign, _Fragment
@@ -66,11 +67,25 @@ def _printconstant(node):
 
 
 def _printexpr(ns, node):
-    if isinstance(node, Constant):
-        return _printconstant(node)
-    elif isinstance(node, Signal):
+    if isinstance(node, Signal):
         return ns.get_name(node), node.signed
-    elif isinstance(node, _Operator):
+    elif isinstance(node, Constant):
+        return _printconstant(node)
+    # Expressions can be shared between statements (and printed once per target in simulation
+    # mode): results are cached per node when the namespace provides a cache.
+    cache = getattr(ns, "expr_cache", None)
+    if cache is None:
+        return _printexpr_node(ns, node)
+    try:
+        return cache[id(node)][1]
+    except KeyError:
+        r = _printexpr_node(ns, node)
+        cache[id(node)] = (node, r)
+        return r
+
+
+def _printexpr_node(ns, node):
+    if isinstance(node, _Operator):
         arity = len(node.operands)
         r1, s1 = _printexpr(ns, node.operands[0])
         if arity == 1:
@@ -127,12 +142,51 @@ def _printexpr(ns, node):
         raise TypeError("Expression of unrecognized type: '{}'".format(type(node).__name__))
 
 
+def _list_targets(ns, node):
+    # Memoized list_targets: target sets are computed once per node, bottom-up. Statement lists
+    # also get a target -> statements index so that filtered printing only visits the statements
+    # driving the target.
+    cache = getattr(ns, "targets_cache", None)
+    if cache is None:
+        return list_targets(node)
+    try:
+        return cache[id(node)][1]
+    except KeyError:
+        pass
+    index = None
+    if isinstance(node, If):
+        r = _list_targets(ns, node.t) | _list_targets(ns, node.f)
+    elif isinstance(node, Case):
+        r = set()
+        for statements in node.cases.values():
+            r |= _list_targets(ns, statements)
+    elif isinstance(node, collections.abc.Iterable):
+        r = set()
+        index = dict()
+        for n in node:
+            targets = _list_targets(ns, n)
+            for t in targets:
+                index.setdefault(t, []).append(n)
+            r |= targets
+    else:
+        r = list_targets(node)
+    cache[id(node)] = (node, r, index)
+    return r
+
+
+def _filter_statements(ns, statements, target):
+    if getattr(ns, "targets_cache", None) is None:
+        return statements
+    _list_targets(ns, statements)
+    return ns.targets_cache[id(statements)][2].get(target, [])
+
+
 (_AT_BLOCKING, _AT_NONBLOCKING, _AT_SIGNAL) = range(3)
 
 
-def _printnode(ns, at, level, node, target_filter=None):
-    if target_filter is not None and target_filter not in list_targets(node):
-        return ""
+def _printnode(ns, at, level, node, out, target_filter=None):
+    if target_filter is not None and target_filter not in _list_targets(ns, node):
+        return
     elif isinstance(node, _Assign):
         if at == _AT_BLOCKING:
             assignment = " = "
@@ -142,34 +196,33 @@ def _printnode(ns, at, level, node, target_filter=None):
             assignment = " = "
         else:
             assignment = " <= "
-        return "\t"*level + _printexpr(ns, node.l)[0] + assignment + _printexpr(ns, node.r)[0] + ";\n"
-    elif isinstance(node, collections.Iterable):
-        return "".join(_printnode(ns, at, level, n, target_filter) for n in node)
+        out.write("\t"*level + _printexpr(ns, node.l)[0] + assignment + _printexpr(ns, node.r)[0] + ";\n")
+    elif isinstance(node, collections.abc.Iterable):
+        if target_filter is not None:
+            node = _filter_statements(ns, node, target_filter)
+        for n in node:
+            _printnode(ns, at, level, n, out, target_filter)
     elif isinstance(node, If):
-        r = "\t"*level + "if (" + _printexpr(ns, node.cond)[0] + ") begin\n"
-        r += _printnode(ns, at, level + 1, node.t, target_filter)
+        out.write("\t"*level + "if (" + _printexpr(ns, node.cond)[0] + ") begin\n")
+        _printnode(ns, at, level + 1, node.t, out, target_filter)
         if node.f:
-            r += "\t"*level + "end else begin\n"
-            r += _printnode(ns, at, level + 1, node.f, target_filter)
-        r += "\t"*level + "end\n"
-        return r
+            out.write("\t"*level + "end else begin\n")
+            _printnode(ns, at, level + 1, node.f, out, target_filter)
+        out.write("\t"*level + "end\n")
     elif isinstance(node, Case):
         if node.cases:
-            r = "\t"*level + "case (" + _printexpr(ns, node.test)[0] + ")\n"
+            out.write("\t"*level + "case (" + _printexpr(ns, node.test)[0] + ")\n")
             css = [(k, v) for k, v in node.cases.items() if isinstance(k, Constant)]
             css = sorted(css, key=lambda x: x[0].value)
             for choice, statements in css:
-                r += "\t"*(level + 1) + _printexpr(ns, choice)[0] + ": begin\n"
-                r += _printnode(ns, at, level + 2, statements, target_filter)
-                r += "\t"*(level + 1) + "end\n"
+                out.write("\t"*(level + 1) + _printexpr(ns, choice)[0] + ": begin\n")
+                _printnode(ns, at, level + 2, statements, out, target_filter)
+                out.write("\t"*(level + 1) + "end\n")
             if "default" in node.cases:
-                r += "\t"*(level + 1) + "default: begin\n"
-                r += _printnode(ns, at, level + 2, node.cases["default"], target_filter)
-                r += "\t"*(level + 1) + "end\n"
-            r += "\t"*level + "endcase\n"
-            return r
-        else:
-            return ""
+                out.write("\t"*(level + 1) + "default: begin\n")
+                _printnode(ns, at, level + 2, node.cases["default"], out, target_filter)
+                out.write("\t"*(level + 1) + "end\n")
+            out.write("\t"*level + "endcase\n")
     elif isinstance(node, Display):
         s = "\"" + node.s + "\""
         for arg in node.args:
@@ -178,16 +231,15 @@ def _printnode(ns, at, level, node, target_filter=None):
                 s += ns.get_name(arg)
             else:
                 s += str(arg)
-        return "\t"*level + "$display(" + s + ");\n"
+        out.write("\t"*level + "$display(" + s + ");\n")
     elif isinstance(node, Finish):
-        return "\t"*level + "$finish;\n"
+        out.write("\t"*level + "$finish;\n")
     else:
         raise TypeError("Node of unrecognized type: "+str(type(node)))
 
 
-def _list_comb_wires(f):
+def _list_comb_wires(f, groups):
     r = set()
-    groups = group_by_targets(f.comb)
     for g in groups:
         if len(g[1]) == 1 and isinstance(g[1][0], _Assign):
             r |= g[0]
@@ -218,56 +270,55 @@ def _printattr(attr, attr_translate):
 
 
 def _printheader(f, ios, name, ns, attr_translate,
-                 reg_initialization):
+                 reg_initialization, groups, out):
     sigs = list_signals(f) | list_special_ios(f, True, True, True)
     special_outs = list_special_ios(f, False, True, True)
     inouts = list_special_ios(f, False, False, True)
     targets = list_targets(f) | special_outs
-    wires = _list_comb_wires(f) | special_outs
-    r = "module " + name + "(\n"
+    wires = _list_comb_wires(f, groups) | special_outs
+    out.write("module " + name + "(\n")
     firstp = True
     for sig in sorted(ios, key=lambda x: x.duid):
         if not firstp:
-            r += ",\n"
+            out.write(",\n")
         firstp = False
         attr = _printattr(sig.attr, attr_translate)
         if attr:
-            r += "\t" + attr
+            out.write("\t" + attr)
         sig.type = "wire"
         if sig in inouts:
             sig.direction = "inout"
-            r += "\tinout " + _printsig(ns, sig)
+            out.write("\tinout " + _printsig(ns, sig))
         elif sig in targets:
             sig.direction = "output"
             if sig in wires:
-                r += "\toutput " + _printsig(ns, sig)
+                out.write("\toutput " + _printsig(ns, sig))
             else:
                 sig.type = "reg"
-                r += "\toutput reg " + _printsig(ns, sig)
+                out.write("\toutput reg " + _printsig(ns, sig))
         else:
             sig.direction = "input"
-            r += "\tinput " + _printsig(ns, sig)
-    r += "\n);\n\n"
+            out.write("\tinput " + _printsig(ns, sig))
+    out.write("\n);\n\n")
     for sig in sorted(sigs - ios, key=lambda x: x.duid):
         attr = _printattr(sig.attr, attr_translate)
         if attr:
-            r += attr + " "
+            out.write(attr + " ")
         if sig in wires:
-            r += "wire " + _printsig(ns, sig) + ";\n"
+            out.write("wire " + _printsig(ns, sig) + ";\n")
         else:
             if reg_initialization:
-                r += "reg " + _printsig(ns, sig) + " = " + _printexpr(ns, sig.reset)[0] + ";\n"
+                out.write("reg " + _printsig(ns, sig) + " = " + _printexpr(ns, sig.reset)[0] + ";\n")
             else:
-                r += "reg " + _printsig(ns, sig) + ";\n"
-    r += "\n"
-    return r
+                out.write("reg " + _printsig(ns, sig) + ";\n")
+    out.write("\n")
 
 
 def _printcomb_simulation(f, ns,
             display_run,
             dummy_signal,
-            blocking_assign):
-    r = ""
+            blocking_assign,
+            out):
     if f.comb:
         if dummy_signal:
             # Generate a dummy event to get the simulator
@@ -275,10 +326,10 @@ def _printcomb_simulation(f, ns,
             syn_off = "// synthesis translate_off\n"
             syn_on = "// synthesis translate_on\n"
             dummy_s = Signal(name_override="dummy_s")
-            r += syn_off
-            r += "reg " + _printsig(ns, dummy_s) + ";\n"
-            r += "initial " + ns.get_name(dummy_s) + " <= 1'd0;\n"
-            r += syn_on
+            out.write(syn_off)
+            out.write("reg " + _printsig(ns, dummy_s) + ";\n")
+            out.write("initial " + ns.get_name(dummy_s) + " <= 1'd0;\n")
+            out.write(syn_on)
 
 
         from collections import defaultdict
@@ -290,81 +341,72 @@ def _printcomb_simulation(f, ns,
             for t in targets:
                 target_stmt_map[t].append(statement)
 
-        groups = group_by_targets(f.comb)
-
         for n, (t, stmts) in enumerate(target_stmt_map.items()):
             assert isinstance(t, Signal)
             if len(stmts) == 1 and isinstance(stmts[0], _Assign):
-                r += "assign " + _printnode(ns, _AT_BLOCKING, 0, stmts[0])
+                out.write("assign ")
+                _printnode(ns, _AT_BLOCKING, 0, stmts[0], out)
             else:
                 if dummy_signal:
                     dummy_d = Signal(name_override="dummy_d")
-                    r += "\n" + syn_off
-                    r += "reg " + _printsig(ns, dummy_d) + ";\n"
-                    r += syn_on
+                    out.write("\n" + syn_off)
+                    out.write("reg " + _printsig(ns, dummy_d) + ";\n")
+                    out.write(syn_on)
 
-                r += "always @(*) begin\n"
+                out.write("always @(*) begin\n")
                 if display_run:
-                    r += "\t$display(\"Running comb block #" + str(n) + "\");\n"
+                    out.write("\t$display(\"Running comb block #" + str(n) + "\");\n")
                 if blocking_assign:
-                    r += "\t" + ns.get_name(t) + " = " + _printexpr(ns, t.reset)[0] + ";\n"
-                    r += _printnode(ns, _AT_BLOCKING, 1, stmts, t)
+                    out.write("\t" + ns.get_name(t) + " = " + _printexpr(ns, t.reset)[0] + ";\n")
+                    _printnode(ns, _AT_BLOCKING, 1, stmts, out, t)
                 else:
-                    r += "\t" + ns.get_name(t) + " <= " + _printexpr(ns, t.reset)[0] + ";\n"
-                    r += _printnode(ns, _AT_NONBLOCKING, 1, stmts, t)
+                    out.write("\t" + ns.get_name(t) + " <= " + _printexpr(ns, t.reset)[0] + ";\n")
+                    _printnode(ns, _AT_NONBLOCKING, 1, stmts, out, t)
                 if dummy_signal:
-                    r += syn_off
-                    r += "\t" + ns.get_name(dummy_d) + " = " + ns.get_name(dummy_s) + ";\n"
-                    r += syn_on
-                r += "end\n"
-    r += "\n"
-    return r
+                    out.write(syn_off)
+                    out.write("\t" + ns.get_name(dummy_d) + " = " + ns.get_name(dummy_s) + ";\n")
+                    out.write(syn_on)
+                out.write("end\n")
+    out.write("\n")
 
 
-def _printcomb_regular(f, ns, blocking_assign):
-    r = ""
+def _printcomb_regular(f, ns, blocking_assign, groups, out):
     if f.comb:
-        groups = group_by_targets(f.comb)
-
         for n, g in enumerate(groups):
             if len(g[1]) == 1 and isinstance(g[1][0], _Assign):
-                r += "assign " + _printnode(ns, _AT_BLOCKING, 0, g[1][0])
+                out.write("assign ")
+                _printnode(ns, _AT_BLOCKING, 0, g[1][0], out)
             else:
-                r += "always @(*) begin\n"
+                out.write("always @(*) begin\n")
                 if blocking_assign:
                     for t in g[0]:
-                        r += "\t" + ns.get_name(t) + " = " + _printexpr(ns, t.reset)[0] + ";\n"
-                    r += _printnode(ns, _AT_BLOCKING, 1, g[1])
+                        out.write("\t" + ns.get_name(t) + " = " + _printexpr(ns, t.reset)[0] + ";\n")
+                    _printnode(ns, _AT_BLOCKING, 1, g[1], out)
                 else:
                     for t in g[0]:
-                        r += "\t" + ns.get_name(t) + " <= " + _printexpr(ns, t.reset)[0] + ";\n"
-                    r += _printnode(ns, _AT_NONBLOCKING, 1, g[1])
-                r += "end\n"
-    r += "\n"
-    return r
+                        out.write("\t" + ns.get_name(t) + " <= " + _printexpr(ns, t.reset)[0] + ";\n")
+                    _printnode(ns, _AT_NONBLOCKING, 1, g[1], out)
+                out.write("end\n")
+    out.write("\n")
 
 
-def _printsync(f, ns):
-    r = ""
+def _printsync(f, ns, out):
     for k, v in sorted(f.sync.items(), key=itemgetter(0)):
-        r += "always @(posedge " + ns.get_name(f.clock_domains[k].clk) + ") begin\n"
-        r += _printnode(ns, _AT_SIGNAL, 1, v)
-        r += "end\n\n"
-    return r
+        out.write("always @(posedge " + ns.get_name(f.clock_domains[k].clk) + ") begin\n")
+        _printnode(ns, _AT_SIGNAL, 1, v, out)
+        out.write("end\n\n")
 
 
-def _printspecials(overrides, specials, ns, add_data_file, attr_translate):
-    r = ""
+def _printspecials(overrides, specials, ns, add_data_file, attr_translate, out):
     for special in sorted(specials, key=lambda x: x.duid):
         if hasattr(special, "attr"):
             attr = _printattr(special.attr, attr_translate)
             if attr:
-                r += attr + " "
+                out.write(attr + " ")
         pr = call_special_classmethod(overrides, special, "emit_verilog", ns, add_data_file)
         if pr is None:
             raise NotImplementedError("Special " + str(special) + " failed to implement emit_verilog")
-        r += pr
-    return r
+        out.write(pr)
 
 
 class DummyAttrTranslate:
@@ -418,21 +460,33 @@ def convert(f, ios=None, name="top",
     ns.clock_domains = f.clock_domains
     r.ns = ns
 
-    src = generated_banner("//")
-    src += _printheader(f, ios, name, ns, attr_translate,
-                        reg_initialization=reg_initialization)
+    # Expression/target caches, only valid for the lowered fragment.
+    ns.expr_cache = dict()
+    ns.targets_cache = dict()
+
+    groups = group_by_targets(f.comb)
+
+    out = StringIO()
+    out.write(generated_banner("//"))
+    _printheader(f, ios, name, ns, attr_translate,
+                 reg_initialization=reg_initialization,
+                 groups=groups, out=out)
     if regular_comb:
-        src += _printcomb_regular(f, ns,
-                      blocking_assign=blocking_assign)
+        _printcomb_regular(f, ns,
+                      blocking_assign=blocking_assign,
+                      groups=groups, out=out)
     else:
-        src += _printcomb_simulation(f, ns,
+        _printcomb_simulation(f, ns,
                       display_run=display_run,
                       dummy_signal=dummy_signal,
-                      blocking_assign=blocking_assign)
-    src += _printsync(f, ns)
-    src += _printspecials(special_overrides, f.specials - lowered_specials,
-        ns, r.add_data_file, attr_translate)
-    src += "endmodule\n"
+                      blocking_assign=blocking_assign,
+                      out=out)
+    _printsync(f, ns, out)
+    _printspecials(special_overrides, f.specials - lowered_specials,
+        ns, r.add_data_file, attr_translate, out)
+    out.write("endmodule\n")
+    del ns.expr_cache, ns.targets_cache
+    src = out.getvalue()
     r.set_main_source(src)
 
     return r
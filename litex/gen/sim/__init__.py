@@ -1 +1 @@
-from litex.gen.sim.core import Simulator, run_simulation, passive
+from litex.gen.sim.core import Simulator, SimulatorSnapshot, run_simulation, run_sharded, passive
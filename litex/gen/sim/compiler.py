@@ -0,0 +1,286 @@
+# License: BSD
+
+import collections
+
+from migen.fhdl.structure import *
+from migen.fhdl.structure import _Operator, _Slice, _ArrayProxy, _Assign
+from migen.fhdl.bitcontainer import value_bits_sign
+from migen.fhdl.specials import _MemoryLocation
+
+# Statements lowering --------------------------------------------------------------------------------
+
+# The compiler lowers FHDL statements to Python source code operating on the flat slot arrays of a
+# CompiledEvaluator:
+# - V: list of committed values, indexed by signal slot.
+# - M: dict of pending modifications, slot -> value.
+# Constructs that are not supported natively are delegated to the interpreting evaluator (_E) at
+# run time, so lowered code always behaves as Evaluator.execute.
+
+_binary_ops = {
+    "+":   "+",
+    "-":   "-",
+    "*":   "*",
+    ">>>": ">>",
+    "<<<": "<<",
+    "&":   "&",
+    "^":   "^",
+    "|":   "|",
+    "<":   "<",
+    "<=":  "<=",
+    "==":  "==",
+    "!=":  "!=",
+    ">":   ">",
+    ">=":  ">=",
+}
+
+
+def _truncate_code(code, nbits, signed):
+    mask = 2**nbits - 1
+    if signed and nbits:
+        sign = 2**(nbits - 1)
+        return "((({}) & {}) ^ {}) - {}".format(code, mask, sign, sign)
+    return "({}) & {}".format(code, mask)
+
+
+class _Compiler:
+    # Expressions deeper than max_depth are hoisted into temporaries (Python's parser limits
+    # nesting), Case statements with more than max_cases entries are dispatched through a table.
+    max_depth = 32
+    max_cases = 32
+
+    def __init__(self, evaluator):
+        self.evaluator = evaluator
+        self.namespace = {
+            "_E": evaluator,
+            "_V": evaluator.values,
+            "_M": evaluator.modifications,
+        }
+        self.functions = []
+        self.tables = []
+        self.ntemps = 0
+        self.nbindings = 0
+
+    def _temp(self):
+        name = "_t{}".format(self.ntemps)
+        self.ntemps += 1
+        return name
+
+    def _bind(self, obj):
+        name = "_b{}".format(self.nbindings)
+        self.nbindings += 1
+        self.namespace[name] = obj
+        return name
+
+    def _hoist(self, code, lines, level):
+        if code.isidentifier() or code.lstrip("-").isdigit():
+            return code
+        temp = self._temp()
+        lines.append("    "*level + "{} = {}".format(temp, code))
+        return temp
+
+    # Expressions ----------------------------------------------------------------------------------
+
+    def _read(self, slot, postcommit):
+        if postcommit:
+            return "M.get({0}, V[{0}])".format(slot)
+        return "V[{}]".format(slot)
+
+    def _expr(self, node, lines, level, postcommit=False):
+        code, depth = self._expr_depth(node, lines, level, postcommit)
+        return code
+
+    def _expr_depth(self, node, lines, level, postcommit):
+        code, depth = self._expr_node(node, lines, level, postcommit)
+        if depth > self.max_depth:
+            return self._hoist(code, lines, level), 0
+        return code, depth
+
+    def _expr_node(self, node, lines, level, postcommit):
+        if isinstance(node, Constant):
+            return str(node.value), 0
+        elif isinstance(node, Signal):
+            return self._read(self.evaluator.slot(node), postcommit), 0
+        elif isinstance(node, _Operator):
+            operands = [self._expr_depth(o, lines, level, postcommit) for o in node.operands]
+            depth = max(d for c, d in operands) + 1
+            codes = [c for c, d in operands]
+            if node.op in ("~", "-") and len(codes) == 1:
+                return "({}({}))".format(node.op, codes[0]), depth
+            elif node.op == "m":
+                return "({1} if {0} else {2})".format(*codes), depth
+            elif node.op in _binary_ops and len(codes) == 2:
+                return "({} {} {})".format(codes[0], _binary_ops[node.op], codes[1]), depth
+        elif isinstance(node, _Slice):
+            value, depth = self._expr_depth(node.value, lines, level, postcommit)
+            mask = 2**(node.stop - node.start) - 1
+            return "(({} >> {}) & {})".format(value, node.start, mask), depth + 1
+        elif isinstance(node, Cat):
+            codes = []
+            depth = 0
+            shift = 0
+            for element in node.l:
+                nbits = len(element)
+                code, d = self._expr_depth(element, lines, level, postcommit)
+                codes.append("(({} & {}) << {})".format(code, 2**nbits - 1, shift))
+                depth = max(depth, d)
+                shift += nbits
+            if not codes:
+                return "0", 0
+            return "({})".format(" | ".join(codes)), depth + 1
+        elif isinstance(node, Replicate):
+            nbits = len(node.v)
+            value, depth = self._expr_depth(node.v, lines, level, postcommit)
+            pattern = sum(1 << i*nbits for i in range(node.n))
+            return "(({} & {}) * {})".format(value, 2**nbits - 1, pattern), depth + 1
+        elif isinstance(node, _ArrayProxy):
+            key, depth = self._expr_depth(node.key, lines, level, postcommit)
+            key = "min({}, {})".format(len(node.choices) - 1, key)
+            if all(isinstance(choice, Signal) for choice in node.choices):
+                slots = self._bind(tuple(self.evaluator.slot(c) for c in node.choices))
+                return self._read("{}[{}]".format(slots, key), postcommit), depth + 1
+            choices = [self._expr_depth(c, lines, level, postcommit) for c in node.choices]
+            depth = max([depth] + [d for c, d in choices])
+            return "({},)[{}]".format(", ".join(c for c, d in choices), key), depth + 1
+        elif isinstance(node, _MemoryLocation):
+            array = self.evaluator.replaced_memories[node.memory]
+            slots = self._bind(tuple(self.evaluator.slot(s) for s in array))
+            index, depth = self._expr_depth(node.index, lines, level, False)
+            return self._read("{}[{}]".format(slots, index), postcommit), depth + 1
+        elif isinstance(node, ClockSignal):
+            clk = self.evaluator.clock_domains[node.cd].clk
+            return self._expr_node(clk, lines, level, postcommit)
+        elif isinstance(node, ResetSignal):
+            rst = self.evaluator.clock_domains[node.cd].rst
+            if rst is not None:
+                return self._expr_node(rst, lines, level, postcommit)
+            elif node.allow_reset_less:
+                return "0", 0
+        # Not supported natively: let the interpreter evaluate it (and raise if needed).
+        return "_E.eval({}, {})".format(self._bind(node), postcommit), 0
+
+    # Assignments ----------------------------------------------------------------------------------
+
+    def _assign(self, node, value, lines, level):
+        indent = "    "*level
+        if isinstance(node, Signal):
+            assert not node.variable
+            slot = self.evaluator.slot(node)
+            lines.append(indent + "M[{}] = {}".format(slot,
+                _truncate_code(value, node.nbits, node.signed)))
+        elif isinstance(node, Cat):
+            value = self._hoist(value, lines, level)
+            shift = 0
+            for element in node.l:
+                nbits = len(element)
+                element_value = "({} >> {}) & {}".format(value, shift, 2**nbits - 1)
+                self._assign(element, element_value, lines, level)
+                shift += nbits
+        elif isinstance(node, _Slice):
+            value = self._hoist(value, lines, level)
+            full_value = self._expr(node.value, lines, level, postcommit=True)
+            clear = ~((2**node.stop - 1) - (2**node.start - 1))
+            mask = 2**(node.stop - node.start) - 1
+            full_value = "({} & {}) | (({} & {}) << {})".format(
+                full_value, clear, value, mask, node.start)
+            self._assign(node.value, full_value, lines, level)
+        elif isinstance(node, _ArrayProxy):
+            if (all(isinstance(choice, Signal) for choice in node.choices) and
+                len(set((c.nbits, c.signed, c.variable) for c in node.choices)) == 1):
+                assert not node.choices[0].variable
+                slots = self._bind(tuple(self.evaluator.slot(c) for c in node.choices))
+                key = self._expr(node.key, lines, level)
+                lines.append(indent + "M[{}[min({}, {})]] = {}".format(slots,
+                    len(node.choices) - 1, key,
+                    _truncate_code(value, node.choices[0].nbits, node.choices[0].signed)))
+                return
+            value = self._hoist(value, lines, level)
+            key = self._temp()
+            lines.append(indent + "{} = min({}, {})".format(
+                key, len(node.choices) - 1, self._expr(node.key, lines, level)))
+            for n, choice in enumerate(node.choices):
+                lines.append(indent + "{} {} == {}:".format("if" if n == 0 else "elif", key, n))
+                self._assign(choice, value, lines, level + 1)
+        elif isinstance(node, _MemoryLocation):
+            array = self.evaluator.replaced_memories[node.memory]
+            slots = self._bind(tuple(self.evaluator.slot(s) for s in array))
+            index = self._expr(node.index, lines, level)
+            lines.append(indent + "M[{}[{}]] = {}".format(slots, index,
+                _truncate_code(value, array[0].nbits, array[0].signed)))
+        else:
+            lines.append(indent + "_E.assign({}, {})".format(self._bind(node), value))
+
+    # Statements -----------------------------------------------------------------------------------
+
+    def _statements(self, statements, lines, level):
+        n = len(lines)
+        for s in statements:
+            self._statement(s, lines, level)
+        if len(lines) == n:
+            lines.append("    "*level + "pass")
+
+    def _statement(self, s, lines, level):
+        indent = "    "*level
+        if isinstance(s, _Assign):
+            value = self._expr(s.r, lines, level)
+            self._assign(s.l, value, lines, level)
+        elif isinstance(s, If):
+            cond = self._expr(s.cond, lines, level)
+            lines.append(indent + "if {} & {}:".format(cond, 2**len(s.cond) - 1))
+            self._statements(s.t, lines, level + 1)
+            if s.f:
+                lines.append(indent + "else:")
+                self._statements(s.f, lines, level + 1)
+        elif isinstance(s, Case):
+            self._case(s, lines, level)
+        elif isinstance(s, collections.abc.Iterable):
+            self._statements(s, lines, level)
+        elif isinstance(s, Display):
+            args = [self._expr(arg, lines, level) for arg in s.args]
+            lines.append(indent + "print({!r} % ({}))".format(s.s, "".join(a + ", " for a in args)))
+        else:
+            lines.append(indent + "_E.execute([{}])".format(self._bind(s)))
+
+    def _case(self, s, lines, level):
+        indent = "    "*level
+        nbits, signed = value_bits_sign(s.test)
+        test = self._temp()
+        lines.append(indent + "{} = {}".format(test,
+            _truncate_code(self._expr(s.test, lines, level), nbits, signed)))
+        cases = collections.OrderedDict()
+        for k, v in s.cases.items():
+            if isinstance(k, Constant) and k.value not in cases:
+                cases[k.value] = v
+        default = s.cases.get("default", None)
+        if len(cases) <= self.max_cases:
+            for n, (value, statements) in enumerate(cases.items()):
+                lines.append(indent + "{} {} == {}:".format("if" if n == 0 else "elif", test, value))
+                self._statements(statements, lines, level + 1)
+            if default is not None:
+                if cases:
+                    lines.append(indent + "else:")
+                    self._statements(default, lines, level + 1)
+                else:
+                    self._statements(default, lines, level)
+        else:
+            table = "_c{}".format(len(self.tables))
+            self.tables.append("{} = {{{}}}".format(table, ", ".join(
+                "{}: {}".format(value, self._function(statements))
+                for value, statements in cases.items())))
+            if default is not None:
+                lines.append(indent + "{}.get({}, {})()".format(table, test, self._function(default)))
+            else:
+                lines.append(indent + "{}.get({}, _nop)()".format(table, test))
+
+    def _function(self, statements):
+        name = "_f{}".format(len(self.functions))
+        self.functions.append(None)
+        lines = ["def {}(V=_V, M=_M):".format(name)]
+        self._statements(statements, lines, 1)
+        self.functions[int(name[2:])] = "\n".join(lines)
+        return name
+
+    def compile(self, statements):
+        name = self._function(statements)
+        source = "\n\n".join(self.functions + self.tables + ["def _nop():\n    pass"]) + "\n"
+        exec(compile(source, "<lowered>", "exec"), self.namespace)
+        return self.namespace[name]
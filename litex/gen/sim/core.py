@@ -9,7 +9,11 @@
 
 import operator
 import collections
+import collections.abc
 import inspect
+import heapq
+import multiprocessing
+import pickle
 from functools import wraps
 
 from migen.fhdl.structure import *
@@ -17,26 +21,37 @@ from migen.fhdl.structure import (_Value, _Statement,
                                   _Operator, _Slice, _ArrayProxy,
                                   _Assign, _Fragment)
 from migen.fhdl.bitcontainer import value_bits_sign
-from migen.fhdl.tools import (list_targets, list_signals,
+from migen.fhdl.tools import (list_targets, list_signals, group_by_targets,
                               insert_resets, lower_specials)
+from migen.fhdl.visit import NodeVisitor
 from migen.fhdl.simplify import MemoryToArray
 from migen.fhdl.specials import _MemoryLocation
 from migen.fhdl.module import Module
 from migen.genlib.resetsync import AsyncResetSynchronizer
 
 from litex.gen.sim.vcd import VCDWriter, DummyVCDWriter
+from litex.gen.sim.compiler import _Compiler
 
 
 class ClockState:
-    def __init__(self, high, half_period, time_before_trans):
+    def __init__(self, high, half_period, next_transition):
         self.high = high
         self.half_period = half_period
-        self.time_before_trans = time_before_trans
+        self.next_transition = next_transition
+        self.scheduled = True
+        self.suspended = False
 
 
 class TimeManager:
+    """Clock transitions scheduler
+
+    Transitions are kept in a heap keyed on their absolute time. Suspended clocks are skipped
+    until resumed, their transitions being coalesced.
+    """
     def __init__(self, description):
         self.clocks = collections.OrderedDict()
+        self.time = 0
+        self.transitions = []
 
         for k, period_phase in description.items():
             if isinstance(period_phase, tuple):
@@ -51,21 +66,70 @@ class TimeManager:
             else:
                 high = False
             self.clocks[k] = ClockState(high, half_period, half_period - phase)
+            heapq.heappush(self.transitions, (half_period - phase, k))
+
+    def suspend(self, k):
+        self.clocks[k].suspended = True
+
+    def resume(self, k):
+        cs = self.clocks[k]
+        cs.suspended = False
+        if not cs.scheduled:
+            self._catch_up(cs)
+            cs.scheduled = True
+            heapq.heappush(self.transitions, (cs.next_transition, k))
+
+    def _catch_up(self, cs):
+        # Account for the transitions skipped while suspended.
+        if cs.next_transition <= self.time:
+            skipped = (self.time - cs.next_transition)//cs.half_period + 1
+            cs.high ^= bool(skipped & 1)
+            cs.next_transition += skipped*cs.half_period
+
+    def get_state(self):
+        clocks = dict()
+        for k, cs in self.clocks.items():
+            if not cs.scheduled:
+                self._catch_up(cs)
+            clocks[k] = (cs.high, cs.next_transition)
+        return {"time": self.time, "clocks": clocks}
+
+    def set_state(self, state):
+        if set(state["clocks"].keys()) != set(self.clocks.keys()):
+            raise ValueError("Clocks do not match")
+        self.time = state["time"]
+        self.transitions = []
+        for k, cs in self.clocks.items():
+            cs.high, cs.next_transition = state["clocks"][k]
+            cs.scheduled = True
+            cs.suspended = False
+            heapq.heappush(self.transitions, (cs.next_transition, k))
 
     def tick(self):
         rising = set()
         falling = set()
-        dt = min(cs.time_before_trans for cs in self.clocks.values())
-        for k, cs in self.clocks.items():
-            if cs.time_before_trans == dt:
-                cs.high = not cs.high
-                if cs.high:
-                    rising.add(k)
-                else:
-                    falling.add(k)
-            cs.time_before_trans -= dt
-            if not cs.time_before_trans:
-                cs.time_before_trans += cs.half_period
+        transitions = self.transitions
+        while transitions and self.clocks[transitions[0][1]].suspended:
+            t, k = heapq.heappop(transitions)
+            self.clocks[k].scheduled = False
+        if not transitions:
+            return None
+        t = transitions[0][0]
+        dt = t - self.time
+        self.time = t
+        while transitions and transitions[0][0] == t:
+            _, k = heapq.heappop(transitions)
+            cs = self.clocks[k]
+            if cs.suspended:
+                cs.scheduled = False
+                continue
+            cs.high = not cs.high
+            if cs.high:
+                rising.add(k)
+            else:
+                falling.add(k)
+            cs.next_transition = t + cs.half_period
+            heapq.heappush(transitions, (cs.next_transition, k))
         return dt, rising, falling
 
 
@@ -223,20 +287,184 @@ class Evaluator:
                         break
                 if not found and "default" in s.cases:
                     self.execute(s.cases["default"])
-            elif isinstance(s, collections.Iterable):
+            elif isinstance(s, collections.abc.Iterable):
                 self.execute(s)
             elif isinstance(s, Display):
                 args = []
                 for arg in s.args:
                     assert isinstance(arg, _Value)
-                    try:
-                        args.append(self.signal_values[arg])
-                    except: # not yet evaluated
-                        args.append(arg.reset.value)
+                    args.append(self.eval(arg))
                 print(s.s %(*args,))
             else:
                 raise NotImplementedError
 
+    def lower(self, statements):
+        return lambda: self.execute(statements)
+
+
+class CompiledEvaluator(Evaluator):
+    """Evaluator executing statements lowered to Python code
+
+    Signal values are kept in flat slot arrays and statement lists passed to `lower` are compiled
+    once to Python functions; `eval`/`assign`/`execute` remain available for generators.
+    """
+    def __init__(self, clock_domains, replaced_memories):
+        self.clock_domains = clock_domains
+        self.replaced_memories = replaced_memories
+        self.slots = dict()          # duid -> slot
+        self.signals = []            # slot -> signal
+        self.values = []             # slot -> value
+        self.modifications = dict()  # slot -> value
+
+    @property
+    def signal_values(self):
+        return {signal: value for signal, value in zip(self.signals, self.values)}
+
+    def slot(self, signal):
+        try:
+            return self.slots[signal.duid]
+        except KeyError:
+            slot = len(self.signals)
+            self.slots[signal.duid] = slot
+            self.signals.append(signal)
+            self.values.append(signal.reset.value)
+            return slot
+
+    def commit(self):
+        r = set()
+        values = self.values
+        signals = self.signals
+        for k, v in self.modifications.items():
+            if values[k] != v:
+                values[k] = v
+                r.add(signals[k])
+        self.modifications.clear()
+        return r
+
+    def eval(self, node, postcommit=False):
+        if isinstance(node, Signal):
+            slot = self.slot(node)
+            if postcommit:
+                try:
+                    return self.modifications[slot]
+                except KeyError:
+                    pass
+            return self.values[slot]
+        return Evaluator.eval(self, node, postcommit)
+
+    def assign(self, node, value):
+        if isinstance(node, Signal):
+            assert not node.variable
+            self.modifications[self.slot(node)] = _truncate(value,
+                                                            node.nbits, node.signed)
+        else:
+            Evaluator.assign(self, node, value)
+
+    def lower(self, statements):
+        return _Compiler(self).compile(statements)
+
+
+engines = {
+    "interpreted": Evaluator,
+    "compiled":    CompiledEvaluator,
+}
+
+
+class _SignalReads(NodeVisitor):
+    """Collects the signals read by statements
+
+    Assignment targets are not reads (comb targets are reset before being assigned, sync targets
+    are tracked separately). Nodes that can't be analyzed mark the statements as opaque.
+    """
+    def __init__(self, clock_domains, replaced_memories):
+        self.clock_domains = clock_domains
+        self.replaced_memories = replaced_memories
+        self.reads = set()
+        self.opaque = False
+
+    def visit_Signal(self, node):
+        self.reads.add(node)
+
+    def visit_ClockSignal(self, node):
+        self.reads.add(self.clock_domains[node.cd].clk)
+
+    def visit_ResetSignal(self, node):
+        rst = self.clock_domains[node.cd].rst
+        if rst is not None:
+            self.reads.add(rst)
+
+    def visit_Assign(self, node):
+        self.visit_target(node.l)
+        self.visit(node.r)
+
+    def visit_target(self, node):
+        if isinstance(node, Cat):
+            for element in node.l:
+                self.visit_target(element)
+        elif isinstance(node, _Slice):
+            self.visit_target(node.value)
+        elif isinstance(node, _ArrayProxy):
+            self.visit(node.key)
+            for choice in node.choices:
+                self.visit_target(choice)
+        elif isinstance(node, _MemoryLocation):
+            self.visit(node.index)
+        elif not isinstance(node, Signal):
+            self.opaque = True
+
+    def visit_unknown(self, node):
+        if isinstance(node, Display):
+            for arg in node.args:
+                self.visit(arg)
+        elif isinstance(node, _MemoryLocation):
+            self.visit(node.index)
+            self.reads |= set(self.replaced_memories[node.memory])
+        else:
+            self.opaque = True
+
+
+def _strongly_connected_components(successors):
+    # Iterative Tarjan, returns components in topological order.
+    index = dict()
+    lowlink = dict()
+    stack = []
+    on_stack = set()
+    components = []
+    for root in range(len(successors)):
+        if root in index:
+            continue
+        work = [(root, iter(successors[root]))]
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors[child])))
+                    break
+                elif child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        n = stack.pop()
+                        on_stack.discard(n)
+                        component.append(n)
+                        if n == node:
+                            break
+                    components.append(sorted(component))
+    components.reverse()
+    return components
+
 
 class DummyAsyncResetSynchronizerImpl(Module):
     def __init__(self, cd, async_reset):
@@ -252,10 +480,26 @@ class DummyAsyncResetSynchronizer:
         return DummyAsyncResetSynchronizerImpl(dr.cd, dr.async_reset)
 
 
+class SimulatorSnapshot:
+    def __init__(self, time, values, widths):
+        self.time = time
+        self.values = values
+        self.widths = widths
+
+    def save(self, filename):
+        with open(filename, "wb") as f:
+            pickle.dump(self.__dict__, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "rb") as f:
+            return cls(**pickle.load(f))
+
+
 # TODO: instances via Iverilog/VPI
 class Simulator:
     def __init__(self, fragment_or_module, generators, clocks={"sys": 10}, vcd_name=None,
-                 special_overrides={}):
+                 special_overrides={}, engine="interpreted", vcd_filter=None):
         if isinstance(fragment_or_module, _Fragment):
             self.fragment = fragment_or_module
         else:
@@ -270,16 +514,9 @@ class Simulator:
         if self.fragment.specials:
             raise ValueError("Could not lower all specials", self.fragment.specials)
 
-        if not isinstance(generators, dict):
-            generators = {"sys": generators}
         self.generators = dict()
         self.passive_generators = set()
-        for k, v in generators.items():
-            if (isinstance(v, collections.Iterable)
-                    and not inspect.isgenerator(v)):
-                self.generators[k] = list(v)
-            else:
-                self.generators[k] = [v]
+        self._set_generators(generators)
 
         clocks = collections.OrderedDict(sorted(clocks.items(),
                                                 key=operator.itemgetter(0)))
@@ -294,25 +531,85 @@ class Simulator:
         # comb signals return to their reset value if nothing assigns them
         self.fragment.comb[0:0] = [s.eq(s.reset)
                                    for s in list_targets(self.fragment.comb)]
-        self.evaluator = Evaluator(self.fragment.clock_domains,
-                                   mta.replacements)
+        try:
+            evaluator_cls = engines[engine]
+        except KeyError:
+            raise ValueError("Unknown simulator engine: '{}'".format(engine))
+        self.evaluator = evaluator_cls(self.fragment.clock_domains,
+                                       mta.replacements)
+        self._build_comb_units(mta.replacements)
+        self.sync = {cd: self.evaluator.lower(statements)
+                     for cd, statements in self.fragment.sync.items()}
+        self._build_sync_sensitivities(mta.replacements)
+
+        signals = list_signals(self.fragment)
+        for cd in self.fragment.clock_domains:
+            signals.add(cd.clk)
+            if cd.rst is not None:
+                signals.add(cd.rst)
+        for memory_array in mta.replacements.values():
+            signals |= set(memory_array)
+        self.signals = sorted(signals, key=lambda x: x.duid)
 
         if vcd_name is None:
             self.vcd = DummyVCDWriter()
         else:
-            self.vcd = VCDWriter(vcd_name)
-
-            signals = list_signals(self.fragment)
-            for cd in self.fragment.clock_domains:
-                signals.add(cd.clk)
-                if cd.rst is not None:
-                    signals.add(cd.rst)
-            for memory_array in mta.replacements.values():
-                signals |= set(memory_array)
+            self.vcd = VCDWriter(vcd_name, vcd_filter)
             self.vcd.init(signals)
-            for signal in sorted(signals, key=lambda x: x.duid):
+            for signal in self.signals:
                 self.vcd.set(signal, signal.reset.value)
 
+        # Clocks of quiescent domains can only be suspended when nothing observes them.
+        self.suspendable_clocks = set()
+        sync_reads = set()
+        for sensitivity in self.sync_sensitivities.values():
+            sync_reads |= sensitivity
+        for cd in self.fragment.clock_domains:
+            if (cd.name in self.time.clocks and
+                cd.clk not in self.comb_readers and
+                cd.clk not in sync_reads and
+                not self.vcd.traced(cd.clk)):
+                self.suspendable_clocks.add(cd.name)
+
+    def _set_generators(self, generators):
+        if not isinstance(generators, dict):
+            generators = {"sys": generators}
+        for k, v in generators.items():
+            if (isinstance(v, collections.abc.Iterable)
+                    and not inspect.isgenerator(v)):
+                self.generators[k] = list(v)
+            else:
+                self.generators[k] = [v]
+
+    def snapshot(self):
+        """Capture the state of the design and clocks
+
+        Generators are not part of the snapshot.
+        """
+        return SimulatorSnapshot(
+            time   = self.time.get_state(),
+            values = [self.evaluator.eval(signal) for signal in self.signals],
+            widths = [(len(signal), signal.signed) for signal in self.signals])
+
+    def restore(self, snapshot, generators=None):
+        """Restore a snapshot, replacing the generators by `generators`
+
+        The snapshot can come from another Simulator of the same design, elaborated identically.
+        """
+        if snapshot.widths != [(len(signal), signal.signed) for signal in self.signals]:
+            raise ValueError("Snapshot does not match the simulated design")
+        if snapshot.time["time"] > self.time.time:
+            self.vcd.delay(snapshot.time["time"] - self.time.time)
+        self.time.set_state(snapshot.time)
+        for signal, value in zip(self.signals, snapshot.values):
+            self.evaluator.assign(signal, value)
+        self.quiescent = set()
+        self._commit_and_comb_propagate(range(len(self.comb_units)))
+        self.generators = dict()
+        self.passive_generators = set()
+        if generators is not None:
+            self._set_generators(generators)
+
     def __enter__(self):
         return self
 
@@ -322,17 +619,102 @@ class Simulator:
     def close(self):
         self.vcd.close()
 
-    def _commit_and_comb_propagate(self):
-        # TODO: optimize
+    def _build_comb_units(self, replaced_memories):
+        # Group comb statements by targets, then order the groups topologically on their
+        # read/write dependencies. Combinatorial loops are merged into a single unit that is
+        # re-evaluated until it settles.
+        groups = []
+        drivers = dict()
+        for targets, statements in group_by_targets(self.fragment.comb):
+            reads = _SignalReads(self.fragment.clock_domains, replaced_memories)
+            reads.visit(statements)
+            for target in targets:
+                drivers[target] = len(groups)
+            groups.append((statements, reads))
+        successors = [set() for group in groups]
+        for n, (statements, reads) in enumerate(groups):
+            for signal in reads.reads:
+                if signal in drivers:
+                    successors[drivers[signal]].add(n)
+
+        self.comb_units = []
+        self.comb_readers = collections.defaultdict(list)
+        self.comb_drivers = dict()
+        self.comb_opaque = []
+        unit_of_group = dict()
+        for n, component in enumerate(_strongly_connected_components(successors)):
+            statements = []
+            for g in component:
+                unit_of_group[g] = n
+                statements += groups[g][0]
+                if groups[g][1].opaque:
+                    self.comb_opaque.append(n)
+            self.comb_units.append(self.evaluator.lower(statements))
+        for signal, g in drivers.items():
+            self.comb_drivers[signal] = unit_of_group[g]
+        for g, (statements, reads) in enumerate(groups):
+            for signal in reads.reads:
+                self.comb_readers[signal].append(unit_of_group[g])
+
+    def _build_sync_sensitivities(self, replaced_memories):
+        # A domain is quiescent when an edge didn't modify its state: it then stays so until one
+        # of the signals it reads or drives is modified. Domains with unanalyzable statements are
+        # never quiescent.
+        self.sync_sensitivities = dict()
+        for cd in self.time.clocks.keys():
+            statements = self.fragment.sync.get(cd, [])
+            reads = _SignalReads(self.fragment.clock_domains, replaced_memories)
+            reads.visit(statements)
+            if not reads.opaque:
+                self.sync_sensitivities[cd] = reads.reads | list_targets(statements)
+        self.quiescent = set()
+
+    def _update_quiescent(self, rising, modified):
+        for cd, sensitivity in self.sync_sensitivities.items():
+            if cd in self.quiescent:
+                if not modified.isdisjoint(sensitivity):
+                    self.quiescent.remove(cd)
+                    if cd in self.suspendable_clocks:
+                        self.time.resume(cd)
+            elif cd in rising and not self.generators.get(cd):
+                if modified.isdisjoint(sensitivity):
+                    self.quiescent.add(cd)
+                    if cd in self.suspendable_clocks:
+                        self.time.suspend(cd)
+
+    def _commit_and_comb_propagate(self, scheduled=()):
+        # Only re-evaluate the comb units whose inputs changed, in topological order. Units
+        # driving signals modified outside of comb logic are re-evaluated to restore them.
         all_modified = set()
         modified = self.evaluator.commit()
         all_modified |= modified
-        while modified:
-            self.evaluator.execute(self.fragment.comb)
+        pending = list(scheduled)
+        for signal in modified:
+            if signal in self.comb_drivers:
+                pending.append(self.comb_drivers[signal])
+        queued = set(pending)
+        heapq.heapify(pending)
+        while True:
+            if modified:
+                for signal in modified:
+                    for n in self.comb_readers.get(signal, ()):
+                        if n not in queued:
+                            queued.add(n)
+                            heapq.heappush(pending, n)
+                for n in self.comb_opaque:
+                    if n not in queued:
+                        queued.add(n)
+                        heapq.heappush(pending, n)
+            if not pending:
+                break
+            n = heapq.heappop(pending)
+            queued.remove(n)
+            self.comb_units[n]()
             modified = self.evaluator.commit()
             all_modified |= modified
         for signal in all_modified:
-            self.vcd.set(signal, self.evaluator.signal_values[signal])
+            self.vcd.set(signal, self.evaluator.eval(signal))
+        return all_modified
 
     def _evalexec_nested_lists(self, x):
         if isinstance(x, list):
@@ -377,21 +759,24 @@ class Simulator:
         return False
 
     def run(self):
-        self.evaluator.execute(self.fragment.comb)
-        self._commit_and_comb_propagate()
+        self._commit_and_comb_propagate(range(len(self.comb_units)))
 
         while True:
-            dt, rising, falling = self.time.tick()
+            tick = self.time.tick()
+            if tick is None:
+                break
+            dt, rising, falling = tick
             self.vcd.delay(dt)
             for cd in rising:
                 self.evaluator.assign(self.fragment.clock_domains[cd].clk, 1)
-                if cd in self.fragment.sync:
-                    self.evaluator.execute(self.fragment.sync[cd])
+                if cd in self.sync and cd not in self.quiescent:
+                    self.sync[cd]()
                 if cd in self.generators:
                     self._process_generators(cd)
             for cd in falling:
                 self.evaluator.assign(self.fragment.clock_domains[cd].clk, 0)
-            self._commit_and_comb_propagate()
+            modified = self._commit_and_comb_propagate()
+            self._update_quiescent(rising, modified)
 
             if not self._continue_simulation():
                 break
@@ -402,6 +787,52 @@ def run_simulation(*args, **kwargs):
         s.run()
 
 
+_sharded_run = None
+
+
+def _run_shard(n):
+    simulator, dut, testbench, shards = _sharded_run
+    results = []
+    simulator._set_generators(testbench(dut, shards[n], results))
+    simulator.run()
+    return results
+
+
+def run_sharded(fragment_or_module, testbench, vectors, nworkers=None, **kwargs):
+    """Run a testbench over test vectors split across worker processes
+
+    The simulator is elaborated once and forked into `nworkers` processes (defaults to the number
+    of CPUs), each one simulating a contiguous shard of `vectors`. `testbench(dut, vectors,
+    results)` must return the generators (as accepted by Simulator) checking `vectors` and
+    appending to `results`, the merged results are returned in vectors order. Falls back to a
+    single in-process simulation when fork is not available.
+    """
+    global _sharded_run
+    if kwargs.get("vcd_name", None) is not None:
+        raise ValueError("VCD output is not supported with sharded simulations")
+    vectors = list(vectors)
+    if nworkers is None:
+        nworkers = multiprocessing.cpu_count()
+    if "fork" not in multiprocessing.get_all_start_methods():
+        nworkers = 1
+    nworkers = max(1, min(nworkers, len(vectors)))
+
+    shards = [vectors[len(vectors)*n//nworkers:len(vectors)*(n + 1)//nworkers]
+              for n in range(nworkers)]
+    simulator = Simulator(fragment_or_module, [], **kwargs)
+    _sharded_run = (simulator, fragment_or_module, testbench, shards)
+    try:
+        if nworkers == 1:
+            shard_results = [_run_shard(0)]
+        else:
+            with multiprocessing.get_context("fork").Pool(nworkers) as pool:
+                shard_results = pool.map(_run_shard, range(nworkers), chunksize=1)
+    finally:
+        _sharded_run = None
+        simulator.close()
+    return [result for results in shard_results for result in results]
+
+
 def passive(generator):
     @wraps(generator)
     def wrapper(*args, **kwargs):
@@ -5,9 +5,10 @@
 
 
 from itertools import count
-import tempfile
-import os
 from collections import OrderedDict
+from fnmatch import fnmatchcase
+import os
+import gzip
 import shutil
 
 from migen.fhdl.namer import build_namespace
@@ -25,90 +26,140 @@ def vcd_codes():
 
 
 class VCDWriter:
-    def __init__(self, filename):
+    """VCD waveform writer
+
+    Value changes are buffered and written in blocks of `buffer_size` lines; timestamps are only
+    emitted when values change. When `filename` ends with ".gz", the VCD is gzip-compressed
+    (readable by GTKWave). `signal_filter` is a glob (or list of globs) matched against signal
+    names, only matching signals are traced.
+    """
+    def __init__(self, filename, signal_filter=None, buffer_size=4096):
         self.filename = filename
+        if isinstance(signal_filter, str):
+            signal_filter = [signal_filter]
+        self.signal_filter = signal_filter
+        self.buffer_size = buffer_size
         self.out_file = None
-        self.buffer_file = tempfile.TemporaryFile(
-            dir=os.path.dirname(filename), mode="w+")
-        self.initialized = False
+        self.header_size = 0
+        self.buffer = []
         self.codegen = vcd_codes()
         self.codes = OrderedDict()
+        self.formats = dict()
+        self.ignored = set()
         self.signal_values = dict()
         self.t = 0
+        self.t_written = None
 
-    def _write_value(self, signal, value):
-        l = len(signal)
-        if value < 0:
-            value += 2**l
-        if l > 1:
-            fmtstr = "b{:0" + str(l) + "b} {}\n"
+    def _open(self, mode, filename=None):
+        if filename is None:
+            filename = self.filename
+        if self.filename.endswith(".gz"):
+            return gzip.open(filename, mode, compresslevel=6)
         else:
-            fmtstr = "{}{}\n"
-        try:
-            code = self.codes[signal]
-        except KeyError:
-            code = next(self.codegen)
-            self.codes[signal] = code
-            self.init(self.codes.keys())
-
-        return fmtstr.format(value, code)
+            return open(filename, mode)
 
-    def _write(self, s):
-        self.out_file.write(s)
-        self.buffer_file.write(s)
-
-    def init(self, signals):
-        self.out_file = open(self.filename, "w")
-
-        # generate codes
+    def _filter(self, signals):
+        ns = build_namespace(set(self.codes.keys()) | set(signals) | self.ignored)
         for signal in signals:
-            try:
-                code = self.codes[signal]
-            except KeyError:
-                code = next(self.codegen)
-                self.codes[signal] = code
-
-        # write vcd header
+            if signal in self.codes or signal in self.ignored:
+                continue
+            name = ns.get_name(signal)
+            if (self.signal_filter is None or
+                any(fnmatchcase(name, pattern) for pattern in self.signal_filter)):
+                self.codes[signal] = next(self.codegen)
+                if len(signal) > 1:
+                    self.formats[signal] = "b{:b} " + self.codes[signal] + "\n"
+                else:
+                    self.formats[signal] = "{}" + self.codes[signal] + "\n"
+            else:
+                self.ignored.add(signal)
+        return ns
+
+    def _header(self, ns):
         header = ""
-        ns = build_namespace(self.codes.keys())
         for signal, code in self.codes.items():
             name = ns.get_name(signal)
             header += "$var wire {len} {code} {name} $end\n".format(name=name, code=code, len=len(signal))
+        header += "$enddefinitions $end\n"
         header += "$dumpvars\n"
         for signal in self.codes.keys():
-            header += self._write_value(signal, signal.reset.value)
+            header += self._format_value(signal, signal.reset.value)
         header += "$end\n"
-        self.out_file.write(header)
+        return header.encode()
 
-        if self.initialized:
-            self.buffer_file.seek(0)
-            shutil.copyfileobj(self.buffer_file, self.out_file)
-            self.buffer_file.seek(0, 2)
+    def _format_value(self, signal, value):
+        if value < 0:
+            value += 2**len(signal)
+        return self.formats[signal].format(value)
+
+    def _flush(self):
+        if self.buffer:
+            self.out_file.write("".join(self.buffer).encode())
+            self.buffer.clear()
+
+    def init(self, signals):
+        ns = self._filter(signals)
+        header = self._header(ns)
+        if self.out_file is None:
+            self.out_file = self._open("wb")
+            self.out_file.write(header)
         else:
-            # init time
-            self._write("#0\n")
+            # New signals: rewrite the header before the already dumped values, the values are
+            # copied in chunks to a new file that replaces the current one.
+            self._flush()
+            self.out_file.close()
+            tmp_filename = self.filename + ".tmp"
+            with self._open("rb") as f, self._open("wb", tmp_filename) as tmp:
+                tmp.write(header)
+                f.seek(self.header_size)
+                shutil.copyfileobj(f, tmp)
+            os.replace(tmp_filename, self.filename)
+            self.out_file = self._open("ab")
+        self.header_size = len(header)
+        for signal in self.codes.keys():
+            self.signal_values.setdefault(signal, signal.reset.value)
 
-        self.initialized = True
+    def traced(self, signal):
+        return signal in self.codes
 
     def set(self, signal, value):
-        if (signal not in self.signal_values
-                or self.signal_values[signal] != value):
-            self._write(self._write_value(signal, value))
-            self.signal_values[signal] = value
+        try:
+            if self.signal_values[signal] == value:
+                return
+        except KeyError:
+            if signal in self.ignored:
+                return
+            self.init([signal])
+            if signal in self.ignored or self.signal_values[signal] == value:
+                return
+        self.signal_values[signal] = value
+        if self.t_written != self.t:
+            self.buffer.append("#{}\n".format(self.t))
+            self.t_written = self.t
+        if value < 0:
+            value += 2**len(signal)
+        self.buffer.append(self.formats[signal].format(value))
+        if len(self.buffer) >= self.buffer_size:
+            self._flush()
 
     def delay(self, delay):
         self.t += delay
-        self._write("#{}\n".format(self.t))
 
     def close(self):
-        self.out_file.close()
-        self.buffer_file.close()
+        if self.out_file is not None:
+            if self.t_written != self.t:
+                self.buffer.append("#{}\n".format(self.t))
+            self._flush()
+            self.out_file.close()
 
 
 class DummyVCDWriter:
-    def init(self):
+    def init(self, signals):
         pass
 
+    def traced(self, signal):
+        return False
+
     def set(self, signal, value):
         pass
 
@@ -0,0 +1,232 @@
+# License: BSD
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import subprocess
+
+# Helpers ------------------------------------------------------------------------------------------
+
+# Generated files embed their generation date in their banner: ignore it so that identical designs
+# hash identically.
+_timestamp_re = re.compile(rb" on \d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+
+
+def _list_files(directory, exclude=[]):
+    files = []
+    for root, dirs, filenames in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) not in exclude)
+        for filename in sorted(filenames):
+            files.append(os.path.relpath(os.path.join(root, filename), directory))
+    return files
+
+
+def _file_state(filename):
+    s = os.stat(filename)
+    return [s.st_mtime_ns, s.st_size]
+
+
+def _copy_files(src_dir, dst_dir, files):
+    for f in files:
+        dst = os.path.join(dst_dir, f)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copyfile(os.path.join(src_dir, f), dst)
+
+
+def _toolchain_identity(generated_dir):
+    # Compiler selected by common.mak from the generated variables, identified by its version.
+    variables = {}
+    try:
+        with open(os.path.join(generated_dir, "variables.mak"), "r") as f:
+            for line in f:
+                k, _, v = line.strip().partition("=")
+                variables[k] = v
+    except OSError:
+        return ""
+    triple = variables.get("TRIPLE", "")
+    if variables.get("CLANG", "") == "1":
+        cc = ["clang", "-target", triple]
+    else:
+        cc = ["gcc" if triple == "--native--" else triple + "-gcc"]
+    try:
+        version = subprocess.check_output(cc + ["--version"], stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        version = b"unknown"
+    return " ".join(cc) + "\n" + version.decode(errors="replace")
+
+
+class _Digest:
+    def __init__(self, replacements={}):
+        self.hash = hashlib.sha256()
+        self.replacements = [(k.encode(), v.encode()) for k, v in replacements.items()]
+
+    def update(self, name, data):
+        if isinstance(data, str):
+            data = data.encode()
+        data = _timestamp_re.sub(b"", data)
+        for k, v in self.replacements:
+            data = data.replace(k, v)
+        self.hash.update("{}:{}\n".format(name, len(data)).encode())
+        self.hash.update(data)
+
+    def update_file(self, name, filename):
+        with open(filename, "rb") as f:
+            self.update(name, f.read())
+
+    def update_dir(self, name, directory, exclude=[]):
+        for f in _list_files(directory, exclude):
+            self.update_file(os.path.join(name, f), os.path.join(directory, f))
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+# Build Cache --------------------------------------------------------------------------------------
+
+class BuildCache:
+    """Content-addressed cache of software and gateware build artifacts
+
+    Artifacts are stored under `directory`/{software,gateware}/<sha256 of the build inputs>:
+
+    - Software packages are keyed on the generated headers/makefile variables, on the sources of
+      the package and of the packages it depends on, and on the compiler version. BIOS
+      compilation is skipped on a hit.
+    - Gateware is keyed on all the files generated for the toolchain (Verilog, constraints,
+      scripts) and on the platform sources. The toolchain is skipped on a hit.
+
+    Banner timestamps are ignored, but the design itself must be deterministic (for example
+    add_identifier(with_build_time=False) or SOURCE_DATE_EPOCH) for the gateware to hit the cache.
+    """
+    manifest = ".litex_build_cache"
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+
+    def _entry(self, kind, key):
+        return os.path.join(self.directory, kind, key[:2], key)
+
+    def _store(self, kind, key, src_dir, files):
+        entry = self._entry(kind, key)
+        tmp = entry + ".tmp{}".format(os.getpid())
+        _copy_files(src_dir, tmp, files)
+        with open(os.path.join(tmp, self.manifest), "w") as f:
+            json.dump(files, f)
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            os.rename(tmp, entry)
+        except OSError:
+            # Already stored by a concurrent build.
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _load(self, kind, key, dst_dir):
+        entry = self._entry(kind, key)
+        try:
+            with open(os.path.join(entry, self.manifest), "r") as f:
+                files = json.load(f)
+        except OSError:
+            return None
+        _copy_files(entry, dst_dir, files)
+        return files
+
+    # Software -------------------------------------------------------------------------------------
+
+    def software_key(self, generated_dir, name, src_dir, dependencies=[]):
+        """Key of a software package: generated files, package sources, dependencies (source
+        directories of the linked packages, shared includes/makefiles) and compiler version."""
+        digest = _Digest()
+        digest.update_dir("generated", generated_dir)
+        digest.update("package", name)
+        digest.update_dir("src", src_dir)
+        for n, dependency in enumerate(dependencies):
+            dependency_name = "dependency{}/{}".format(n, os.path.basename(dependency))
+            if os.path.isdir(dependency):
+                digest.update_dir(dependency_name, dependency)
+            elif os.path.exists(dependency):
+                digest.update_file(dependency_name, dependency)
+        digest.update("toolchain", _toolchain_identity(generated_dir))
+        return digest.hexdigest()
+
+    def load_software(self, key, dst_dir):
+        return self._load("software", key, dst_dir) is not None
+
+    def store_software(self, key, dst_dir):
+        # Dependency files reference the build directory, they are not kept.
+        files = [f for f in _list_files(dst_dir) if not f.endswith(".d")]
+        self._store("software", key, dst_dir, files)
+
+    # Gateware -------------------------------------------------------------------------------------
+
+    def gateware_run(self, platform, build_dir, run=True):
+        return _GatewareRun(self, platform, build_dir, run)
+
+
+class _GatewareRun:
+    """Gateware cache lookup, passed as `run` to the toolchains
+
+    Toolchains generate their inputs in the build directory then check `run` before invoking the
+    vendor tools: the cache lookup is done at this point. On a hit the cached outputs are copied to
+    the build directory and the toolchain is skipped.
+    """
+    def __init__(self, cache, platform, build_dir, run):
+        self.cache     = cache
+        self.platform  = platform
+        self.build_dir = os.path.abspath(build_dir)
+        self.run       = run
+        self.key       = None
+        self.hit       = None
+
+    def _key(self):
+        # Outputs of the previous build (if not regenerated) are not inputs.
+        outputs = {}
+        manifest = os.path.join(self.build_dir, BuildCache.manifest)
+        if os.path.exists(manifest):
+            with open(manifest, "r") as f:
+                outputs = json.load(f)
+        self.inputs = {}
+        digest = _Digest({self.build_dir: "<build_dir>"})
+        for f in _list_files(self.build_dir):
+            filename = os.path.join(self.build_dir, f)
+            state = _file_state(filename)
+            self.inputs[f] = state
+            if f == BuildCache.manifest or outputs.get(f, None) == state:
+                continue
+            digest.update_file(f, filename)
+        for filename, language, library in sorted(self.platform.sources):
+            if not filename.startswith(self.build_dir + os.sep):
+                digest.update_file(os.path.basename(filename), filename)
+            digest.update("source", "{} {} {}".format(filename, language, library))
+        for path in self.platform.verilog_include_paths:
+            if os.path.abspath(path) == self.build_dir:
+                continue
+            digest.update_dir("include", path, exclude=[self.build_dir])
+        return digest.hexdigest()
+
+    def _write_manifest(self, files):
+        outputs = {f: _file_state(os.path.join(self.build_dir, f)) for f in files}
+        with open(os.path.join(self.build_dir, BuildCache.manifest), "w") as f:
+            json.dump(outputs, f)
+
+    def __bool__(self):
+        if not self.run:
+            return False
+        if self.hit is None:
+            self.key = self._key()
+            files = self.cache._load("gateware", self.key, self.build_dir)
+            self.hit = files is not None
+            if self.hit:
+                self._write_manifest(files)
+        return not self.hit
+
+    def done(self):
+        """Store the outputs of the toolchain (files created or modified by its run)."""
+        if self.key is None or self.hit:
+            return
+        files = []
+        for f in _list_files(self.build_dir):
+            if f == BuildCache.manifest:
+                continue
+            if self.inputs.get(f, None) != _file_state(os.path.join(self.build_dir, f)):
+                files.append(f)
+        self.cache._store("gateware", self.key, self.build_dir, files)
+        self._write_manifest(files)
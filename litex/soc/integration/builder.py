@@ -15,8 +15,10 @@ import struct
 import shutil
 
 from litex import get_data_mod
-from litex.build.tools import write_to_file
+from litex.build.tools import write_to_file, reproducible_outputs
+from litex.build.sim import SimPlatform
 from litex.soc.integration import export, soc_core
+from litex.soc.integration.build_cache import BuildCache
 
 __all__ = ["soc_software_packages", "soc_directory",
            "Builder", "builder_args", "builder_argdict"]
@@ -49,7 +51,9 @@ class Builder:
         csr_json         = None,
         csr_csv          = None,
         csr_svd          = None,
-        memory_x         = None):
+        memory_x         = None,
+        build_cache      = None,
+        reproducible     = False):
         self.soc = soc
 
         # From Python doc: makedirs() will become confused if the path
@@ -67,6 +71,13 @@ class Builder:
         self.csr_svd  = csr_svd
         self.memory_x = memory_x
 
+        # Content-addressed cache of software/gateware artifacts (skips BIOS compilation and
+        # toolchain runs when their inputs did not change).
+        self.build_cache = None if build_cache is None else BuildCache(build_cache)
+
+        # Generated files without build date (see also SOURCE_DATE_EPOCH).
+        self.reproducible = reproducible
+
         self.software_packages = []
         for name in soc_software_packages:
             self.add_software_package(name)
@@ -178,7 +189,20 @@ class Builder:
                 dst_dir = os.path.join(self.software_dir, name)
                 makefile = os.path.join(src_dir, "Makefile")
                 if self.compile_software:
+                    if self.build_cache is not None:
+                        # Packages are linked with the other packages (libbase, ...) and use the
+                        # shared includes/makefiles.
+                        dependencies = [d for n, d in self.software_packages if n != name]
+                        dependencies += [
+                            os.path.join(soc_directory, "software", "include"),
+                            os.path.join(soc_directory, "software", "common.mak")]
+                        key = self.build_cache.software_key(self.generated_dir, name, src_dir,
+                            dependencies)
+                        if self.build_cache.load_software(key, dst_dir):
+                            continue
                     subprocess.check_call(["make", "-C", dst_dir, "-f", makefile])
+                    if self.build_cache is not None:
+                        self.build_cache.store_software(key, dst_dir)
 
     def _initialize_rom_software(self):
         bios_file = os.path.join(self.software_dir, "bios", "bios.bin")
@@ -186,28 +210,36 @@ class Builder:
         self.soc.initialize_rom(bios_data)
 
     def build(self, **kwargs):
-        self.soc.platform.output_dir = self.output_dir
-        os.makedirs(self.gateware_dir, exist_ok=True)
-        os.makedirs(self.software_dir, exist_ok=True)
-
-        self.soc.finalize()
-
-        self._generate_includes()
-        self._generate_csr_map()
-        self._generate_mem_region_map()
-        if self.soc.cpu_type is not None:
-            if self.soc.cpu.use_rom:
-                self._prepare_rom_software()
-                self._generate_rom_software(not self.soc.integrated_rom_initialized)
-                if self.soc.integrated_rom_size and self.compile_software:
-                    if not self.soc.integrated_rom_initialized:
-                        self._initialize_rom_software()
-
-        if "run" not in kwargs:
-            kwargs["run"] = self.compile_gateware
-        vns = self.soc.build(build_dir=self.gateware_dir, **kwargs)
-        self.soc.do_exit(vns=vns)
-        return vns
+        # Only the files generated by this build are affected by the reproducible setting.
+        with reproducible_outputs(self.reproducible):
+            self.soc.platform.output_dir = self.output_dir
+            os.makedirs(self.gateware_dir, exist_ok=True)
+            os.makedirs(self.software_dir, exist_ok=True)
+
+            self.soc.finalize()
+
+            self._generate_includes()
+            self._generate_csr_map()
+            self._generate_mem_region_map()
+            if self.soc.cpu_type is not None:
+                if self.soc.cpu.use_rom:
+                    self._prepare_rom_software()
+                    self._generate_rom_software(not self.soc.integrated_rom_initialized)
+                    if self.soc.integrated_rom_size and self.compile_software:
+                        if not self.soc.integrated_rom_initialized:
+                            self._initialize_rom_software()
+
+            if "run" not in kwargs:
+                kwargs["run"] = self.compile_gateware
+            # Simulations have nothing to cache: run executes the simulator.
+            cache_gateware = self.build_cache is not None and not isinstance(self.soc.platform, SimPlatform)
+            if cache_gateware:
+                kwargs["run"] = self.build_cache.gateware_run(self.soc.platform, self.gateware_dir, kwargs["run"])
+            vns = self.soc.build(build_dir=self.gateware_dir, **kwargs)
+            if cache_gateware:
+                kwargs["run"].done()
+            self.soc.do_exit(vns=vns)
+            return vns
 
 
 def builder_args(parser):
@@ -241,6 +273,14 @@ def builder_args(parser):
     parser.add_argument("--memory-x", default=None,
                         help="store Mem regions in memory-x format into the "
                              "specified file")
+    parser.add_argument("--build-cache", default=None,
+                        help="content-addressed cache directory for software "
+                             "and gateware build artifacts")
+    parser.add_argument("--reproducible", action="store_true",
+                        help="do not include the build date in the headers of "
+                             "generated files (an identifier with the date still "
+                             "embeds it in the gateware: set SOURCE_DATE_EPOCH "
+                             "for reproducible bitstreams)")
 
 
 def builder_argdict(args):
@@ -256,4 +296,6 @@ def builder_argdict(args):
         "csr_json":         args.csr_json,
         "csr_svd":          args.csr_svd,
         "memory_x":         args.memory_x,
+        "build_cache":      args.build_cache,
+        "reproducible":     args.reproducible,
     }
@@ -2,11 +2,13 @@
 # License: BSD
 
 import os
+import sys
 import math
+import mmap
 import json
 import time
-import struct
 import datetime
+from array import array
 
 from migen import *
 
@@ -16,7 +18,29 @@ def get_version(with_time=True):
     fmt = "%Y-%m-%d %H:%M:%S" if with_time else "%Y-%m-%d"
     return datetime.datetime.fromtimestamp(time.time()).strftime(fmt)
 
+# Array typecode of 32-bit words.
+_word_typecode = "I" if array("I").itemsize == 4 else "L"
+
+def _get_file_words(filename, endianness):
+    words = array(_word_typecode)
+    if os.path.getsize(filename) == 0:
+        return words
+    with open(filename, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            length = len(m) & ~0x3
+            with memoryview(m) as view:
+                words.frombytes(view[:length])
+            if length != len(m):
+                words.frombytes(m[length:].ljust(4, b"\x00"))
+    if endianness != sys.byteorder:
+        words.byteswap()
+    return words
+
 def get_mem_data(filename_or_regions, endianness="big", mem_size=None):
+    """Get memory contents from a binary file or from a dict of {filename: base address}
+
+    Returns the 32-bit words as an array (usable as Memory/SRAM init).
+    """
     # create memory regions
     if isinstance(filename_or_regions, dict):
         regions = filename_or_regions
@@ -41,20 +65,8 @@ def get_mem_data(filename_or_regions, endianness="big", mem_size=None):
              data_size, mem_size))
 
     # fill data
-    data = [0]*math.ceil(data_size/4)
+    data = array(_word_typecode, bytes(4*math.ceil(data_size/4)))
     for filename, base in regions.items():
-        with open(filename, "rb") as f:
-            i = 0
-            while True:
-                w = f.read(4)
-                if not w:
-                    break
-                if len(w) != 4:
-                    for _ in range(len(w), 4):
-                        w += b'\x00'
-                if endianness == "little":
-                    data[int(base, 16)//4 + i] = struct.unpack("<I", w)[0]
-                else:
-                    data[int(base, 16)//4 + i] = struct.unpack(">I", w)[0]
-                i += 1
+        words = _get_file_words(filename, endianness)
+        data[int(base, 16)//4:int(base, 16)//4 + len(words)] = words
     return data
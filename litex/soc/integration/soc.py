@@ -4,12 +4,12 @@
 # License: BSD
 
 import logging
-import time
-import datetime
 from math import log2, ceil
 
 from migen import *
 
+from litex.build.tools import format_build_time, set_build_time
+
 from litex.soc.cores import cpu
 from litex.soc.cores.identifier import Identifier
 from litex.soc.cores.timer import Timer
@@ -45,8 +45,7 @@ def colorer(s, color="bright"):
     return header + str(s) + trailer
 
 def build_time(with_time=True):
-    fmt = "%Y-%m-%d %H:%M:%S" if with_time else "%Y-%m-%d"
-    return datetime.datetime.fromtimestamp(time.time()).strftime(fmt)
+    return format_build_time(with_time)
 
 # SoCConstant --------------------------------------------------------------------------------------
 
@@ -105,12 +104,30 @@ class SoCCSRRegion:
 # SoCBusHandler ------------------------------------------------------------------------------------
 
 class SoCBusHandler(Module):
-    supported_standard      = ["wishbone"]
+    # Standards:
+    # - wishbone:           classic Wishbone (one access at a time per master).
+    # - wishbone-pipelined: pipelined Wishbone B4 (stall signal, multiple in-flight requests),
+    #                       classic masters/slaves are connected through adapters. Only integrated
+    #                       RAMs are pipelined slaves: the in-tree CPUs/bridges and main_ram/L2 are
+    #                       classic and adapted, so the mode only benefits user pipelined masters
+    #                       accessing integrated RAMs and is otherwise a pure cost.
+    # - axi:                AXI4 (independent read/write channels, bursts, IDs), Wishbone
+    #                       masters/slaves are connected through bridges.
+    supported_standard      = ["wishbone", "wishbone-pipelined", "axi"]
     supported_data_width    = [32, 64]
     supported_address_width = [32]
+    # Interconnects:
+    # - shared:   masters are arbitrated on a single bus (one access at a time).
+    # - crossbar: each slave has its own arbiter, masters access different slaves in parallel.
+    # - hybrid:   crossbar between the masters and the cached (memory) regions, IO slaves share a
+    #             single crossbar port.
+    supported_interconnect  = ["shared", "crossbar", "hybrid"]
+    # ID width of the AXI slaves (the IDs of the masters are extended with the index of the master).
+    axi_id_width            = 8
 
     # Creation -------------------------------------------------------------------------------------
-    def __init__(self, standard, data_width=32, address_width=32, timeout=1e6, reserved_regions={}):
+    def __init__(self, standard, data_width=32, address_width=32, timeout=1e6, reserved_regions={},
+        interconnect="shared"):
         self.logger = logging.getLogger("SoCBusHandler")
         self.logger.info("Creating Bus Handler...")
 
@@ -138,8 +155,24 @@ class SoCBusHandler(Module):
                 colorer(", ".join(str(x) for x in self.supported_address_width))))
             raise
 
+        # Check Interconnect
+        if interconnect not in self.supported_interconnect:
+            self.logger.error("Unsupported {} {}, supporteds: {:s}".format(
+                colorer("Interconnect", color="red"),
+                colorer(interconnect),
+                colorer(", ".join(self.supported_interconnect))))
+            raise
+        if standard == "axi" and interconnect == "hybrid":
+            self.logger.error("{} Interconnect {} with {} Bus standard.".format(
+                colorer(interconnect),
+                colorer("not supported", color="red"),
+                colorer(standard)))
+            raise
+
         # Create Bus
         self.standard      = standard
+        self.pipelined     = (standard == "wishbone-pipelined")
+        self.interconnect  = interconnect
         self.data_width    = data_width
         self.address_width = address_width
         self.masters       = {}
@@ -282,18 +315,112 @@ class SoCBusHandler(Module):
         return is_io
 
     # Add Master/Slave -----------------------------------------------------------------------------
-    def add_adapter(self, name, interface):
+    def add_adapter(self, name, interface, direction="m2s"):
+        assert direction in ["m2s", "s2m"]
+
+        def adapt_mode(interface, pipelined):
+            new_interface = wishbone.Interface(data_width=interface.data_width, pipelined=pipelined)
+            if direction == "m2s":
+                master, slave = interface, new_interface
+            else:
+                master, slave = new_interface, interface
+            if pipelined ^ (direction == "s2m"):
+                self.submodules += wishbone.ClassicToPipelined(master, slave)
+            else:
+                self.submodules += wishbone.PipelinedToClassic(master, slave)
+            return new_interface
+
+        def bridge(interface):
+            shift = log2_int(interface.data_width//8)
+            if isinstance(interface, axi.AXIInterface):
+                new_interface = wishbone.Interface(
+                    data_width = interface.data_width,
+                    adr_width  = interface.address_width - shift)
+                if direction == "m2s":
+                    self.submodules += axi.AXI2Wishbone(interface, new_interface)
+                else:
+                    self.submodules += axi.Wishbone2AXI(new_interface, interface)
+            else:
+                if interface.pipelined:
+                    interface = adapt_mode(interface, pipelined=False)
+                wb_interface  = wishbone.Interface(
+                    data_width = interface.data_width,
+                    adr_width  = self.address_width - shift)
+                new_interface = axi.AXIInterface(
+                    data_width    = interface.data_width,
+                    address_width = self.address_width,
+                    id_width      = 1 if direction == "m2s" else self.axi_id_width)
+                if direction == "m2s":
+                    self.comb += interface.connect(wb_interface)
+                    self.submodules += axi.Wishbone2AXI(wb_interface, new_interface)
+                else:
+                    self.comb += wb_interface.connect(interface)
+                    self.submodules += axi.AXI2Wishbone(new_interface, wb_interface)
+            return new_interface
+
+        # AXI to Wishbone bridging
+        if isinstance(interface, axi.AXIInterface) and self.standard != "axi":
+            self.logger.info("{} Bus {} from {} to {}.".format(
+                colorer(name),
+                colorer("bridged", color="cyan"),
+                colorer("axi"),
+                colorer("wishbone")))
+            interface = bridge(interface)
+
+        # AXI Data Width conversion
+        if isinstance(interface, axi.AXIInterface):
+            if interface.data_width != self.data_width:
+                self.logger.info("{} Bus {} from {}-bit to {}-bit.".format(
+                    colorer(name),
+                    colorer("converted", color="cyan"),
+                    colorer(interface.data_width),
+                    colorer(self.data_width)))
+                new_interface = axi.AXIInterface(
+                    data_width    = self.data_width,
+                    address_width = interface.address_width,
+                    id_width      = interface.id_width)
+                if direction == "m2s":
+                    self.submodules += axi.AXIConverter(interface, new_interface)
+                else:
+                    self.submodules += axi.AXIConverter(new_interface, interface)
+                interface = new_interface
+            return interface
+
+        # Data Width conversion (on classic interfaces)
         if interface.data_width != self.data_width:
             self.logger.info("{} Bus {} from {}-bit to {}-bit.".format(
                 colorer(name),
                 colorer("converted", color="cyan"),
                 colorer(interface.data_width),
                 colorer(self.data_width)))
+            if interface.pipelined:
+                interface = adapt_mode(interface, pipelined=False)
             new_interface = wishbone.Interface(data_width=self.data_width)
-            self.submodules += wishbone.Converter(interface, new_interface)
-            return new_interface
-        else:
-            return interface
+            if direction == "m2s":
+                self.submodules += wishbone.Converter(interface, new_interface)
+            else:
+                self.submodules += wishbone.Converter(new_interface, interface)
+            interface = new_interface
+
+        # Wishbone to AXI bridging
+        if self.standard == "axi":
+            self.logger.info("{} Bus {} from {} to {}.".format(
+                colorer(name),
+                colorer("bridged", color="cyan"),
+                colorer("wishbone"),
+                colorer("axi")))
+            return bridge(interface)
+
+        # Classic/Pipelined adaptation
+        if interface.pipelined != self.pipelined:
+            self.logger.info("{} Bus {} from {} to {}.".format(
+                colorer(name),
+                colorer("adapted", color="cyan"),
+                colorer("pipelined" if interface.pipelined else "classic"),
+                colorer("pipelined" if self.pipelined else "classic")))
+            interface = adapt_mode(interface, pipelined=self.pipelined)
+
+        return interface
 
     def add_master(self, name=None, master=None):
         if name is None:
@@ -304,7 +431,7 @@ class SoCBusHandler(Module):
                 colorer("already declared", color="red")))
             self.logger.error(self)
             raise
-        master = self.add_adapter(name, master)
+        master = self.add_adapter(name, master, "m2s")
         self.masters[name] = master
         self.logger.info("{} {} as Bus Master.".format(
             colorer(name,    color="underline"),
@@ -336,7 +463,7 @@ class SoCBusHandler(Module):
                 colorer("already declared", color="red")))
             self.logger.error(self)
             raise
-        slave = self.add_adapter(name, slave)
+        slave = self.add_adapter(name, slave, "s2m")
         self.slaves[name] = slave
         self.logger.info("{} {} as Bus Slave.".format(
             colorer(name, color="underline"),
@@ -344,8 +471,9 @@ class SoCBusHandler(Module):
 
     # Str ------------------------------------------------------------------------------------------
     def __str__(self):
-        r = "{}-bit {} Bus, {}GiB Address Space.\n".format(
-            colorer(self.data_width), colorer(self.standard), colorer(2**self.address_width/2**30))
+        r = "{}-bit {} Bus, {}GiB Address Space, {} Interconnect.\n".format(
+            colorer(self.data_width), colorer(self.standard), colorer(2**self.address_width/2**30),
+            colorer(self.interconnect))
         r += "IO Regions: ({})\n".format(len(self.io_regions.keys())) if len(self.io_regions.keys()) else ""
         io_regions = {k: v for k, v in sorted(self.io_regions.items(), key=lambda item: item[1].origin)}
         for name, region in io_regions.items():
@@ -642,6 +770,7 @@ class SoC(Module):
         bus_address_width    = 32,
         bus_timeout          = 1e6,
         bus_reserved_regions = {},
+        bus_interconnect     = "shared",
 
         csr_data_width       = 32,
         csr_address_width    = 14,
@@ -660,6 +789,8 @@ class SoC(Module):
         self.logger.info(colorer("     /____/_/\\__/\\__/_/|_|  ", color="bright"))
         self.logger.info(colorer("  Build your hardware, easily!", color="bright"))
 
+        # Build time captured once per SoC, shared by its identifier, logs and generated files.
+        set_build_time()
         self.logger.info(colorer("-"*80, color="bright"))
         self.logger.info(colorer("Creating SoC... ({})".format(build_time())))
         self.logger.info(colorer("-"*80, color="bright"))
@@ -679,6 +810,7 @@ class SoC(Module):
             address_width    = bus_address_width,
             timeout          = bus_timeout,
             reserved_regions = bus_reserved_regions,
+            interconnect     = bus_interconnect,
            )
 
         # SoC Bus Handler --------------------------------------------------------------------------
@@ -737,7 +869,7 @@ class SoC(Module):
         self.csr.add(name, use_loc_if_exists=True)
 
     def add_ram(self, name, origin, size, contents=[], mode="rw"):
-        ram_bus = wishbone.Interface(data_width=self.bus.data_width)
+        ram_bus = wishbone.Interface(data_width=self.bus.data_width, pipelined=self.bus.pipelined)
         ram     = wishbone.SRAM(size, bus=ram_bus, init=contents, read_only=(mode == "r"))
         self.bus.add_slave(name, ram.bus, SoCRegion(origin=origin, size=size, mode=mode))
         self.check_if_exists(name)
@@ -813,11 +945,42 @@ class SoC(Module):
         bus_masters = self.bus.masters.values()
         bus_slaves  = [(self.bus.regions[n].decoder(self.bus), s) for n, s in self.bus.slaves.items()]
         if len(bus_masters) and len(bus_slaves):
-            self.submodules.bus_interconnect = wishbone.InterconnectShared(
-                masters        = bus_masters,
-                slaves         = bus_slaves,
-                register       = True,
-                timeout_cycles = self.bus.timeout)
+            if self.bus.standard == "axi":
+                interconnect_cls = {
+                    "shared":   axi.AXIInterconnectShared,
+                    "crossbar": axi.AXICrossbar,
+                }[self.bus.interconnect]
+                self.submodules.bus_interconnect = interconnect_cls(
+                    masters        = bus_masters,
+                    slaves         = bus_slaves,
+                    timeout_cycles = self.bus.timeout)
+            elif self.bus.interconnect == "shared":
+                self.submodules.bus_interconnect = wishbone.InterconnectShared(
+                    masters        = bus_masters,
+                    slaves         = bus_slaves,
+                    register       = True,
+                    timeout_cycles = self.bus.timeout)
+            elif self.bus.interconnect == "crossbar":
+                self.submodules.bus_interconnect = wishbone.Crossbar(
+                    masters        = bus_masters,
+                    slaves         = bus_slaves,
+                    register       = True,
+                    timeout_cycles = self.bus.timeout)
+            elif self.bus.interconnect == "hybrid":
+                bus_slave_groups = []
+                bus_io_slaves    = []
+                for (decoder, slave), name in zip(bus_slaves, self.bus.slaves.keys()):
+                    if self.bus.regions[name].cached:
+                        bus_slave_groups.append([(decoder, slave)])
+                    else:
+                        bus_io_slaves.append((decoder, slave))
+                if len(bus_io_slaves):
+                    bus_slave_groups.append(bus_io_slaves)
+                self.submodules.bus_interconnect = wishbone.InterconnectHybrid(
+                    masters        = bus_masters,
+                    slave_groups   = bus_slave_groups,
+                    register       = True,
+                    timeout_cycles = self.bus.timeout)
             if hasattr(self, "ctrl") and self.bus.timeout is not None:
                 self.comb += self.ctrl.bus_error.eq(self.bus_interconnect.timeout.error)
 
@@ -979,6 +1142,8 @@ class LiteXSoC(SoC):
     # Add SDRAM ------------------------------------------------------------------------------------
     def add_sdram(self, name, phy, module, origin, size=None,
         l2_cache_size           = 8192,
+        l2_cache_ways           = 1,
+        l2_cache_replacement    = "lru",
         l2_cache_min_data_width = 128,
         l2_cache_reverse        = True,
         l2_cache_full_memory_we = True,
@@ -1020,26 +1185,43 @@ class LiteXSoC(SoC):
                     port         = port,
                     base_address = self.bus.regions["main_ram"].origin)
             else:
-                self.logger.info("Converting MEM data width: {} to {} via Wishbone".format(
+                self.logger.info("Converting MEM data width: {} to {}".format(
                     port.data_width,
                     self.cpu.mem_axi.data_width))
-                # FIXME: replace WB data-width converter with native AXI converter!!!
-                mem_wb  = wishbone.Interface(
-                    data_width = self.cpu.mem_axi.data_width,
-                    adr_width  = 32-log2_int(self.cpu.mem_axi.data_width//8))
-                # NOTE: AXI2Wishbone FSMs must be reset with the CPU!
-                mem_a2w = ResetInserter()(axi.AXI2Wishbone(
-                    axi          = self.cpu.mem_axi,
-                    wishbone     = mem_wb,
-                    base_address = 0))
-                self.comb += mem_a2w.reset.eq(ResetSignal() | self.cpu.reset)
-                self.submodules += mem_a2w
-                litedram_wb = wishbone.Interface(port.data_width)
-                self.submodules += LiteDRAMWishbone2Native(
-                    wishbone     = litedram_wb,
+                mem_axi = axi.AXIInterface(
+                    data_width    = port.data_width,
+                    address_width = self.cpu.mem_axi.address_width,
+                    id_width      = self.cpu.mem_axi.id_width)
+                # NOTE: AXIConverter FSMs/FIFOs must be reset with the CPU!
+                mem_converter = ResetInserter()(axi.AXIConverter(self.cpu.mem_axi, mem_axi))
+                self.comb += mem_converter.reset.eq(ResetSignal() | self.cpu.reset)
+                self.submodules += mem_converter
+                self.submodules += LiteDRAMAXI2Native(
+                    axi          = mem_axi,
                     port         = port,
-                    base_address = origin)
-                self.submodules += wishbone.Converter(mem_wb, litedram_wb)
+                    base_address = self.bus.regions["main_ram"].origin)
+        elif self.bus.standard == "axi":
+            # AXI Slave SDRAM interface (no L2 cache, accesses are directly converted to LiteDRAM).
+            if (l2_cache_size, l2_cache_ways, l2_cache_replacement) != (8192, 1, "lru"):
+                self.logger.warning("{} L2 Cache parameters {} with {} Bus.".format(
+                    colorer(name),
+                    colorer("ignored", color="red"),
+                    colorer("axi")))
+            axi_sdram = axi.AXIInterface(
+                data_width    = self.bus.data_width,
+                address_width = self.bus.address_width,
+                id_width      = self.bus.axi_id_width)
+            self.bus.add_slave("main_ram", axi_sdram)
+            litedram_axi = axi.AXIInterface(
+                data_width    = port.data_width,
+                address_width = self.bus.address_width,
+                id_width      = self.bus.axi_id_width)
+            self.submodules.axi_converter = axi.AXIConverter(axi_sdram, litedram_axi)
+            self.add_config("L2_SIZE", 0)
+
+            # AXI Slave <--> LiteDRAM bridge
+            self.submodules.axi_bridge = LiteDRAMAXI2Native(litedram_axi, port,
+                base_address = self.bus.regions["main_ram"].origin)
         elif self.with_wishbone:
             # Wishbone Slave SDRAM interface
             wb_sdram = wishbone.Interface()
@@ -1048,14 +1230,17 @@ class LiteXSoC(SoC):
             # L2 Cache
             if l2_cache_size != 0:
                 # Insert L2 cache inbetween Wishbone bus and LiteDRAM
-                l2_cache_size = max(l2_cache_size, int(2*port.data_width/8)) # Use minimal size if lower
-                l2_cache_size = 2**int(log2(l2_cache_size))                  # Round to nearest power of 2
                 l2_cache_data_width = max(port.data_width, l2_cache_min_data_width)
+                l2_cache_min_size   = int(2*l2_cache_ways*l2_cache_data_width/8)  # 2 lines per way
+                l2_cache_size = max(l2_cache_size, l2_cache_min_size) # Use minimal size if lower
+                l2_cache_size = 2**int(log2(l2_cache_size))           # Round to nearest power of 2
                 l2_cache            = wishbone.Cache(
-                    cachesize = l2_cache_size//4,
-                    master    = wb_sdram,
-                    slave     = wishbone.Interface(l2_cache_data_width),
-                    reverse   = l2_cache_reverse)
+                    cachesize   = l2_cache_size//4,
+                    master      = wb_sdram,
+                    slave       = wishbone.Interface(l2_cache_data_width),
+                    reverse     = l2_cache_reverse,
+                    ways        = l2_cache_ways,
+                    replacement = l2_cache_replacement)
                 if l2_cache_full_memory_we:
                     l2_cache = FullMemoryWE()(l2_cache)
                 self.submodules.l2_cache = l2_cache
@@ -91,19 +91,23 @@ class SoCCore(LiteXSoC):
         with_timer               = True,
         # Controller parameters
         with_ctrl                = True,
+        # Bus parameters
+        bus_standard             = "wishbone",
         # Wishbone parameters
         with_wishbone            = True,
         wishbone_timeout_cycles  = 1e6,
+        wishbone_interconnect    = "shared",
         # Others
         **kwargs):
 
         # New LiteXSoC class ----------------------------------------------------------------------------
         LiteXSoC.__init__(self, platform, clk_freq,
-            bus_standard         = "wishbone",
+            bus_standard         = bus_standard,
             bus_data_width       = 32,
             bus_address_width    = 32,
             bus_timeout          = wishbone_timeout_cycles,
             bus_reserved_regions = {},
+            bus_interconnect     = wishbone_interconnect,
 
             csr_data_width       = csr_data_width,
             csr_address_width    = csr_address_width,
@@ -133,7 +137,7 @@ class SoCCore(LiteXSoC):
         self.cpu_variant                = cpu_variant
 
         self.integrated_rom_size        = integrated_rom_size
-        self.integrated_rom_initialized = integrated_rom_init != []
+        self.integrated_rom_initialized = len(integrated_rom_init) > 0
         self.integrated_sram_size       = integrated_sram_size
         self.integrated_main_ram_size   = integrated_main_ram_size
 
@@ -296,6 +300,14 @@ def soc_core_args(parser):
     # Controller parameters
     parser.add_argument("--no-ctrl", action="store_true",
                         help="Disable Controller (default=False)")
+    # Bus parameters
+    parser.add_argument("--bus-standard", default="wishbone", type=str,
+                        help="Bus standard: wishbone, wishbone-pipelined or axi (default=wishbone), "
+                             "wishbone-pipelined only benefits pipelined masters accessing integrated RAMs "
+                             "(in-tree CPUs and main_ram/L2 are adapted to classic)")
+    # Wishbone parameters
+    parser.add_argument("--wishbone-interconnect", default="shared", type=str,
+                        help="Wishbone interconnect: shared, crossbar or hybrid (default=shared)")
 
 def soc_core_argdict(args):
     r = dict()
@@ -22,12 +22,16 @@ __all__ = ["SoCSDRAM", "soc_sdram_args", "soc_sdram_argdict"]
 class SoCSDRAM(SoCCore):
     def __init__(self, platform, clk_freq,
         l2_size           = 8192,
+        l2_ways           = 1,
+        l2_replacement    = "lru",
         l2_reverse        = True,
         min_l2_data_width = 128,
         max_sdram_size    = None,
         **kwargs):
         SoCCore.__init__(self, platform, clk_freq, **kwargs)
         self.l2_size           = l2_size
+        self.l2_ways           = l2_ways
+        self.l2_replacement    = l2_replacement
         self.l2_reverse        = l2_reverse
         self.min_l2_data_width = min_l2_data_width
         self.max_sdram_size    = max_sdram_size
@@ -43,6 +47,8 @@ class SoCSDRAM(SoCCore):
             origin                  = self.mem_map["main_ram"],
             size                    = self.max_sdram_size,
             l2_cache_size           = self.l2_size,
+            l2_cache_ways           = self.l2_ways,
+            l2_cache_replacement    = self.l2_replacement,
             l2_cache_min_data_width = self.min_l2_data_width,
             l2_cache_reverse        = self.l2_reverse,
             **kwargs,
@@ -55,6 +61,10 @@ def soc_sdram_args(parser):
     # L2 Cache
     parser.add_argument("--l2-size", default=8192, type=auto_int,
                         help="L2 cache size (default=8192)")
+    parser.add_argument("--l2-ways", default=1, type=auto_int,
+                        help="L2 cache associativity: 1 (direct-mapped), 2 or 4 ways (default=1)")
+    parser.add_argument("--l2-replacement", default="lru", type=str,
+                        help="L2 cache replacement policy: lru or plru (default=lru)")
     parser.add_argument("--min-l2-data-width", default=128, type=auto_int,
                         help="Minimum L2 cache datawidth (default=128)")
 
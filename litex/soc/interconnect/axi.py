@@ -4,7 +4,12 @@
 
 """AXI4 Full/Lite support for LiteX"""
 
+from functools import reduce
+from operator import or_
+
 from migen import *
+from migen.genlib import roundrobin
+from migen.genlib.misc import WaitTimer
 
 from litex.soc.interconnect import stream
 from litex.build.generic_platform import *
@@ -68,6 +73,15 @@ class AXIInterface:
         self.ar = stream.Endpoint(ax_description(address_width, id_width))
         self.r  = stream.Endpoint(r_description(data_width, id_width))
 
+    def connect(self, slave):
+        return [
+            self.aw.connect(slave.aw),
+            self.w.connect(slave.w),
+            slave.b.connect(self.b),
+            self.ar.connect(slave.ar),
+            slave.r.connect(self.r),
+        ]
+
 # AXI Lite Definition ------------------------------------------------------------------------------
 
 def ax_lite_description(address_width):
@@ -483,3 +497,660 @@ class Wishbone2AXILite(Module):
             wishbone.err.eq(1),
             NextState("IDLE")
         )
+
+# AXI Lite to AXI ----------------------------------------------------------------------------------
+
+class AXILite2AXI(Module):
+    def __init__(self, axi_lite, axi, write_id=0, read_id=0):
+        assert axi_lite.data_width    == axi.data_width
+        assert axi_lite.address_width == axi.address_width
+
+        # Each AXI Lite access is a single beat burst.
+        size = log2_int(axi.data_width//8)
+        self.comb += [
+            # aw/w/b
+            axi.aw.valid.eq(axi_lite.aw.valid),
+            axi_lite.aw.ready.eq(axi.aw.ready),
+            axi.aw.addr.eq(axi_lite.aw.addr),
+            axi.aw.burst.eq(BURST_INCR),
+            axi.aw.len.eq(0),
+            axi.aw.size.eq(size),
+            axi.aw.id.eq(write_id),
+            axi.w.valid.eq(axi_lite.w.valid),
+            axi_lite.w.ready.eq(axi.w.ready),
+            axi.w.last.eq(1),
+            axi.w.data.eq(axi_lite.w.data),
+            axi.w.strb.eq(axi_lite.w.strb),
+            axi.w.id.eq(write_id),
+            axi_lite.b.valid.eq(axi.b.valid),
+            axi.b.ready.eq(axi_lite.b.ready),
+            axi_lite.b.resp.eq(axi.b.resp),
+            # ar/r
+            axi.ar.valid.eq(axi_lite.ar.valid),
+            axi_lite.ar.ready.eq(axi.ar.ready),
+            axi.ar.addr.eq(axi_lite.ar.addr),
+            axi.ar.burst.eq(BURST_INCR),
+            axi.ar.len.eq(0),
+            axi.ar.size.eq(size),
+            axi.ar.id.eq(read_id),
+            axi_lite.r.valid.eq(axi.r.valid),
+            axi.r.ready.eq(axi_lite.r.ready),
+            axi_lite.r.resp.eq(axi.r.resp),
+            axi_lite.r.data.eq(axi.r.data),
+        ]
+
+# Wishbone to AXI ----------------------------------------------------------------------------------
+
+class Wishbone2AXI(Module):
+    def __init__(self, wishbone, axi, base_address=0x00000000):
+        axi_lite          = AXILiteInterface(axi.data_width, axi.address_width)
+        wishbone2axi_lite = Wishbone2AXILite(wishbone, axi_lite, base_address)
+        axi_lite2axi      = AXILite2AXI(axi_lite, axi)
+        self.submodules += wishbone2axi_lite, axi_lite2axi
+
+# AXI Data-Width Converters ------------------------------------------------------------------------
+
+class AXIUpConverter(Module):
+    """AXIUpConverter
+
+    This module converts AXI accesses from a master interface to a wider slave interface and
+    keeps the bursts and IDs.
+
+    Writes:
+        Beats of the master bursts are packed in beats of the slave bursts.
+
+    Reads:
+        Beats of the slave bursts are split in beats of the master bursts. The bursts parameters
+        are queued, so the slave must return the read bursts in order.
+
+    Supports INCR bursts of full width beats and single beats (of any size).
+    """
+    def __init__(self, master, slave, fifo_depth=16):
+        dw_from    = master.data_width
+        dw_to      = slave.data_width
+        ratio      = dw_to//dw_from
+        ratio_bits = log2_int(ratio)
+        from_shift = log2_int(dw_from//8)
+        to_shift   = log2_int(dw_to//8)
+
+        # # #
+
+        # Address channels: bursts are aligned on the slave data width, the offset of the first
+        # beat (and the length for reads) is queued for the data channels.
+        w_cmd = stream.SyncFIFO([("offset", ratio_bits)], fifo_depth)
+        r_cmd = stream.SyncFIFO([("offset", ratio_bits), ("len", 8)], fifo_depth)
+        self.submodules += w_cmd, r_cmd
+        for m_ax, s_ax, cmd in [(master.aw, slave.aw, w_cmd), (master.ar, slave.ar, r_cmd)]:
+            offset = m_ax.addr[from_shift:to_shift]
+            self.comb += [
+                s_ax.valid.eq(m_ax.valid & cmd.sink.ready),
+                m_ax.ready.eq(s_ax.ready & cmd.sink.ready),
+                s_ax.addr.eq(Cat(Replicate(0, to_shift), m_ax.addr[to_shift:])),
+                s_ax.burst.eq(BURST_INCR),
+                s_ax.len.eq((offset + m_ax.len) >> ratio_bits),
+                s_ax.size.eq(to_shift),
+                s_ax.lock.eq(m_ax.lock),
+                s_ax.prot.eq(m_ax.prot),
+                s_ax.cache.eq(m_ax.cache),
+                s_ax.qos.eq(m_ax.qos),
+                s_ax.id.eq(m_ax.id),
+                cmd.sink.valid.eq(m_ax.valid & s_ax.ready),
+                cmd.sink.offset.eq(offset),
+            ]
+        self.comb += r_cmd.sink.len.eq(master.ar.len)
+
+        # Write data: packs the master beats, a slave beat is sent on the last beat of the burst
+        # or when the upper beat of the slave data width is written.
+        w_first = Signal(reset=1)
+        w_index = Signal(ratio_bits)
+        w_pos   = Signal(ratio_bits)
+        w_send  = Signal()
+        w_data  = [Signal(dw_from)    for i in range(ratio)]
+        w_strb  = [Signal(dw_from//8) for i in range(ratio)]
+        self.comb += [
+            If(w_first,
+                w_pos.eq(w_cmd.source.offset)
+            ).Else(
+                w_pos.eq(w_index)
+            ),
+            w_send.eq((w_pos == (ratio - 1)) | master.w.last),
+            slave.w.valid.eq(master.w.valid & w_cmd.source.valid & w_send),
+            master.w.ready.eq(w_cmd.source.valid & (~w_send | slave.w.ready)),
+            slave.w.last.eq(master.w.last),
+            slave.w.id.eq(master.w.id),
+            w_cmd.source.ready.eq(master.w.valid & master.w.ready & master.w.last),
+        ]
+        for i in range(ratio):
+            self.comb += [
+                If(w_pos == i,
+                    slave.w.data[i*dw_from:(i+1)*dw_from].eq(master.w.data),
+                    slave.w.strb[i*dw_from//8:(i+1)*dw_from//8].eq(master.w.strb),
+                ).Else(
+                    slave.w.data[i*dw_from:(i+1)*dw_from].eq(w_data[i]),
+                    slave.w.strb[i*dw_from//8:(i+1)*dw_from//8].eq(w_strb[i]),
+                )
+            ]
+            self.sync += [
+                If(master.w.valid & master.w.ready,
+                    If(w_send,
+                        w_strb[i].eq(0)
+                    ).Elif(w_pos == i,
+                        w_data[i].eq(master.w.data),
+                        w_strb[i].eq(master.w.strb)
+                    )
+                )
+            ]
+        self.sync += [
+            If(master.w.valid & master.w.ready,
+                w_first.eq(master.w.last),
+                w_index.eq(w_pos + 1)
+            )
+        ]
+
+        # Write response.
+        self.comb += slave.b.connect(master.b)
+
+        # Read data: splits the slave beats.
+        r_first = Signal(reset=1)
+        r_index = Signal(ratio_bits)
+        r_pos   = Signal(ratio_bits)
+        r_count = Signal(8)
+        self.comb += [
+            If(r_first,
+                r_pos.eq(r_cmd.source.offset)
+            ).Else(
+                r_pos.eq(r_index)
+            ),
+            master.r.valid.eq(slave.r.valid & r_cmd.source.valid),
+            master.r.last.eq(r_count == r_cmd.source.len),
+            master.r.resp.eq(slave.r.resp),
+            master.r.id.eq(slave.r.id),
+            master.r.data.eq(Array([slave.r.data[i*dw_from:(i+1)*dw_from]
+                for i in range(ratio)])[r_pos]),
+            slave.r.ready.eq(r_cmd.source.valid & master.r.ready &
+                ((r_pos == (ratio - 1)) | master.r.last)),
+            r_cmd.source.ready.eq(master.r.valid & master.r.ready & master.r.last),
+        ]
+        self.sync += [
+            If(master.r.valid & master.r.ready,
+                r_first.eq(master.r.last),
+                r_index.eq(r_pos + 1),
+                If(master.r.last,
+                    r_count.eq(0)
+                ).Else(
+                    r_count.eq(r_count + 1)
+                )
+            )
+        ]
+
+
+class AXIDownConverter(Module):
+    """AXIDownConverter
+
+    This module converts AXI accesses from a master interface to a narrower slave interface and
+    keeps the bursts and IDs: each beat of the master is split in ratio beats of the slave
+    (writes) or gathered from ratio beats of the slave (reads).
+
+    Slave bursts are limited to 256 beats, so master INCR bursts longer than max_burst = 256/ratio
+    beats are split in several slave bursts. A split burst is only issued once the previous
+    accesses of its direction are completed and the next accesses wait for its completion: all
+    its responses are then received in order, the intermediate write responses are merged in the
+    last one and the read data only get last on the last slave burst.
+    """
+    def __init__(self, master, slave, max_pending=256):
+        dw_from    = master.data_width
+        dw_to      = slave.data_width
+        ratio      = dw_from//dw_to
+        ratio_bits = log2_int(ratio)
+        to_shift   = log2_int(dw_to//8)
+        from_shift = log2_int(dw_from//8)
+        burst_bits = 8 - ratio_bits
+        self.max_burst = max_burst = 2**burst_bits
+
+        # # #
+
+        # Address channels (the master address is accepted with the first slave burst, the next
+        # ones of split bursts are issued from a copy).
+        final = {}
+        for ax_name, resp_name in [("aw", "b"), ("ar", "r")]:
+            m_ax      = getattr(master, ax_name)
+            s_ax      = getattr(slave, ax_name)
+            s_resp    = getattr(slave, resp_name)
+            ax        = Record(ax_description(master.address_width, master.id_width))
+            ax_r      = Record(ax_description(master.address_width, master.id_width))
+            chunk     = Signal(ratio_bits)     # Slave burst being issued.
+            chunks    = Signal(ratio_bits + 1) # Responses of the split burst to receive.
+            split     = Signal()
+            last      = Signal()
+            allowed   = Signal()
+            pending   = Signal(max=max_pending + 1)
+            resp_done = s_resp.valid & s_resp.ready
+            if resp_name == "r":
+                resp_done = resp_done & s_resp.last
+            final[resp_name] = (chunks == 0) | (chunks == 1)
+            self.comb += [
+                If(chunk == 0,
+                    ax.eq(m_ax.payload),
+                    s_ax.valid.eq(m_ax.valid & allowed),
+                    m_ax.ready.eq(s_ax.ready & allowed)
+                ).Else(
+                    ax.eq(ax_r),
+                    s_ax.valid.eq(1)
+                ),
+                split.eq(ax.len[burst_bits:] != 0),
+                last.eq(chunk == ax.len[burst_bits:]),
+                If(chunks == 0,
+                    allowed.eq(Mux(split, pending == 0, pending != max_pending))
+                ),
+                [getattr(s_ax, name).eq(getattr(ax, name)) for name in ["lock", "prot", "cache", "qos", "id"]],
+                s_ax.addr.eq(Cat(Replicate(0, from_shift), ax.addr[from_shift:]) +
+                    (chunk << (8 + to_shift))),
+                s_ax.burst.eq(BURST_INCR),
+                If(last,
+                    s_ax.len.eq(Cat(Replicate(1, ratio_bits), ax.len[:burst_bits]))
+                ).Else(
+                    s_ax.len.eq(255)
+                ),
+                s_ax.size.eq(to_shift),
+            ]
+            self.sync += [
+                If(s_ax.valid & s_ax.ready,
+                    If(last,
+                        chunk.eq(0)
+                    ).Else(
+                        chunk.eq(chunk + 1)
+                    ),
+                    If(chunk == 0,
+                        ax_r.eq(m_ax.payload),
+                        If(split,
+                            chunks.eq(ax.len[burst_bits:] + 1)
+                        )
+                    )
+                ),
+                If(resp_done & (chunks != 0),
+                    chunks.eq(chunks - 1)
+                ),
+                pending.eq(pending + (s_ax.valid & s_ax.ready) - resp_done)
+            ]
+
+        # Write data.
+        w_count = Signal(ratio_bits)
+        w_done  = Signal()
+        w_beat  = Signal(burst_bits) # Master beat in the slave burst.
+        self.comb += [
+            w_done.eq(w_count == (ratio - 1)),
+            slave.w.valid.eq(master.w.valid),
+            slave.w.last.eq(w_done & (master.w.last | (w_beat == (max_burst - 1)))),
+            slave.w.id.eq(master.w.id),
+            slave.w.data.eq(Array([master.w.data[i*dw_to:(i+1)*dw_to]
+                for i in range(ratio)])[w_count]),
+            slave.w.strb.eq(Array([master.w.strb[i*dw_to//8:(i+1)*dw_to//8]
+                for i in range(ratio)])[w_count]),
+            master.w.ready.eq(slave.w.ready & w_done),
+        ]
+        self.sync += [
+            If(slave.w.valid & slave.w.ready, w_count.eq(w_count + 1)),
+            If(master.w.valid & master.w.ready,
+                If(master.w.last,
+                    w_beat.eq(0)
+                ).Else(
+                    w_beat.eq(w_beat + 1)
+                )
+            )
+        ]
+
+        # Write response (the responses of the split bursts are merged in the last one).
+        b_resp = Signal(2)
+        self.comb += [
+            slave.b.connect(master.b, omit={"valid", "ready", "resp"}),
+            master.b.resp.eq(b_resp | slave.b.resp),
+            If(final["b"],
+                master.b.valid.eq(slave.b.valid),
+                slave.b.ready.eq(master.b.ready)
+            ).Else(
+                slave.b.ready.eq(1)
+            )
+        ]
+        self.sync += If(slave.b.valid & slave.b.ready,
+            If(final["b"],
+                b_resp.eq(0)
+            ).Else(
+                b_resp.eq(b_resp | slave.b.resp)
+            )
+        )
+
+        # Read data.
+        r_count = Signal(ratio_bits)
+        r_done  = Signal()
+        r_data  = [Signal(dw_to) for i in range(ratio - 1)]
+        r_resp  = Signal(2)
+        self.comb += [
+            r_done.eq(r_count == (ratio - 1)),
+            master.r.valid.eq(slave.r.valid & r_done),
+            master.r.last.eq(slave.r.last & final["r"]),
+            master.r.id.eq(slave.r.id),
+            master.r.data.eq(Cat(*r_data, slave.r.data)),
+            master.r.resp.eq(r_resp | slave.r.resp),
+            slave.r.ready.eq(~r_done | master.r.ready),
+        ]
+        self.sync += [
+            If(slave.r.valid & slave.r.ready,
+                r_count.eq(r_count + 1),
+                If(r_done,
+                    r_resp.eq(0)
+                ).Else(
+                    r_resp.eq(r_resp | slave.r.resp),
+                    Case(r_count, {i: r_data[i].eq(slave.r.data) for i in range(ratio - 1)})
+                )
+            )
+        ]
+
+
+class AXIConverter(Module):
+    """AXIConverter
+
+    This module is a wrapper for AXIDownConverter and AXIUpConverter.
+    """
+    def __init__(self, master, slave):
+        self.master = master
+        self.slave  = slave
+
+        # # #
+
+        dw_from = master.data_width
+        dw_to   = slave.data_width
+        if dw_from > dw_to:
+            self.submodules.converter = AXIDownConverter(master, slave)
+        elif dw_from < dw_to:
+            self.submodules.converter = AXIUpConverter(master, slave)
+        else:
+            self.comb += master.connect(slave)
+
+# AXI Arbiter --------------------------------------------------------------------------------------
+
+class AXIArbiter(Module):
+    """AXIArbiter
+
+    This module arbitrates the accesses of the masters to the target, with a round-robin on each
+    address channel. The index of the master is appended to the IDs to route the responses, the
+    write data follow the order of the write addresses.
+    """
+    def __init__(self, masters, target, fifo_depth=16):
+        n          = len(masters)
+        id_width   = max(m.id_width for m in masters)
+        index_bits = max(log2_int(n, need_pow2=False), 1)
+        assert target.id_width >= id_width + index_bits
+
+        # # #
+
+        def mux(channel, name, index):
+            return Array(getattr(getattr(m, channel), name) for m in masters)[index]
+
+        w_order = stream.SyncFIFO([("index", index_bits)], fifo_depth)
+        self.submodules += w_order
+
+        for channel in ["aw", "ar"]:
+            ax = getattr(target, channel)
+            rr = roundrobin.RoundRobin(n, roundrobin.SP_CE)
+            setattr(self.submodules, channel + "_rr", rr)
+            ready = w_order.sink.ready if channel == "aw" else 1
+            self.comb += [
+                rr.request.eq(Cat(*[getattr(m, channel).valid for m in masters])),
+                # Switch when the granted master is not requesting or its address is accepted.
+                rr.ce.eq(~ax.valid | ax.ready),
+                ax.valid.eq(mux(channel, "valid", rr.grant) & ready),
+                ax.id.eq(Cat(mux(channel, "id", rr.grant), rr.grant)),
+            ]
+            for name, width in ax_description(target.address_width, target.id_width):
+                if name != "id":
+                    self.comb += getattr(ax, name).eq(mux(channel, name, rr.grant))
+            for i, m in enumerate(masters):
+                self.comb += getattr(m, channel).ready.eq(ax.ready & ready & (rr.grant == i))
+            if channel == "aw":
+                self.comb += [
+                    w_order.sink.valid.eq(ax.valid & ax.ready),
+                    w_order.sink.index.eq(rr.grant),
+                ]
+
+        # Write data.
+        w_index = w_order.source.index
+        self.comb += [
+            target.w.valid.eq(mux("w", "valid", w_index) & w_order.source.valid),
+            target.w.last.eq(mux("w", "last", w_index)),
+            target.w.data.eq(mux("w", "data", w_index)),
+            target.w.strb.eq(mux("w", "strb", w_index)),
+            target.w.id.eq(Cat(mux("w", "id", w_index), w_index)),
+            w_order.source.ready.eq(target.w.valid & target.w.ready & target.w.last),
+        ]
+        for i, m in enumerate(masters):
+            self.comb += m.w.ready.eq(target.w.ready & w_order.source.valid & (w_index == i))
+
+        # Responses: routed with the index of the master in the ID.
+        for channel in ["b", "r"]:
+            resp  = getattr(target, channel)
+            index = resp.id[id_width:id_width + index_bits]
+            self.comb += resp.ready.eq(mux(channel, "ready", index))
+            for i, m in enumerate(masters):
+                self.comb += [
+                    resp.connect(getattr(m, channel), omit={"valid", "ready"}),
+                    getattr(m, channel).valid.eq(resp.valid & (index == i)),
+                ]
+
+# AXI Decoder --------------------------------------------------------------------------------------
+
+class AXIDecodeError(Module):
+    """AXIDecodeError
+
+    AXI slave answering all the accesses with a DECERR response.
+    """
+    def __init__(self, bus):
+        self.bus = bus
+
+        # # #
+
+        w_id = Signal(bus.id_width)
+        self.submodules.write_fsm = write_fsm = FSM(reset_state="IDLE")
+        write_fsm.act("IDLE",
+            bus.aw.ready.eq(1),
+            If(bus.aw.valid,
+                NextValue(w_id, bus.aw.id),
+                NextState("WRITE")
+            )
+        )
+        write_fsm.act("WRITE",
+            bus.w.ready.eq(1),
+            If(bus.w.valid & bus.w.last,
+                NextState("WRITE-RESP")
+            )
+        )
+        write_fsm.act("WRITE-RESP",
+            bus.b.valid.eq(1),
+            bus.b.resp.eq(RESP_DECERR),
+            bus.b.id.eq(w_id),
+            If(bus.b.ready,
+                NextState("IDLE")
+            )
+        )
+
+        r_id    = Signal(bus.id_width)
+        r_len   = Signal(8)
+        r_count = Signal(8)
+        self.submodules.read_fsm = read_fsm = FSM(reset_state="IDLE")
+        read_fsm.act("IDLE",
+            bus.ar.ready.eq(1),
+            If(bus.ar.valid,
+                NextValue(r_id,    bus.ar.id),
+                NextValue(r_len,   bus.ar.len),
+                NextValue(r_count, 0),
+                NextState("READ")
+            )
+        )
+        read_fsm.act("READ",
+            bus.r.valid.eq(1),
+            bus.r.resp.eq(RESP_DECERR),
+            bus.r.data.eq(2**bus.data_width - 1),
+            bus.r.id.eq(r_id),
+            bus.r.last.eq(r_count == r_len),
+            If(bus.r.ready,
+                NextValue(r_count, r_count + 1),
+                If(bus.r.last,
+                    NextState("IDLE")
+                )
+            )
+        )
+
+
+class AXIDecoder(Module):
+    """AXIDecoder
+
+    This module routes the accesses of the master to the slaves. slaves is a list of pairs:
+    0) function that takes the address (in words of the master data width, as for
+       wishbone.Decoder) and returns a FHDL expression that evaluates to 1 when the slave is
+       selected and 0 otherwise.
+    1) AXIInterface reference.
+
+    Up to max_pending accesses can be in flight in each direction, all to the same slave: an
+    access to another slave is stalled until the responses are received, which keeps the
+    responses in order. Accesses matching no slave get a DECERR response.
+    """
+    def __init__(self, master, slaves, max_pending=16):
+        shift = log2_int(master.data_width//8)
+        error = AXIInterface(master.data_width, master.address_width, master.id_width)
+        self.submodules.error = AXIDecodeError(error)
+
+        # # #
+
+        slaves = list(slaves)
+        ns     = len(slaves)
+        for fun, bus in slaves:
+            assert bus.id_width >= master.id_width
+        slaves.append((lambda a: 0, error))
+
+        for ax_name, data_name, resp_name in [("aw", "w", "b"), ("ar", None, "r")]:
+            m_ax    = getattr(master, ax_name)
+            m_resp  = getattr(master, resp_name)
+            sel     = Signal(ns + 1)
+            sel_r   = Signal(ns + 1)
+            pending = Signal(max=max_pending + 1)
+            hold    = Signal()
+            self.comb += [sel[i].eq(fun(m_ax.addr[shift:])) for i, (fun, bus) in enumerate(slaves[:-1])]
+            self.comb += [
+                sel[ns].eq(sel[:ns] == 0),
+                hold.eq(((pending != 0) & (sel != sel_r)) | (pending == max_pending)),
+            ]
+            resp_done = m_resp.valid & m_resp.ready
+            if resp_name == "r":
+                resp_done = resp_done & m_resp.last
+            self.sync += [
+                If(m_ax.valid & m_ax.ready,
+                    sel_r.eq(sel)
+                ),
+                pending.eq(pending + (m_ax.valid & m_ax.ready) - resp_done)
+            ]
+            for i, (fun, bus) in enumerate(slaves):
+                s_ax   = getattr(bus, ax_name)
+                s_resp = getattr(bus, resp_name)
+                self.comb += [
+                    # Address: to the selected slave.
+                    m_ax.connect(s_ax, omit={"valid", "ready"}),
+                    s_ax.valid.eq(m_ax.valid & sel[i] & ~hold),
+                    If(sel[i] & ~hold,
+                        m_ax.ready.eq(s_ax.ready)
+                    ),
+                    # Responses: from the slave of the pending accesses.
+                    If(sel_r[i],
+                        s_resp.connect(m_resp)
+                    )
+                ]
+                if data_name is not None:
+                    m_data = getattr(master, data_name)
+                    s_data = getattr(bus, data_name)
+                    # Write data: to the slave of the pending writes.
+                    self.comb += [
+                        m_data.connect(s_data, omit={"valid", "ready"}),
+                        s_data.valid.eq(m_data.valid & sel_r[i] & (pending != 0)),
+                        If(sel_r[i] & (pending != 0),
+                            m_data.ready.eq(s_data.ready)
+                        )
+                    ]
+
+# AXI Timeout --------------------------------------------------------------------------------------
+
+class AXITimeout(Module):
+    """AXITimeout
+
+    This module reports an error (on error) when a master (or each master of a list) waits for
+    more than cycles cycles without any transfer. Since responses of AXI bursts can't be generated
+    safely, the accesses are not terminated.
+    """
+    def __init__(self, master, cycles):
+        self.error = Signal()
+
+        # # #
+
+        masters = master if isinstance(master, (list, tuple)) else [master]
+        errors  = []
+        for master in masters:
+            channels = [master.aw, master.w, master.b, master.ar, master.r]
+            pending  = Signal(16)
+            busy     = Signal()
+            transfer = Signal()
+            error    = Signal()
+            timer    = WaitTimer(int(cycles))
+            self.submodules += timer
+            self.sync += pending.eq(pending +
+                (master.aw.valid & master.aw.ready) - (master.b.valid & master.b.ready) +
+                (master.ar.valid & master.ar.ready) -
+                (master.r.valid & master.r.ready & master.r.last))
+            self.comb += [
+                busy.eq((pending != 0) | master.aw.valid | master.w.valid | master.ar.valid),
+                transfer.eq(reduce(or_, [c.valid & c.ready for c in channels])),
+                timer.wait.eq(busy & ~transfer & ~timer.done),
+                error.eq(timer.done)
+            ]
+            errors.append(error)
+        self.comb += self.error.eq(reduce(or_, errors))
+
+# AXI Interconnect ---------------------------------------------------------------------------------
+
+def _axi_arbiter_id_width(masters):
+    return max(m.id_width for m in masters) + max(log2_int(len(masters), need_pow2=False), 1)
+
+
+class AXIInterconnectShared(Module):
+    """AXIInterconnectShared
+
+    Masters are arbitrated on a single AXI bus, then decoded to the slaves (the IDs of the
+    slaves must be wide enough for the IDs of the masters and the index of the master).
+    """
+    def __init__(self, masters, slaves, timeout_cycles=1e6):
+        masters = list(masters)
+        shared  = AXIInterface(
+            data_width    = masters[0].data_width,
+            address_width = masters[0].address_width,
+            id_width      = _axi_arbiter_id_width(masters))
+        self.submodules.arbiter = AXIArbiter(masters, shared)
+        self.submodules.decoder = AXIDecoder(shared, slaves)
+        if timeout_cycles is not None:
+            self.submodules.timeout = AXITimeout(shared, timeout_cycles)
+
+
+class AXICrossbar(Module):
+    """AXICrossbar
+
+    Each master is decoded to a row of access interfaces, each slave arbitrates its column: masters
+    accessing different slaves are not serialized.
+    """
+    def __init__(self, masters, slaves, timeout_cycles=None):
+        masters = list(masters)
+        matches, busses = zip(*slaves)
+        access = [[AXIInterface(m.data_width, m.address_width, m.id_width) for j in slaves]
+            for m in masters]
+        # decode each master into its access row
+        for row, master in zip(access, masters):
+            self.submodules += AXIDecoder(master, list(zip(matches, row)))
+        # arbitrate each access column onto its slave
+        for column, bus in zip(zip(*access), busses):
+            self.submodules += AXIArbiter(column, bus)
+        if timeout_cycles is not None:
+            self.submodules.timeout = AXITimeout(masters, timeout_cycles)
@@ -10,7 +10,7 @@ from migen import *
 from migen.genlib import roundrobin
 from migen.genlib.record import *
 from migen.genlib.misc import split, displacer, chooser, WaitTimer
-from migen.genlib.fsm import FSM, NextState
+from migen.genlib.fsm import FSM, NextState, NextValue
 
 from litex.soc.interconnect import csr
 from litex.build.generic_platform import *
@@ -32,12 +32,31 @@ _layout = [
     ("err",              1, DIR_S_TO_M)
 ]
 
+# Pipelined (Wishbone B4) mode: a request is accepted on each cycle with stb and without stall,
+# several requests can be in flight and are acked in order (at the earliest on the cycle following
+# their acceptance). cyc is kept asserted until the last ack.
+_layout_pipelined = _layout + [
+    ("stall",            1, DIR_S_TO_M)
+]
+
+CTI_BURST_NONE         = 0b000
+CTI_BURST_CONSTANT     = 0b001
+CTI_BURST_INCREMENTING = 0b010
+CTI_BURST_END          = 0b111
+
+
+def burst_next_address(adr, bte):
+    # Address of the next beat of an incrementing burst: linear (bte=0) or wrapped on 4, 8 or 16
+    # beats (bte=1, 2, 3).
+    return Array([adr + 1] + [Cat((adr[:n] + 1)[:n], adr[n:]) for n in [2, 3, 4]])[bte]
+
 
 class Interface(Record):
-    def __init__(self, data_width=32, adr_width=30):
+    def __init__(self, data_width=32, adr_width=30, pipelined=False):
         self.data_width = data_width
         self.adr_width  = adr_width
-        Record.__init__(self, set_layout_parameters(_layout,
+        self.pipelined  = pipelined
+        Record.__init__(self, set_layout_parameters(_layout_pipelined if pipelined else _layout,
             adr_width  = adr_width,
             data_width = data_width,
             sel_width  = data_width//8))
@@ -48,12 +67,17 @@ class Interface(Record):
 
     @staticmethod
     def like(other):
-        return Interface(len(other.dat_w))
+        return Interface(len(other.dat_w), pipelined=other.pipelined)
 
     def _do_transaction(self):
         yield self.cyc.eq(1)
         yield self.stb.eq(1)
         yield
+        if self.pipelined:
+            while (yield self.stall):
+                yield
+            yield self.stb.eq(0)
+            yield
         while not (yield self.ack):
             yield
         yield self.cyc.eq(0)
@@ -110,19 +134,23 @@ class Arbiter(Module):
         self.submodules.rr = roundrobin.RoundRobin(len(masters))
 
         # mux master->slave signals
-        for name, size, direction in _layout:
+        for name, size, direction in target.layout:
             if direction == DIR_M_TO_S:
                 choices = Array(getattr(m, name) for m in masters)
                 self.comb += getattr(target, name).eq(choices[self.rr.grant])
 
         # connect slave->master signals
-        for name, size, direction in _layout:
+        for name, size, direction in target.layout:
             if direction == DIR_S_TO_M:
                 source = getattr(target, name)
                 for i, m in enumerate(masters):
                     dest = getattr(m, name)
                     if name == "ack" or name == "err":
                         self.comb += dest.eq(source & (self.rr.grant == i))
+                    elif name == "stall":
+                        # masters not granted are stalled (grant only changes when cyc is released,
+                        # so after the last ack of the pipelined requests).
+                        self.comb += dest.eq(source | (self.rr.grant != i))
                     else:
                         self.comb += dest.eq(source)
 
@@ -138,7 +166,10 @@ class Decoder(Module):
     # 1) wishbone.Slave reference.
     # register adds flip-flops after the address comparators. Improves timing,
     # but breaks Wishbone combinatorial feedback.
-    def __init__(self, master, slaves, register=False):
+    # With pipelined interfaces, up to max_pending requests can be in flight, all to the same
+    # slave: requests to another slave are stalled until the responses are received, which keeps
+    # them in order (register is not used, the responses are always muxed from a register).
+    def __init__(self, master, slaves, register=False, max_pending=16):
         ns = len(slaves)
         slave_sel = Signal(ns)
         slave_sel_r = Signal(ns)
@@ -146,7 +177,25 @@ class Decoder(Module):
         # decode slave addresses
         self.comb += [slave_sel[i].eq(fun(master.adr))
             for i, (fun, bus) in enumerate(slaves)]
-        if register:
+        if master.pipelined:
+            pending = Signal(max=max_pending + 1)
+            hold    = Signal()
+            self.sync += [
+                If(master.cyc & master.stb & ~master.stall,
+                    slave_sel_r.eq(slave_sel)
+                ),
+                If(~master.cyc,
+                    pending.eq(0)
+                ).Else(
+                    pending.eq(pending + (master.stb & ~master.stall) - master.ack)
+                )
+            ]
+            self.comb += [
+                hold.eq(((pending != 0) & (slave_sel != slave_sel_r)) | (pending == max_pending)),
+                master.stall.eq(hold | reduce(or_, [slave_sel[i] & slave[1].stall
+                    for i, slave in enumerate(slaves)]))
+            ]
+        elif register:
             self.sync += slave_sel_r.eq(slave_sel)
         else:
             self.comb += slave_sel_r.eq(slave_sel)
@@ -158,8 +207,17 @@ class Decoder(Module):
                     self.comb += getattr(slave[1], name).eq(getattr(master, name))
 
         # combine cyc with slave selection signals
-        self.comb += [slave[1].cyc.eq(master.cyc & slave_sel[i])
-            for i, slave in enumerate(slaves)]
+        if master.pipelined:
+            self.comb += [
+                If(pending != 0,
+                    slave[1].cyc.eq(master.cyc & slave_sel_r[i])
+                ).Else(
+                    slave[1].cyc.eq(master.cyc & slave_sel[i])
+                ) for i, slave in enumerate(slaves)]
+            self.comb += [slave[1].stb.eq(master.stb & ~hold) for slave in slaves]
+        else:
+            self.comb += [slave[1].cyc.eq(master.cyc & slave_sel[i])
+                for i, slave in enumerate(slaves)]
 
         # generate master ack (resp. err) by ORing all slave acks (resp. errs)
         self.comb += [
@@ -173,26 +231,41 @@ class Decoder(Module):
 
 
 class Timeout(Module):
+    # master can be a list of masters, error is then asserted on a timeout of any of them.
     def __init__(self, master, cycles):
         self.error = Signal()
 
         # # #
 
-        timer = WaitTimer(int(cycles))
-        self.submodules += timer
-        self.comb += [
-            timer.wait.eq(master.stb & master.cyc & ~master.ack),
-            If(timer.done,
-                master.dat_r.eq((2**len(master.dat_w))-1),
-                master.ack.eq(1),
-                self.error.eq(1)
-            )
-        ]
+        masters = master if isinstance(master, (list, tuple)) else [master]
+        for master in masters:
+            timer = WaitTimer(int(cycles))
+            self.submodules += timer
+            if master.pipelined:
+                # waits for the responses of the accepted requests.
+                pending = Signal(16)
+                self.sync += \
+                    If(~master.cyc,
+                        pending.eq(0)
+                    ).Else(
+                        pending.eq(pending + (master.stb & ~master.stall) - master.ack)
+                    )
+                self.comb += timer.wait.eq(master.cyc & (pending != 0) & ~master.ack)
+            else:
+                self.comb += timer.wait.eq(master.stb & master.cyc & ~master.ack)
+            self.comb += [
+                If(timer.done,
+                    master.dat_r.eq((2**len(master.dat_w))-1),
+                    master.ack.eq(1),
+                    self.error.eq(1)
+                )
+            ]
 
 
 class InterconnectShared(Module):
     def __init__(self, masters, slaves, register=False, timeout_cycles=1e6):
-        shared = Interface()
+        masters = list(masters)
+        shared  = Interface.like(masters[0])
         self.submodules.arbiter = Arbiter(masters, shared)
         self.submodules.decoder = Decoder(shared, slaves, register)
         if timeout_cycles is not None:
@@ -200,9 +273,10 @@ class InterconnectShared(Module):
 
 
 class Crossbar(Module):
-    def __init__(self, masters, slaves, register=False):
+    def __init__(self, masters, slaves, register=False, timeout_cycles=None):
+        masters = list(masters)
         matches, busses = zip(*slaves)
-        access = [[Interface() for j in slaves] for i in masters]
+        access = [[Interface.like(masters[0]) for j in slaves] for i in masters]
         # decode each master into its access row
         for row, master in zip(access, masters):
             row = list(zip(matches, row))
@@ -210,6 +284,78 @@ class Crossbar(Module):
         # arbitrate each access column onto its slave
         for column, bus in zip(zip(*access), busses):
             self.submodules += Arbiter(column, bus)
+        if timeout_cycles is not None:
+            self.submodules.timeout = Timeout(masters, timeout_cycles)
+
+
+class InterconnectHybrid(Module):
+    """Crossbar between the masters and groups of slaves
+
+    slave_groups is a list of lists of (match, bus) pairs. Masters access different groups in
+    parallel, slaves of a group share a single crossbar port (and decoder).
+    """
+    def __init__(self, masters, slave_groups, register=False, timeout_cycles=1e6):
+        masters = list(masters)
+        slaves  = []
+        for group in slave_groups:
+            if len(group) == 1:
+                slaves.append(group[0])
+            else:
+                matches = [match for match, bus in group]
+                shared  = Interface.like(group[0][1])
+                self.submodules += Decoder(shared, group, register)
+                slaves.append((lambda a, matches=matches: reduce(or_, [m(a) for m in matches]), shared))
+        self.submodules.crossbar = Crossbar(masters, slaves, register, timeout_cycles)
+        if timeout_cycles is not None:
+            self.timeout = self.crossbar.timeout
+
+
+class ClassicToPipelined(Module):
+    """ClassicToPipelined
+
+    This module connects a classic master to a pipelined slave: each classic access is issued as
+    a single pipelined request.
+    """
+    def __init__(self, master, slave):
+        issued = Signal()
+        self.comb += [
+            master.connect(slave, omit={"stb"}),
+            slave.stb.eq(master.cyc & master.stb & ~issued)
+        ]
+        self.sync += \
+            If(slave.ack | ~master.cyc,
+                issued.eq(0)
+            ).Elif(slave.stb & ~slave.stall,
+                issued.eq(1)
+            )
+
+
+class PipelinedToClassic(Module):
+    """PipelinedToClassic
+
+    This module connects a pipelined master to a classic slave: requests are registered and
+    presented one at a time to the slave, the next request is accepted with the ack of the
+    current one.
+    """
+    def __init__(self, master, slave):
+        busy = Signal()
+        self.comb += [
+            master.stall.eq(busy & ~slave.ack),
+            slave.cyc.eq(busy),
+            slave.stb.eq(busy),
+            master.ack.eq(busy & slave.ack),
+            master.err.eq(busy & slave.err),
+            master.dat_r.eq(slave.dat_r)
+        ]
+        self.sync += \
+            If(master.cyc & master.stb & ~master.stall,
+                busy.eq(1),
+                [getattr(slave, name).eq(getattr(master, name))
+                    for name, size, direction in _layout
+                    if direction == DIR_M_TO_S and name not in ["cyc", "stb"]]
+            ).Elif(slave.ack | ~master.cyc,
+                busy.eq(0)
+            )
 
 
 class DownConverter(Module):
@@ -226,6 +372,9 @@ class DownConverter(Module):
         Read from master are splitted in N reads to the the slave. Read datas from
         the slave are cached before being presented concatenated on the last access.
 
+    Accesses to the slave are done with incrementing bursts. When the master does a linear
+    incrementing burst, the slave burst continues across the master words.
+
     """
     def __init__(self, master, slave):
         dw_from = len(master.dat_r)
@@ -249,6 +398,9 @@ class DownConverter(Module):
         counter_done = Signal()
         self.comb += counter_done.eq(counter == ratio-1)
 
+        master_burst = Signal()
+        self.comb += master_burst.eq(master.cti == CTI_BURST_INCREMENTING)
+
         # Main FSM
         self.submodules.fsm = fsm = FSM(reset_state="IDLE")
         fsm.act("IDLE",
@@ -271,7 +423,9 @@ class DownConverter(Module):
                     counter_ce.eq(1),
                     If(counter_done,
                         master.ack.eq(1),
-                        NextState("IDLE")
+                        If(~master_burst,
+                            NextState("IDLE")
+                        )
                     )
                 )
             ).Elif(~master.cyc,
@@ -287,7 +441,9 @@ class DownConverter(Module):
                     counter_ce.eq(1),
                     If(counter_done,
                         master.ack.eq(1),
-                        NextState("IDLE")
+                        If(~master_burst,
+                            NextState("IDLE")
+                        )
                     )
                 )
             ).Elif(~master.cyc,
@@ -297,10 +453,10 @@ class DownConverter(Module):
 
         # Address
         self.comb += [
-            If(counter_done,
-                slave.cti.eq(7) # indicate end of burst
+            If(counter_done & ~(master_burst & (master.bte == 0)),
+                slave.cti.eq(CTI_BURST_END) # indicate end of burst
             ).Else(
-                slave.cti.eq(2)
+                slave.cti.eq(CTI_BURST_INCREMENTING)
             ),
             slave.adr.eq(Cat(counter, master.adr))
         ]
@@ -345,7 +501,7 @@ class UpConverter(Module):
 
     Reads:
         Cache is refilled only at the beginning of each burst, the subsequent
-        reads of a burst use the cached data.
+        reads of a burst use the cached data and are acked on each cycle.
 
     """
     def __init__(self, master, slave):
@@ -377,7 +533,11 @@ class UpConverter(Module):
         counter_offset = Signal(max=ratio)
         counter_done = Signal()
         self.comb += [
-            counter_offset.eq(address.q),
+            If(read,
+                counter_offset.eq(master.adr)
+            ).Else(
+                counter_offset.eq(address.q)
+            ),
             counter_done.eq((counter + counter_offset) == ratio-1)
         ]
 
@@ -386,7 +546,8 @@ class UpConverter(Module):
 
         end_of_burst = Signal()
         self.comb += end_of_burst.eq(~master.cyc |
-                                     (master.stb & master.cyc & master.ack & ((master.cti == 7) | counter_done)))
+                                     (master.stb & master.cyc & master.ack &
+                                      ((master.cti != CTI_BURST_INCREMENTING) | counter_done)))
 
 
         need_refill = FlipFlop(reset=1)
@@ -418,7 +579,7 @@ class UpConverter(Module):
                 write.eq(1),
                 counter_ce.eq(1),
                 master.ack.eq(1),
-                If(counter_done,
+                If(counter_done | (master.cti != CTI_BURST_INCREMENTING),
                     NextState("EVICT")
                 )
             ).Elif(~master.cyc,
@@ -448,14 +609,18 @@ class UpConverter(Module):
         fsm.act("READ",
             read.eq(1),
             If(master.stb & master.cyc,
-                master.ack.eq(1)
-            ),
-            NextState("IDLE")
+                master.ack.eq(1),
+                If((master.cti != CTI_BURST_INCREMENTING) | counter_done,
+                    NextState("IDLE")
+                )
+            ).Else(
+                NextState("IDLE")
+            )
         )
 
         # Address
         self.comb += [
-            slave.cti.eq(7), # we are not able to generate bursts since up-converting
+            slave.cti.eq(CTI_BURST_END), # we are not able to generate bursts since up-converting
             slave.adr.eq(address.q[ratiobits:])
         ]
 
@@ -486,7 +651,7 @@ class UpConverter(Module):
         cases = {}
         for i in range(ratio):
             cases[i] = master.dat_r.eq(cached_datas[i].q)
-        self.comb += Case(address.q[:ratiobits], cases)
+        self.comb += Case(master.adr[:ratiobits], cases)
 
         self.comb += [
             cached_data.eq(Cat([cached_data.q for cached_data in cached_datas])),
@@ -519,13 +684,60 @@ class Converter(Module):
             self.comb += master.connect(slave)
 
 
+def _lru_victim(state, ways):
+    # LRU state: way indexes ordered from the most to the least recently used.
+    waybits = log2_int(ways)
+    return state[(ways - 1)*waybits:]
+
+
+def _lru_update(state, ways, way):
+    # Move the accessed way in front, the ways that were in front of it move down by one.
+    waybits = log2_int(ways)
+    entries = [state[i*waybits:(i + 1)*waybits] for i in range(ways)]
+    new     = [way]
+    for i in range(1, ways):
+        in_front = reduce(or_, [entries[j] == way for j in range(i)])
+        new.append(Mux(in_front, entries[i], entries[i - 1]))
+    return Cat(*new)
+
+
+def _plru_victim(state, ways, node=0):
+    # PLRU state: a tree of ways - 1 bits, each bit points to the least recently used half.
+    if node >= ways - 1:
+        return C(node - (ways - 1), log2_int(ways))
+    return Mux(state[node], _plru_victim(state, ways, 2*node + 2), _plru_victim(state, ways, 2*node + 1))
+
+
+def _plru_update(state, ways, way):
+    # Point the bits on the path of the accessed way to the other halves.
+    new = []
+    for node in range(ways - 1):
+        depth   = (node + 1).bit_length() - 1
+        index   = node - (2**depth - 1)
+        span    = log2_int(ways) - depth
+        in_tree = (way[span:] == index) if depth else 1
+        new.append(Mux(in_tree, ~way[span - 1], state[node]))
+    return Cat(*new)
+
+
 class Cache(Module):
     """Cache
 
     This module is a write-back wishbone cache that can be used as a L2 cache.
     Cachesize (in 32-bit words) is the size of the data store and must be a power of 2
+
+    The cache is direct-mapped (ways=1) or 2/4/...-way set-associative, the replaced way is the
+    least recently used one (replacement="lru") or a tree pseudo-LRU approximation
+    (replacement="plru").
+
+    Incrementing bursts from the master are acked on each cycle while they hit: the next line
+    is looked up while the current word is acked. Lines are evicted/refilled with incrementing
+    bursts on the slave.
+
+    Dirty lines are evicted to a write buffer: the refill starts immediately and the write buffer
+    is written back to the slave afterwards, while the following hits are served.
     """
-    def __init__(self, cachesize, master, slave, reverse=True):
+    def __init__(self, cachesize, master, slave, reverse=True, ways=1, replacement="lru"):
         self.master = master
         self.slave = slave
 
@@ -537,66 +749,146 @@ class Cache(Module):
             raise ValueError("Slave data width must be a multiple of {dw}".format(dw=dw_from))
         if dw_to < dw_from and (dw_from % dw_to) != 0:
             raise ValueError("Master data width must be a multiple of {dw}".format(dw=dw_to))
+        if replacement not in ["lru", "plru"]:
+            raise ValueError("Unsupported replacement policy {}".format(replacement))
 
         # Split address:
-        # TAG | LINE NUMBER | LINE OFFSET
+        # TAG | SET NUMBER | LINE OFFSET
         offsetbits = log2_int(max(dw_to//dw_from, 1))
         addressbits = len(slave.adr) + offsetbits
-        linebits = log2_int(cachesize) - offsetbits
+        waybits = log2_int(ways)
+        linebits = log2_int(cachesize) - offsetbits - waybits
+        if linebits < 0:
+            raise ValueError("Cache size too small for {} ways".format(ways))
         tagbits = addressbits - linebits
         wordbits = log2_int(max(dw_from//dw_to, 1))
         adr_offset, adr_line, adr_tag = split(master.adr, offsetbits, linebits, tagbits)
         word = Signal(wordbits) if wordbits else None
 
-        # Data memory
-        data_mem = Memory(dw_to*2**wordbits, 2**linebits)
-        data_port = data_mem.get_port(write_capable=True, we_granularity=8)
-        self.specials += data_mem, data_port
-
-        write_from_slave = Signal()
-        if adr_offset is None:
-            adr_offset_r = None
-        else:
-            adr_offset_r = Signal(offsetbits, reset_less=True)
-            self.sync += adr_offset_r.eq(adr_offset)
-
+        # Address of the tag/data lookups: the address of the next beat on read bursts hits.
+        burst_next = Signal()
+        adr_next   = Signal(len(master.adr))
+        adr_lookup = Signal(len(master.adr))
         self.comb += [
-            data_port.adr.eq(adr_line),
-            If(write_from_slave,
-                displacer(slave.dat_r, word, data_port.dat_w),
-                displacer(Replicate(1, dw_to//8), word, data_port.we)
+            adr_next.eq(burst_next_address(master.adr, master.bte)),
+            If(burst_next,
+                adr_lookup.eq(adr_next)
             ).Else(
-                data_port.dat_w.eq(Replicate(master.dat_w, max(dw_to//dw_from, 1))),
-                If(master.cyc & master.stb & master.we & master.ack,
-                    displacer(master.sel, adr_offset, data_port.we, 2**offsetbits, reverse=reverse)
-                )
-            ),
-            chooser(data_port.dat_r, word, slave.dat_w),
-            slave.sel.eq(2**(dw_to//8)-1),
-            chooser(data_port.dat_r, adr_offset_r, master.dat_r, reverse=reverse)
+                adr_lookup.eq(master.adr)
+            )
         ]
-
-
-        # Tag memory
-        tag_layout = [("tag", tagbits), ("dirty", 1)]
-        tag_mem = Memory(layout_len(tag_layout), 2**linebits)
-        tag_port = tag_mem.get_port(write_capable=True)
-        self.specials += tag_mem, tag_port
-        tag_do = Record(tag_layout)
-        tag_di = Record(tag_layout)
+        _, adr_lookup_line, _ = split(adr_lookup, offsetbits, linebits, tagbits)
+        set_adr        = adr_line if adr_line is not None else 0
+        set_adr_lookup = adr_lookup_line if adr_lookup_line is not None else 0
+
+        # Data and tag memories (one per way)
+        tag_layout = [("tag", tagbits), ("valid", 1), ("dirty", 1)]
+        tag_di     = Record(tag_layout)
+        data_ports = []
+        tag_ports  = []
+        tag_dos    = []
+        for way in range(ways):
+            data_mem = Memory(dw_to*2**wordbits, 2**linebits)
+            data_port = data_mem.get_port(write_capable=True, we_granularity=8)
+            tag_mem = Memory(layout_len(tag_layout), 2**linebits)
+            tag_port = tag_mem.get_port(write_capable=True)
+            self.specials += data_mem, data_port, tag_mem, tag_port
+            tag_do = Record(tag_layout)
+            self.comb += [
+                data_port.adr.eq(set_adr_lookup),
+                tag_port.adr.eq(set_adr_lookup),
+                tag_do.raw_bits().eq(tag_port.dat_r),
+                tag_port.dat_w.eq(tag_di.raw_bits())
+            ]
+            data_ports.append(data_port)
+            tag_ports.append(tag_port)
+            tag_dos.append(tag_do)
+        tag_dos = Array(tag_dos)
+
+        # Hit detection
+        hits    = Signal(ways)
+        hit     = Signal()
+        hit_way = Signal(max=max(ways, 2))
         self.comb += [
-            tag_do.raw_bits().eq(tag_port.dat_r),
-            tag_port.dat_w.eq(tag_di.raw_bits())
+            hits.eq(Cat(*[tag_do.valid & (tag_do.tag == adr_tag) for tag_do in tag_dos])),
+            hit.eq(hits != 0)
+        ]
+        for way in reversed(range(ways)):
+            self.comb += If(hits[way], hit_way.eq(way))
+
+        # Slave addresses of the refilled line and of the evicted line.
+        def slave_adr(word, line):
+            return Cat(*[s for s in (word, line) if s is not None])
+
+        # Replacement state (one entry per set): the victim is the first invalid way, or the way
+        # selected by the replacement policy.
+        victim   = Signal(max=max(ways, 2))
+        victim_r = Signal(max=max(ways, 2))
+        repl_we  = Signal()
+        repl_way = Signal(max=max(ways, 2))
+        if ways > 1:
+            if replacement == "lru":
+                repl_width  = ways*waybits
+                repl_init   = sum(way << (way*waybits) for way in range(ways))
+                repl_victim = _lru_victim
+                repl_update = _lru_update
+            else:
+                repl_width  = ways - 1
+                repl_init   = 0
+                repl_victim = _plru_victim
+                repl_update = _plru_update
+            repl_mem     = Memory(repl_width, 2**linebits, init=[repl_init]*2**linebits)
+            repl_rdport  = repl_mem.get_port()
+            repl_wrport  = repl_mem.get_port(write_capable=True)
+            self.specials += repl_mem, repl_rdport, repl_wrport
+            self.comb += [
+                repl_rdport.adr.eq(set_adr_lookup),
+                repl_wrport.adr.eq(set_adr),
+                repl_wrport.we.eq(repl_we),
+                repl_wrport.dat_w.eq(repl_update(repl_rdport.dat_r, ways, repl_way)),
+                victim.eq(repl_victim(repl_rdport.dat_r, ways))
+            ]
+            for way in reversed(range(ways)):
+                self.comb += If(~tag_dos[way].valid, victim.eq(way))
+
+        # Write buffer (one line): evicted line and its slave address.
+        wbuf_valid = Signal()
+        wbuf_load  = Signal()
+        wbuf_done  = Signal()
+        wbuf_data  = Signal(dw_to*2**wordbits)
+        wbuf_adr   = Signal(linebits + tagbits)
+        self.sync += [
+            If(wbuf_load,
+                wbuf_valid.eq(1),
+                wbuf_data.eq(Array(port.dat_r for port in data_ports)[victim]),
+                wbuf_adr.eq(Cat(adr_line, tag_dos[victim].tag))
+            ).Elif(wbuf_done,
+                wbuf_valid.eq(0)
+            )
         ]
 
+        write_from_slave = Signal()
+
+        for way, data_port in enumerate(data_ports):
+            self.comb += [
+                If(write_from_slave,
+                    data_port.dat_w.eq(Replicate(slave.dat_r, 2**wordbits)),
+                    If(victim_r == way,
+                        displacer(Replicate(1, dw_to//8), word, data_port.we)
+                    )
+                ).Else(
+                    data_port.dat_w.eq(Replicate(master.dat_w, max(dw_to//dw_from, 1))),
+                    If(master.cyc & master.stb & master.we & master.ack & hits[way],
+                        displacer(master.sel, adr_offset, data_port.we, 2**offsetbits, reverse=reverse)
+                    )
+                )
+            ]
         self.comb += [
-            tag_port.adr.eq(adr_line),
+            slave.sel.eq(2**(dw_to//8)-1),
+            chooser(Array(port.dat_r for port in data_ports)[hit_way], adr_offset, master.dat_r,
+                reverse=reverse),
             tag_di.tag.eq(adr_tag)
         ]
-        if word is not None:
-            self.comb += slave.adr.eq(Cat(word, adr_line, tag_do.tag))
-        else:
-            self.comb += slave.adr.eq(Cat(adr_line, tag_do.tag))
 
         # slave word computation, word_clr and word_inc will be simplified
         # at synthesis when wordbits=0
@@ -609,6 +901,15 @@ class Cache(Module):
                 ).Elif(word_inc,
                     word.eq(word+1)
                 )
+        wbuf_word = Signal(wordbits) if wordbits else None
+        wbuf_word_inc = Signal()
+        if wbuf_word is not None:
+            self.sync += \
+                If(wbuf_load,
+                    wbuf_word.eq(0),
+                ).Elif(wbuf_word_inc,
+                    wbuf_word.eq(wbuf_word+1)
+                )
 
         def word_is_last(word):
             if word is not None:
@@ -616,6 +917,19 @@ class Cache(Module):
             else:
                 return 1
 
+        # A burst beat is acked without going through IDLE when its tag/data are already looked
+        # up: always for reads, only in the same line for writes.
+        burst_continue = Signal()
+        self.comb += burst_continue.eq((master.cti == CTI_BURST_INCREMENTING) &
+            (~master.we | (adr_next[offsetbits:] == master.adr[offsetbits:])))
+
+        # A miss waits for the write buffer when it is being written back, when its line is in the
+        # write buffer or when the victim must be evicted to it.
+        victim_dirty  = Signal()
+        refill_wait   = Signal()
+        refill_start  = Signal()
+        self.comb += victim_dirty.eq(tag_dos[victim].valid & tag_dos[victim].dirty)
+
         # Control FSM
         self.submodules.fsm = fsm = FSM(reset_state="IDLE")
         fsm.act("IDLE",
@@ -625,43 +939,41 @@ class Cache(Module):
         )
         fsm.act("TEST_HIT",
             word_clr.eq(1),
-            If(tag_do.tag == adr_tag,
+            If(~(master.cyc & master.stb),
+                NextState("IDLE")
+            ).Elif(hit,
                 master.ack.eq(1),
+                repl_we.eq(1),
+                repl_way.eq(hit_way),
                 If(master.we,
+                    tag_di.valid.eq(1),
                     tag_di.dirty.eq(1),
-                    tag_port.we.eq(1)
-                ),
-                NextState("IDLE")
-            ).Else(
-                If(tag_do.dirty,
-                    NextState("EVICT")
+                    Array(port.we for port in tag_ports)[hit_way].eq(1)
                 ).Else(
-                    # Write the tag first to set the slave address
-                    tag_port.we.eq(1),
-                    word_clr.eq(1),
-                    NextState("REFILL")
-                )
-            )
-        )
-
-        fsm.act("EVICT",
-            slave.stb.eq(1),
-            slave.cyc.eq(1),
-            slave.we.eq(1),
-            If(slave.ack,
-                word_inc.eq(1),
-                 If(word_is_last(word),
-                    # Write the tag first to set the slave address
-                    tag_port.we.eq(1),
-                    word_clr.eq(1),
-                    NextState("REFILL")
+                    burst_next.eq(master.cti == CTI_BURST_INCREMENTING)
+                ),
+                If(~burst_continue,
+                    NextState("IDLE")
                 )
+            ).Elif(~refill_wait,
+                refill_start.eq(1),
+                repl_we.eq(1),
+                repl_way.eq(victim),
+                NextValue(victim_r, victim),
+                # Evict the victim to the write buffer
+                wbuf_load.eq(victim_dirty),
+                # Write the tag of the refilled line
+                tag_di.valid.eq(1),
+                Array(port.we for port in tag_ports)[victim].eq(1),
+                NextState("REFILL")
             )
         )
         fsm.act("REFILL",
             slave.stb.eq(1),
             slave.cyc.eq(1),
             slave.we.eq(0),
+            slave.adr.eq(slave_adr(word, Cat(adr_line, adr_tag))),
+            slave.cti.eq(Mux(word_is_last(word), CTI_BURST_END, CTI_BURST_INCREMENTING)),
             If(slave.ack,
                 write_from_slave.eq(1),
                 word_inc.eq(1),
@@ -673,6 +985,31 @@ class Cache(Module):
             )
         )
 
+        # Write buffer FSM: writes back the evicted line when the slave is not used for a refill.
+        self.submodules.wbuf_fsm = wbuf_fsm = FSM(reset_state="IDLE")
+        wbuf_fsm.act("IDLE",
+            If(wbuf_valid & ~refill_start & ~fsm.ongoing("REFILL"),
+                NextState("EVICT")
+            )
+        )
+        wbuf_fsm.act("EVICT",
+            slave.stb.eq(1),
+            slave.cyc.eq(1),
+            slave.we.eq(1),
+            slave.adr.eq(slave_adr(wbuf_word, wbuf_adr)),
+            chooser(wbuf_data, wbuf_word, slave.dat_w),
+            slave.cti.eq(Mux(word_is_last(wbuf_word), CTI_BURST_END, CTI_BURST_INCREMENTING)),
+            If(slave.ack,
+                wbuf_word_inc.eq(1),
+                If(word_is_last(wbuf_word),
+                    wbuf_done.eq(1),
+                    NextState("IDLE")
+                )
+            )
+        )
+        self.comb += refill_wait.eq(wbuf_valid & (wbuf_fsm.ongoing("EVICT") | victim_dirty |
+            (wbuf_adr == Cat(adr_line, adr_tag))))
+
 
 class SRAM(Module):
     def __init__(self, mem_or_size, read_only=None, init=None, bus=None):
@@ -701,18 +1038,38 @@ class SRAM(Module):
         if not read_only:
             self.comb += [port.we[i].eq(self.bus.cyc & self.bus.stb & self.bus.we & self.bus.sel[i])
                 for i in range(bus_data_width//8)]
+        # incrementing bursts: the next word is read while the current one is acked.
+        burst = Signal()
+        adr   = Signal(len(self.bus.adr))
+        if not self.bus.pipelined:
+            self.comb += burst.eq(self.bus.cyc & self.bus.stb &
+                (self.bus.cti == CTI_BURST_INCREMENTING))
+        self.comb += [
+            If(burst & self.bus.ack & ~self.bus.we,
+                adr.eq(burst_next_address(self.bus.adr, self.bus.bte))
+            ).Else(
+                adr.eq(self.bus.adr)
+            )
+        ]
         # address and data
         self.comb += [
-            port.adr.eq(self.bus.adr[:len(port.adr)]),
+            port.adr.eq(adr[:len(port.adr)]),
             self.bus.dat_r.eq(port.dat_r)
         ]
         if not read_only:
             self.comb += port.dat_w.eq(self.bus.dat_w),
         # generate ack
-        self.sync += [
-            self.bus.ack.eq(0),
-            If(self.bus.cyc & self.bus.stb & ~self.bus.ack, self.bus.ack.eq(1))
-        ]
+        if self.bus.pipelined:
+            # requests are never stalled, one request per cycle.
+            self.sync += self.bus.ack.eq(self.bus.cyc & self.bus.stb)
+        else:
+            # ack is qualified with stb: no ack during the wait states of the master in bursts.
+            ack = Signal()
+            self.sync += [
+                ack.eq(0),
+                If(self.bus.cyc & self.bus.stb & (~self.bus.ack | burst), ack.eq(1))
+            ]
+            self.comb += self.bus.ack.eq(ack & self.bus.cyc & self.bus.stb)
 
 
 class CSRBank(csr.GenericBank):
@@ -1,6 +1,9 @@
 # This file is Copyright (c) 2015-2018 Florent Kermarrec <florent@enjoy-digital.fr>
 # License: BSD
 
+from functools import reduce
+from operator import or_
+
 from migen import *
 
 from migen.genlib.misc import chooser, WaitTimer
@@ -12,17 +15,33 @@ from litex.soc.interconnect import stream
 
 
 class WishboneStreamingBridge(Module):
+    """Wishbone master controlled by a byte stream
+
+    Commands are: cmd (1 byte), length in words (1 byte, 0 for 256 words), word address (4 bytes),
+    followed by the data words for writes. Reads reply with the data words. Words are big-endian.
+
+    The "_noinc" commands access the same address for all the words (FIFO-like registers).
+    Received bytes are buffered in a `fifo_depth` bytes FIFO while a command is executed: several
+    commands can be sent without waiting for the replies of the previous ones.
+    """
     cmds = {
-        "write": 0x01,
-        "read": 0x02
+        "write":       0x01,
+        "read":        0x02,
+        "write_noinc": 0x05,
+        "read_noinc":  0x06,
     }
 
-    def __init__(self, phy, clk_freq):
+    def __init__(self, phy, clk_freq, fifo_depth=32):
         self.wishbone = wishbone.Interface()
 
         # # #
 
-        byte_counter = Signal(3, reset_less=True)
+        rx_fifo = stream.SyncFIFO([("data", 8)], fifo_depth, buffered=True)
+        self.submodules += rx_fifo
+        self.comb += phy.source.connect(rx_fifo.sink)
+        source = rx_fifo.source
+
+        byte_counter = Signal(2, reset_less=True)
         byte_counter_reset = Signal()
         byte_counter_ce = Signal()
         self.sync += \
@@ -32,7 +51,7 @@ class WishboneStreamingBridge(Module):
                 byte_counter.eq(byte_counter + 1)
             )
 
-        word_counter = Signal(3, reset_less=True)
+        word_counter = Signal(8, reset_less=True)
         word_counter_reset = Signal()
         word_counter_ce = Signal()
         self.sync += \
@@ -45,8 +64,9 @@ class WishboneStreamingBridge(Module):
         cmd = Signal(8, reset_less=True)
         cmd_ce = Signal()
 
-        length = Signal(8, reset_less=True)
-        length_ce = Signal()
+        noinc = Signal()
+        last = Signal(8, reset_less=True) # Length - 1.
+        last_ce = Signal()
 
         address = Signal(32, reset_less=True)
         address_ce = Signal()
@@ -56,11 +76,11 @@ class WishboneStreamingBridge(Module):
         tx_data_ce = Signal()
 
         self.sync += [
-            If(cmd_ce, cmd.eq(phy.source.data)),
-            If(length_ce, length.eq(phy.source.data)),
-            If(address_ce, address.eq(Cat(phy.source.data, address[0:24]))),
+            If(cmd_ce, cmd.eq(source.data)),
+            If(last_ce, last.eq(source.data - 1)),
+            If(address_ce, address.eq(Cat(source.data, address[0:24]))),
             If(rx_data_ce,
-                data.eq(Cat(phy.source.data, data[0:24]))
+                data.eq(Cat(source.data, data[0:24]))
             ).Elif(tx_data_ce,
                 data.eq(self.wishbone.dat_r)
             )
@@ -71,13 +91,16 @@ class WishboneStreamingBridge(Module):
         self.submodules += fsm, timer
         self.comb += [
             fsm.reset.eq(timer.done),
-            phy.source.ready.eq(1)
+            noinc.eq(cmd[2]),
+            source.ready.eq(fsm.ongoing("IDLE") |
+                            fsm.ongoing("RECEIVE_LENGTH") |
+                            fsm.ongoing("RECEIVE_ADDRESS") |
+                            fsm.ongoing("RECEIVE_DATA"))
         ]
         fsm.act("IDLE",
-            If(phy.source.valid,
+            If(source.valid,
                 cmd_ce.eq(1),
-                If((phy.source.data == self.cmds["write"]) |
-                   (phy.source.data == self.cmds["read"]),
+                If(reduce(or_, [source.data == c for c in self.cmds.values()]),
                     NextState("RECEIVE_LENGTH")
                 ),
                 byte_counter_reset.eq(1),
@@ -85,19 +108,19 @@ class WishboneStreamingBridge(Module):
             )
         )
         fsm.act("RECEIVE_LENGTH",
-            If(phy.source.valid,
-                length_ce.eq(1),
+            If(source.valid,
+                last_ce.eq(1),
                 NextState("RECEIVE_ADDRESS")
             )
         )
         fsm.act("RECEIVE_ADDRESS",
-            If(phy.source.valid,
+            If(source.valid,
                 address_ce.eq(1),
                 byte_counter_ce.eq(1),
                 If(byte_counter == 3,
-                    If(cmd == self.cmds["write"],
+                    If(cmd[0],
                         NextState("RECEIVE_DATA")
-                    ).Elif(cmd == self.cmds["read"],
+                    ).Else(
                         NextState("READ_DATA")
                     ),
                     byte_counter_reset.eq(1),
@@ -105,7 +128,7 @@ class WishboneStreamingBridge(Module):
             )
         )
         fsm.act("RECEIVE_DATA",
-            If(phy.source.valid,
+            If(source.valid,
                 rx_data_ce.eq(1),
                 byte_counter_ce.eq(1),
                 If(byte_counter == 3,
@@ -115,7 +138,7 @@ class WishboneStreamingBridge(Module):
             )
         )
         self.comb += [
-            self.wishbone.adr.eq(address + word_counter),
+            self.wishbone.adr.eq(address + Mux(noinc, 0, word_counter)),
             self.wishbone.dat_w.eq(data),
             self.wishbone.sel.eq(2**len(self.wishbone.sel) - 1)
         ]
@@ -125,7 +148,7 @@ class WishboneStreamingBridge(Module):
             self.wishbone.cyc.eq(1),
             If(self.wishbone.ack,
                 word_counter_ce.eq(1),
-                If(word_counter == (length-1),
+                If(word_counter == last,
                     NextState("IDLE")
                 ).Else(
                     NextState("RECEIVE_DATA")
@@ -149,7 +172,7 @@ class WishboneStreamingBridge(Module):
                 byte_counter_ce.eq(1),
                 If(byte_counter == 3,
                     word_counter_ce.eq(1),
-                    If(word_counter == (length-1),
+                    If(word_counter == last,
                         NextState("IDLE")
                     ).Else(
                         NextState("READ_DATA"),
@@ -159,9 +182,12 @@ class WishboneStreamingBridge(Module):
             )
         )
 
-        self.comb += timer.wait.eq(~fsm.ongoing("IDLE"))
+        # Abort commands after clk_freq//10 cycles without activity.
+        self.comb += timer.wait.eq(~fsm.ongoing("IDLE") &
+                                   ~(source.valid & source.ready) &
+                                   ~(phy.sink.valid & phy.sink.ready))
 
-        self.comb += phy.sink.last.eq((byte_counter == 3) & (word_counter == length - 1))
+        self.comb += phy.sink.last.eq((byte_counter == 3) & (word_counter == last))
 
         if hasattr(phy.sink, "length"):
-            self.comb += phy.sink.length.eq(4*length)
+            self.comb += phy.sink.length.eq(4*(last + 1))
@@ -108,6 +108,25 @@ static uint32_t get_uint32(unsigned char* data)
 		    (uint32_t) data[3];
 }
 
+/* Discard the UART input until the line has been idle for 10ms: frames the host sent after a
+ * corrupted one are dropped as a whole, so the next byte received starts a new frame. */
+static void uart_drain_idle(void)
+{
+	timer0_en_write(0);
+	timer0_reload_write(0);
+	timer0_load_write(CONFIG_CLOCK_FREQUENCY/100);
+	timer0_en_write(1);
+	timer0_update_value_write(1);
+	while(timer0_value_read()) {
+		if(uart_read_nonblock()) {
+			uart_read();
+			timer0_en_write(0);
+			timer0_en_write(1);
+		}
+		timer0_update_value_write(1);
+	}
+}
+
 #define MAX_FAILED 5
 
 /* Returns 1 if other boot methods should be tried */
@@ -158,8 +177,8 @@ int serialboot(void)
 			actualcrc = ((int)frame.crc[0] << 8)|(int)frame.crc[1];
 			goodcrc = crc16(&frame.cmd, frame.payload_length+1);
 			if(actualcrc != goodcrc) {
-				/* Clear out the RX buffer */
-				while (uart_read_nonblock()) uart_read();
+				/* Resynchronize on the next frame */
+				uart_drain_idle();
 				failed++;
 				if(failed == MAX_FAILED) {
 					printf("Too many consecutive errors, aborting");
@@ -216,6 +235,12 @@ int serialboot(void)
 #endif
 				break;
 			}
+			case SFL_CMD_INFO:
+				/* Reply with the maximum payload length accepted in frames */
+				failed = 0;
+				uart_write(SFL_ACK_SUCCESS);
+				uart_write(SFL_PAYLOAD_LENGTH_MAX);
+				break;
 			case SFL_CMD_REBOOT:
 #ifdef CSR_CTRL_BASE
 				uart_write(SFL_ACK_SUCCESS);
@@ -8,11 +8,13 @@
 #define SFL_MAGIC_REQ "sL5DdSMmkekro\n"
 #define SFL_MAGIC_ACK "z6IHG7cYDID6o\n"
 
+#define SFL_PAYLOAD_LENGTH_MAX 255
+
 struct sfl_frame {
 	unsigned char payload_length;
 	unsigned char crc[2];
 	unsigned char cmd;
-	unsigned char payload[255];
+	unsigned char payload[SFL_PAYLOAD_LENGTH_MAX];
 } __attribute__((packed));
 
 /* General commands */
@@ -22,6 +24,7 @@ struct sfl_frame {
 #define SFL_CMD_LOAD_NO_CRC	0x03
 #define SFL_CMD_FLASH		0x04
 #define SFL_CMD_REBOOT		0x05
+#define SFL_CMD_INFO		0x06
 
 /* Replies */
 #define SFL_ACK_SUCCESS		'K'
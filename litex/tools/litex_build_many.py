@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+# License: BSD
+
+"""Build several SoC variants in parallel
+
+Variants are described in a JSON file:
+
+    [
+        {
+            "name":         "arty_vexriscv",
+            "target":       "litex.boards.targets.arty",
+            "soc":          "BaseSoC",
+            "soc_kwargs":   {"cpu_type": "vexriscv", "integrated_rom_size": 32768},
+            "build_kwargs": {}
+        },
+        ...
+    ]
+
+Each variant is elaborated and built in its own worker process, in <output-dir>/<name>, with its
+output redirected to <output-dir>/<name>/build.log. A summary is printed at the end and written to
+<output-dir>/summary.json.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import traceback
+import multiprocessing
+
+# Build --------------------------------------------------------------------------------------------
+
+def build_variant(variant, output_dir, compile_software=False, compile_gateware=False,
+    build_cache=None):
+    name       = variant["name"]
+    output_dir = os.path.abspath(os.path.join(output_dir, name))
+    os.makedirs(output_dir, exist_ok=True)
+    log_file   = os.path.join(output_dir, "build.log")
+    result     = {"name": name, "output_dir": output_dir, "log": log_file}
+
+    # Redirect the output (including the one of the vendor tools) to the log file.
+    sys.stdout.flush()
+    sys.stderr.flush()
+    stdout, stderr = os.dup(1), os.dup(2)
+    start = time.time()
+    with open(log_file, "w") as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        try:
+            from litex.soc.integration.builder import Builder
+            module  = importlib.import_module(variant["target"])
+            soc_cls = getattr(module, variant.get("soc", "BaseSoC"))
+            soc     = soc_cls(**variant.get("soc_kwargs", {}))
+            builder = Builder(soc,
+                output_dir       = output_dir,
+                compile_software = compile_software,
+                compile_gateware = compile_gateware,
+                build_cache      = build_cache)
+            builder.build(**variant.get("build_kwargs", {}))
+            result["status"] = "ok"
+        except BaseException as e:
+            traceback.print_exc()
+            result["status"] = "failed"
+            result["error"]  = "{}: {}".format(type(e).__name__, e)
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(stdout, 1)
+            os.dup2(stderr, 2)
+            os.close(stdout)
+            os.close(stderr)
+    result["time"] = time.time() - start
+    return result
+
+
+def _build_variant(args):
+    return build_variant(*args)
+
+
+def build_many(variants, output_dir, jobs=None, compile_software=False, compile_gateware=False,
+    build_cache=None):
+    """Build `variants` in a pool of `jobs` processes, returns the results in variants order."""
+    names = [variant["name"] for variant in variants]
+    if len(set(names)) != len(names):
+        raise ValueError("Variant names must be unique")
+    # Each variant is built in a fresh process: elaboration relies on global state (signal ids,
+    # platform finalization, working directory of the toolchains).
+    with multiprocessing.Pool(jobs, maxtasksperchild=1) as pool:
+        return pool.map(_build_variant, [
+            (variant, output_dir, compile_software, compile_gateware, build_cache)
+                for variant in variants], chunksize=1)
+
+# Report -------------------------------------------------------------------------------------------
+
+def summary(results):
+    r = "{:<32} {:<8} {:>9}  {}\n".format("Variant", "Status", "Time (s)", "Log/Error")
+    r += "-"*80 + "\n"
+    for result in results:
+        r += "{:<32} {:<8} {:>9.1f}  {}\n".format(
+            result["name"], result["status"], result["time"],
+            result.get("error", result["log"]))
+    failed = sum(result["status"] != "ok" for result in results)
+    r += "-"*80 + "\n"
+    r += "{} variant(s), {} failed\n".format(len(results), failed)
+    return r
+
+# Run ----------------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Build LiteX SoC variants in parallel")
+    parser.add_argument("variants",                                    help="JSON file describing the variants")
+    parser.add_argument("--output-dir",       default="build",         help="Base output directory (one sub-directory per variant)")
+    parser.add_argument("--jobs",             default=None, type=int,  help="Number of parallel builds (default=number of CPUs)")
+    parser.add_argument("--only",             default=None,            help="Comma separated list of variants to build")
+    parser.add_argument("--compile-software", action="store_true",     help="Compile the software")
+    parser.add_argument("--compile-gateware", action="store_true",     help="Run the toolchains (default: only generate sources)")
+    parser.add_argument("--build-cache",      default=None,            help="Build cache directory")
+    args = parser.parse_args()
+
+    with open(args.variants, "r") as f:
+        variants = json.load(f)
+    if args.only is not None:
+        only     = args.only.split(",")
+        variants = [variant for variant in variants if variant["name"] in only]
+
+    results = build_many(variants, args.output_dir,
+        jobs             = args.jobs,
+        compile_software = args.compile_software,
+        compile_gateware = args.compile_gateware,
+        build_cache      = args.build_cache)
+
+    print(summary(results), end="")
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, "summary.json"), "w") as f:
+        json.dump(results, f, indent=4)
+    sys.exit(any(result["status"] != "ok" for result in results))
+
+if __name__ == "__main__":
+    main()
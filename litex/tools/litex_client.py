@@ -3,11 +3,111 @@
 # License: BSD
 
 import socket
+import asyncio
+import collections
 
 from litex.tools.remote.etherbone import EtherbonePacket, EtherboneRecord
 from litex.tools.remote.etherbone import EtherboneReads, EtherboneWrites
 from litex.tools.remote.etherbone import EtherboneIPC
 from litex.tools.remote.csr_builder import CSRBuilder
+from litex.tools.remote.future import RemoteFuture
+
+
+class RemoteBatch:
+    """Queue of reads/writes sent as pipelined Etherbone packets
+
+    Reads (at scattered addresses) are merged into records of up to 255 reads, writes into one
+    record per contiguous block. All packets are sent at once and the replies collected
+    afterwards, so a flush costs a single round-trip. Operations are executed in order.
+    """
+    def __init__(self, client):
+        self.client = client
+        self.operations = []
+
+    def batch(self):
+        # Nested batches are merged in the current one.
+        return self
+
+    def read(self, addr, length=None):
+        length_int = 1 if length is None else length
+        future = RemoteFuture(self, length)
+        if length_int == 0:
+            future.datas = []
+        self.operations.append(("read", [addr + 4*j for j in range(length_int)], future))
+        return future
+
+    def write(self, addr, datas):
+        datas = datas if isinstance(datas, list) else [datas]
+        self.operations.append(("write", addr, datas))
+
+    def _records(self):
+        reads = []
+        for operation in self.operations:
+            if operation[0] == "read":
+                reads.append(operation)
+                continue
+            if reads:
+                yield from self._read_records(reads)
+                reads = []
+            _, addr, datas = operation
+            for i in range(0, len(datas), 255):
+                record = EtherboneRecord()
+                record.writes = EtherboneWrites(base_addr=addr + 4*i, datas=datas[i:i+255])
+                record.wcount = len(record.writes)
+                yield record, None
+        if reads:
+            yield from self._read_records(reads)
+
+    def _read_records(self, reads):
+        addrs = []
+        futures = []
+        for _, read_addrs, future in reads:
+            addrs += read_addrs
+            futures += [future]*len(read_addrs)
+        for i in range(0, len(addrs), 255):
+            record = EtherboneRecord()
+            record.reads = EtherboneReads(addrs=addrs[i:i+255])
+            record.rcount = len(record.reads)
+            yield record, futures[i:i+255]
+
+    def flush(self):
+        if not self.operations:
+            return
+        # send all packets
+        pending = []
+        buf = bytearray()
+        for record, futures in self._records():
+            packet = EtherbonePacket()
+            packet.records = [record]
+            buf += packet.to_bytes()
+            if futures is not None:
+                pending.append((record.reads.get_addrs(), futures))
+        if self.client.debug:
+            for operation in self.operations:
+                if operation[0] == "write":
+                    _, addr, datas = operation
+                    for i, data in enumerate(datas):
+                        print("write {:08x} @ {:08x}".format(data, addr + 4*i))
+        self.operations = []
+        self.client.send_packet(self.client.socket, buf)
+
+        # receive responses
+        for addrs, futures in pending:
+            packet = EtherbonePacket.from_bytes(self.client.receive_packet(self.client.socket))
+            datas = packet.records.pop().writes.get_datas()
+            for addr, future, data in zip(addrs, futures, datas):
+                if future.datas is None:
+                    future.datas = []
+                future.datas.append(data)
+                if self.client.debug:
+                    print("read {:08x} @ {:08x}".format(data, addr))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.flush()
 
 
 class RemoteClient(EtherboneIPC, CSRBuilder):
@@ -32,6 +132,9 @@ class RemoteClient(EtherboneIPC, CSRBuilder):
         self.socket.close()
         del self.socket
 
+    def batch(self):
+        return RemoteBatch(self)
+
     def read(self, addr, length=None):
         length_int = 1 if length is None else length
         # prepare packet
@@ -42,12 +145,10 @@ class RemoteClient(EtherboneIPC, CSRBuilder):
         # send packet
         packet = EtherbonePacket()
         packet.records = [record]
-        packet.encode()
-        self.send_packet(self.socket, packet[:])
+        self.send_packet(self.socket, packet.to_bytes())
 
         # receive response
-        packet = EtherbonePacket(self.receive_packet(self.socket))
-        packet.decode()
+        packet = EtherbonePacket.from_bytes(self.receive_packet(self.socket))
         datas = packet.records.pop().writes.get_datas()
         if self.debug:
             for i, data in enumerate(datas):
@@ -62,8 +163,89 @@ class RemoteClient(EtherboneIPC, CSRBuilder):
 
         packet = EtherbonePacket()
         packet.records = [record]
-        packet.encode()
-        self.send_packet(self.socket, packet)
+        self.send_packet(self.socket, packet.to_bytes())
+
+        if self.debug:
+            for i, data in enumerate(datas):
+                print("write {:08x} @ {:08x}".format(data, addr + 4*i))
+
+
+class AsyncRemoteClient(EtherboneIPC, CSRBuilder):
+    """asyncio RemoteClient: accesses are coroutines (`await client.regs.foo.read()`)
+
+    Accesses of concurrent tasks are pipelined on the connection: requests are sent without
+    waiting for the replies of the previous ones, the server replies in order.
+    """
+    def __init__(self, host="localhost", port=1234, csr_csv="csr.csv", csr_data_width=None, debug=False):
+        if csr_csv is not None:
+            CSRBuilder.__init__(self, self, csr_csv, csr_data_width)
+        else:
+            assert csr_data_width is not None
+        self.host = host
+        self.port = port
+        self.debug = debug
+
+    async def open(self):
+        if hasattr(self, "writer"):
+            return
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), 5.0)
+        self.pending = collections.deque()
+        self.receiver = asyncio.ensure_future(self._receive())
+
+    async def close(self):
+        if not hasattr(self, "writer"):
+            return
+        self.receiver.cancel()
+        self.writer.close()
+        del self.reader, self.writer
+        self._fail_pending("Connection to server closed")
+
+    def _fail_pending(self, message):
+        while self.pending:
+            future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(ConnectionError(message))
+
+    async def _receive(self):
+        try:
+            while True:
+                packet = EtherbonePacket.from_bytes(await self.async_receive_packet(self.reader))
+                future = self.pending.popleft()
+                if not future.done():
+                    future.set_result(packet.records.pop().writes.get_datas())
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self._fail_pending("Connection to server lost")
+
+    async def read(self, addr, length=None):
+        length_int = 1 if length is None else length
+        record = EtherboneRecord()
+        record.reads = EtherboneReads(addrs=[addr + 4*j for j in range(length_int)])
+        record.rcount = len(record.reads)
+
+        packet = EtherbonePacket()
+        packet.records = [record]
+        future = asyncio.get_event_loop().create_future()
+        self.pending.append(future)
+        self.writer.write(packet.to_bytes())
+        await self.writer.drain()
+
+        datas = await future
+        if self.debug:
+            for i, data in enumerate(datas):
+                print("read {:08x} @ {:08x}".format(data, addr + 4*i))
+        return datas[0] if length is None else datas
+
+    async def write(self, addr, datas):
+        datas = datas if isinstance(datas, list) else [datas]
+        record = EtherboneRecord()
+        record.writes = EtherboneWrites(base_addr=addr, datas=[d for d in datas])
+        record.wcount = len(record.writes)
+
+        packet = EtherbonePacket()
+        packet.records = [record]
+        self.writer.write(packet.to_bytes())
+        await self.writer.drain()
 
         if self.debug:
             for i, data in enumerate(datas):
@@ -33,9 +33,8 @@ class Platform(GenericPlatform):
 
     def build(self, fragment, build_dir, **kwargs):
         os.makedirs(build_dir, exist_ok=True)
-        os.chdir(build_dir)
         top_output = self.get_verilog(fragment)
-        top_output.write("litex_core.v")
+        top_output.write(os.path.join(build_dir, "litex_core.v"))
 
 # LiteXCore ----------------------------------------------------------------------------------------
 
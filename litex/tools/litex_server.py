@@ -9,11 +9,14 @@ import argparse
 
 import sys
 import socket
-import time
 import threading
+import asyncio
+import concurrent.futures
 
 from litex.tools.remote.etherbone import EtherbonePacket, EtherboneRecord, EtherboneWrites
 from litex.tools.remote.etherbone import EtherboneIPC
+from litex.tools.remote.etherbone import etherbone_magic
+from litex.tools.remote.etherbone import etherbone_packet_header_length, etherbone_record_header_length
 
 
 class RemoteServer(EtherboneIPC):
@@ -21,7 +24,6 @@ class RemoteServer(EtherboneIPC):
         self.comm = comm
         self.bind_ip = bind_ip
         self.bind_port = bind_port
-        self.lock = False
 
     def open(self):
         if hasattr(self, "socket"):
@@ -35,7 +37,7 @@ class RemoteServer(EtherboneIPC):
         self.socket.setsockopt(socket.SOL_SOCKET, socket_flags, 1)
         self.socket.bind((self.bind_ip, self.bind_port))
         print("tcp port: {:d}".format(self.bind_port))
-        self.socket.listen(1)
+        self.socket.listen(socket.SOMAXCONN)
         self.comm.open()
 
     def close(self):
@@ -45,61 +47,147 @@ class RemoteServer(EtherboneIPC):
         self.socket.close()
         del self.socket
 
-    def _serve_thread(self):
+    async def _receive_records(self, reader):
+        # Etherbone packets are not delimited on TCP: a packet header is followed by one or more
+        # records, the start of a new packet is detected with the magic.
+        magic = etherbone_magic.to_bytes(2, byteorder="big")
+        header = await reader.readexactly(etherbone_packet_header_length)
+        while True:
+            record_header = await reader.readexactly(etherbone_record_header_length)
+            if record_header[:2] == magic:
+                header = record_header + await reader.readexactly(
+                    etherbone_packet_header_length - etherbone_record_header_length)
+                continue
+            wcount, rcount = record_header[2], record_header[3]
+            payload_length = 0
+            if wcount:
+                payload_length += 4*(wcount + 1)
+            if rcount:
+                payload_length += 4*(rcount + 1)
+            payload = await reader.readexactly(payload_length)
+            packet = EtherbonePacket.from_bytes(header + record_header + payload)
+            yield packet.records[0]
+
+    async def _send_replies(self, writer, replies):
         while True:
-            client_socket, addr = self.socket.accept()
-            print("Connected with " + addr[0] + ":" + str(addr[1]))
+            future = await replies.get()
+            if future is None:
+                break
             try:
-                while True:
-                    try:
-                        packet = self.receive_packet(client_socket)
-                        if packet == 0:
-                            break
-                    except:
-                        break
-                    packet = EtherbonePacket(packet)
-                    packet.decode()
-
-                    record = packet.records.pop()
-
-                    # wait for lock
-                    while self.lock:
-                        time.sleep(0.01)
-
-                    # set lock
-                    self.lock = True
-
-                    # handle writes:
-                    if record.writes != None:
-                        self.comm.write(record.writes.base_addr, record.writes.get_datas())
-
-                    # handle reads
-                    if record.reads != None:
-                        reads = []
-                        for addr in record.reads.get_addrs():
-                            reads.append(self.comm.read(addr))
-
-                        record = EtherboneRecord()
-                        record.writes = EtherboneWrites(datas=reads)
-                        record.wcount = len(record.writes)
-
-                        packet = EtherbonePacket()
-                        packet.records = [record]
-                        packet.encode()
-                        self.send_packet(client_socket, packet)
-
-                    # release lock
-                    self.lock = False
-
-            finally:
-                print("Disconnect")
-                client_socket.close()
-
-    def start(self, nthreads):
-        for i in range(nthreads):
-            self.serve_thread = threading.Thread(target=self._serve_thread)
-            self.serve_thread.setDaemon(True)
-            self.serve_thread.start()
+                reads = await future
+            except Exception as e:
+                print("Error: {}".format(e))
+                break
+            record = EtherboneRecord()
+            record.writes = EtherboneWrites(datas=reads)
+            record.wcount = len(record.writes)
+
+            packet = EtherbonePacket()
+            packet.records = [record]
+            writer.write(packet.to_bytes())
+            await writer.drain()
+        writer.close()
+
+    async def _serve_client(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        print("Connected with " + addr[0] + ":" + str(addr[1]))
+        replies = asyncio.Queue()
+        sender = asyncio.ensure_future(self._send_replies(writer, replies))
+        try:
+            async for record in self._receive_records(reader):
+                # Only reads are replied: no future for write-only records.
+                future = None
+                if record.reads is not None:
+                    future = self.loop.create_future()
+                    await replies.put(future)
+                await self.requests.put((record, future))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            await replies.put(None)
+            await sender
+            print("Disconnect")
+
+    def _execute(self, records):
+        # Executes the records in order, merging contiguous reads (resp. writes) into bursts, even
+        # when they come from different clients. Reads are only merged when the comm supports
+        # block reads (block_reads attribute).
+        results = [[] for record in records]
+        reads  = [] # (addr, record index)
+        writes = [] # [base_addr, datas]
+        block_reads = getattr(self.comm, "block_reads", False)
+
+        def flush_reads():
+            i = 0
+            while i < len(reads):
+                j = i + 1
+                while (block_reads and j < len(reads) and j - i < 255 and
+                       reads[j][0] == reads[j - 1][0] + 4):
+                    j += 1
+                if block_reads:
+                    datas = self.comm.read(reads[i][0], length=j - i)
+                else:
+                    datas = [self.comm.read(reads[i][0])]
+                for (addr, n), data in zip(reads[i:j], datas):
+                    results[n].append(data)
+                i = j
+            reads.clear()
+
+        def flush_writes():
+            for base_addr, datas in writes:
+                self.comm.write(base_addr, datas)
+            writes.clear()
+
+        for n, record in enumerate(records):
+            if record.writes is not None:
+                flush_reads()
+                base_addr = record.writes.base_addr
+                datas = record.writes.get_datas()
+                if writes and writes[-1][0] + 4*len(writes[-1][1]) == base_addr:
+                    writes[-1][1].extend(datas)
+                else:
+                    writes.append([base_addr, datas])
+            if record.reads is not None:
+                flush_writes()
+                for addr in record.reads.get_addrs():
+                    reads.append((addr, n))
+        flush_reads()
+        flush_writes()
+        return results
+
+    async def _serve_comm(self):
+        # Single consumer: serializes the accesses to comm, executed in a dedicated thread. All
+        # the requests queued while comm was busy are executed together.
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        while True:
+            requests = [await self.requests.get()]
+            while not self.requests.empty():
+                requests.append(self.requests.get_nowait())
+            records = [record for record, future in requests]
+            try:
+                results = await self.loop.run_in_executor(executor, self._execute, records)
+            except Exception as e:
+                print("Error: {}".format(e))
+                for record, future in requests:
+                    if future is not None:
+                        future.set_exception(e)
+                continue
+            for (record, future), result in zip(requests, results):
+                if future is not None:
+                    future.set_result(result)
+
+    def _serve_thread(self):
+        asyncio.set_event_loop(self.loop)
+        self.requests = asyncio.Queue()
+        self.loop.run_until_complete(asyncio.start_server(self._serve_client, sock=self.socket))
+        self.loop.create_task(self._serve_comm())
+        self.loop.run_forever()
+
+    def start(self, nthreads=None):
+        # nthreads is kept for compatibility: all clients are served by a single event loop.
+        self.loop = asyncio.new_event_loop()
+        self.serve_thread = threading.Thread(target=self._serve_thread, daemon=True)
+        self.serve_thread.start()
 
 
 def main():
@@ -118,6 +206,8 @@ def main():
                         help="Set UART port")
     parser.add_argument("--uart-baudrate", default=115200,
                         help="Set UART baudrate")
+    parser.add_argument("--uart-burst", action="store_true",
+                        help="Use 256 words/pipelined commands (requires a bridge with a command FIFO)")
 
     # UDP arguments
     parser.add_argument("--udp", action="store_true",
@@ -142,6 +232,8 @@ def main():
                         help="Set USB product ID")
     parser.add_argument("--usb-max-retries", default=10,
                         help="Number of times to try reconnecting to USB")
+    parser.add_argument("--usb-burst-length", default=1,
+                        help="Maximum number of words per USB transfer (if supported by the device)")
     args = parser.parse_args()
 
 
@@ -153,7 +245,10 @@ def main():
         uart_port = args.uart_port
         uart_baudrate = int(float(args.uart_baudrate))
         print("[CommUART] port: {} / baudrate: {} / ".format(uart_port, uart_baudrate), end="")
-        comm = CommUART(uart_port, uart_baudrate)
+        if args.uart_burst:
+            comm = CommUART(uart_port, uart_baudrate, burst_length=256, outstanding=6)
+        else:
+            comm = CommUART(uart_port, uart_baudrate)
     elif args.udp:
         from litex.tools.remote.comm_udp import CommUDP
         udp_ip = args.udp_ip
@@ -180,17 +275,17 @@ def main():
         vid = args.usb_vid
         if vid is not None:
             vid = int(vid, base=0)
-        comm = CommUSB(vid=vid, pid=pid, max_retries=args.usb_max_retries)
+        comm = CommUSB(vid=vid, pid=pid, max_retries=args.usb_max_retries,
+            burst_length=int(args.usb_burst_length))
     else:
         parser.print_help()
         exit()
 
     server = RemoteServer(comm, args.bind_ip, int(args.bind_port))
     server.open()
-    server.start(4)
+    server.start()
     try:
-        import time
-        while True: time.sleep(100)
+        server.serve_thread.join()
     except KeyboardInterrupt:
         pass
 
@@ -1,13 +1,26 @@
 # This file is Copyright (c) 2015-2019 Florent Kermarrec <florent@enjoy-digital.fr>
 # License: BSD
 
+import sys
 import mmap
+from array import array
 
 
 class CommPCIe:
-    def __init__(self, bar, debug=False):
+    """PCIe BAR access through sysfs mmap
+
+    Blocks are transferred with a single slice of the mapping and returned as array("I") (usable
+    with numpy.frombuffer). With aligned=True, each word is accessed with its own 32-bit load/store
+    (for BARs/bridges that do not support wider or unaligned accesses), addresses must then be
+    word aligned.
+    """
+    # read(addr, length) reads length consecutive words.
+    block_reads = True
+
+    def __init__(self, bar, debug=False, aligned=False):
         self.bar = bar
         self.debug = debug
+        self.aligned = aligned
 
     def open(self):
         if hasattr(self, "sysfs"):
@@ -15,32 +28,59 @@ class CommPCIe:
         self.sysfs = open(self.bar, "r+b")
         self.sysfs.flush()
         self.mmap = mmap.mmap(self.sysfs.fileno(), 0)
+        self.words = memoryview(self.mmap)[:len(self.mmap) & ~3].cast("I")
 
     def close(self):
         if not hasattr(self, "sysfs"):
             return
+        self.words.release()
+        del self.words
         self.mmap.close()
         del self.mmap
         self.sysfs.close()
         del self.sysfs
 
+    def _swap(self, data):
+        # BAR registers are little-endian.
+        if sys.byteorder != "little":
+            data.byteswap()
+        return data
+
+    def read_block(self, addr, length):
+        if self.aligned:
+            if addr % 4:
+                raise ValueError("Unaligned address 0x{:08x}".format(addr))
+            data = array("I", self.words[addr//4:addr//4 + length])
+        else:
+            data = array("I")
+            data.frombytes(self.mmap[addr:addr + 4*length])
+        if len(data) != length:
+            raise ValueError("Access out of BAR range")
+        return self._swap(data)
+
+    def write_block(self, addr, data):
+        data = self._swap(array("I", data))
+        if addr + 4*len(data) > len(self.mmap):
+            raise ValueError("Access out of BAR range")
+        if self.aligned:
+            if addr % 4:
+                raise ValueError("Unaligned address 0x{:08x}".format(addr))
+            for i, value in enumerate(data):
+                self.words[addr//4 + i] = value
+        else:
+            self.mmap[addr:addr + 4*len(data)] = data.tobytes()
+
     def read(self, addr, length=None):
-        data = []
         length_int = 1 if length is None else length
-        for i in range(length_int):
-            self.mmap.seek(addr + 4*i)
-            value = int.from_bytes(self.mmap.read(4), byteorder="little")
-            if self.debug:
+        data = self.read_block(addr, length_int)
+        if self.debug:
+            for i, value in enumerate(data):
                 print("read {:08x} @ {:08x}".format(value, addr + 4*i))
-            if length is None:
-                return value
-            data.append(value)
-        return data
+        return data[0] if length is None else data.tolist()
 
     def write(self, addr, data):
         data = data if isinstance(data, list) else [data]
-        length = len(data)
-        for i, value in enumerate(data):
-            self.mmap[addr + 4*i:addr + 4*(i + 1)] = value.to_bytes(4, byteorder="little")
-            if self.debug:
+        self.write_block(addr, data)
+        if self.debug:
+            for i, value in enumerate(data):
                 print("write {:08x} @ {:08x}".format(value, addr + 4*i))
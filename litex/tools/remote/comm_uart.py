@@ -6,20 +6,38 @@ import struct
 
 
 class CommUART:
+    """UART bridge (WishboneStreamingBridge) access
+
+    Accesses are split in commands of up to `burst_length` words and up to `outstanding` read
+    commands are sent before waiting for their replies. The defaults are compatible with all the
+    bridges, `burst_length` up to 256 and `outstanding` up to 1 + fifo_depth//6 can be used with
+    bridges buffering the received commands.
+    """
+    # read(addr, length) reads length consecutive words.
+    block_reads = True
+
     msg_type = {
-        "write": 0x01,
-        "read":  0x02
+        "write":       0x01,
+        "read":        0x02,
+        "write_noinc": 0x05,
+        "read_noinc":  0x06,
     }
-    def __init__(self, port, baudrate=115200, debug=False):
+    def __init__(self, port, baudrate=115200, debug=False, burst_length=8, outstanding=1):
+        assert 1 <= burst_length <= 256
+        assert outstanding >= 1
         self.port = port
         self.baudrate = str(baudrate)
         self.debug = debug
+        self.burst_length = burst_length
+        self.outstanding = outstanding
         self.port = serial.serial_for_url(port, baudrate)
+        self._flush()
 
     def open(self):
         if hasattr(self, "port"):
             return
         self.port.open()
+        self._flush()
 
     def close(self):
         if not hasattr(self, "port"):
@@ -45,33 +63,45 @@ class CommUART:
         if self.port.inWaiting() > 0:
             self.port.read(self.port.inWaiting())
 
-    def read(self, addr, length=None):
-        self._flush()
+    def _commands(self, msg_type, addr, length, burst):
+        # Split an access in commands, returns (command, length) tuples.
+        assert burst in ["incr", "fixed"]
+        if burst == "fixed":
+            msg_type += "_noinc"
+        offset = 0
+        while length:
+            size = min(length, self.burst_length)
+            command = bytes([self.msg_type[msg_type], size % 256])
+            command += ((addr + offset)//4).to_bytes(4, byteorder="big")
+            yield command, size
+            if burst == "incr":
+                offset += 4*size
+            length -= size
+
+    def read(self, addr, length=None, burst="incr"):
         data = []
         length_int = 1 if length is None else length
-        self._write([self.msg_type["read"], length_int])
-        self._write(list((addr//4).to_bytes(4, byteorder="big")))
-        for i in range(length_int):
-            value = int.from_bytes(self._read(4), "big")
-            if self.debug:
-                print("read {:08x} @ {:08x}".format(value, addr + 4*i))
-            if length is None:
-                return value
-            data.append(value)
-        return data
+        commands = list(self._commands("read", addr, length_int, burst))
+        sent = 0
+        for n, (command, size) in enumerate(commands):
+            # Keep up to outstanding commands in flight.
+            while sent < len(commands) and sent - n < self.outstanding:
+                self._write(commands[sent][0])
+                sent += 1
+            data.extend(struct.unpack(">{}I".format(size), self._read(4*size)))
+        if self.debug:
+            for i, value in enumerate(data):
+                print("read {:08x} @ {:08x}".format(value, addr + (4*i if burst == "incr" else 0)))
+        return data[0] if length is None else data
 
-    def write(self, addr, data):
-        self._flush()
+    def write(self, addr, data, burst="incr"):
         data = data if isinstance(data, list) else [data]
-        length = len(data)
+        frames = bytes()
         offset = 0
-        while length:
-            size = min(length, 8)
-            self._write([self.msg_type["write"], size])
-            self._write(list(((addr+offset)//4).to_bytes(4, byteorder="big")))
-            for i, value in enumerate(data[offset:offset+size]):
-                self._write(list(value.to_bytes(4, byteorder="big")))
-                if self.debug:
-                    print("write {:08x} @ {:08x}".format(value, addr + offset, 4*i))
+        for command, size in self._commands("write", addr, len(data), burst):
+            frames += command + struct.pack(">{}I".format(size), *data[offset:offset+size])
             offset += size
-            length -= size
+        self._write(frames)
+        if self.debug:
+            for i, value in enumerate(data):
+                print("write {:08x} @ {:08x}".format(value, addr + (4*i if burst == "incr" else 0)))
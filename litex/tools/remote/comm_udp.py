@@ -9,6 +9,9 @@ from litex.tools.remote.etherbone import EtherboneReads, EtherboneWrites
 
 
 class CommUDP:
+    # read(addr, length) reads length consecutive words.
+    block_reads = True
+
     def __init__(self, server="192.168.1.50", port=1234, debug=False):
         self.server = server
         self.port = port
@@ -34,12 +37,10 @@ class CommUDP:
 
         packet = EtherbonePacket()
         packet.records = [record]
-        packet.encode()
-        self.socket.sendto(bytes(packet), (self.server, self.port))
+        self.socket.sendto(packet.to_bytes(), (self.server, self.port))
 
         datas, dummy = self.socket.recvfrom(8192)
-        packet = EtherbonePacket(datas)
-        packet.decode()
+        packet = EtherbonePacket.from_bytes(datas)
         datas = packet.records.pop().writes.get_datas()
         if self.debug:
             for i, value in enumerate(datas):
@@ -55,8 +56,7 @@ class CommUDP:
 
         packet = EtherbonePacket()
         packet.records = [record]
-        packet.encode()
-        self.socket.sendto(bytes(packet), (self.server, self.port))
+        self.socket.sendto(packet.to_bytes(), (self.server, self.port))
 
         if self.debug:
             for i, value in enumerate(datas):
@@ -1,9 +1,12 @@
 # This file is Copyright (c) 2019 Sean Cross <sean@xobs.io>
 # License: BSD
 
-import usb.core
 import time
 
+import usb.core
+
+from litex.tools.remote.future import RemoteFuture
+
 # Wishbone USB Protocol Bridge
 # ============================
 #
@@ -50,17 +53,85 @@ import time
 # We reuse these two 16-bit values as a single 32-bit ADDRESS packet.  Note that
 # USB is big endian.
 #
-# Finally, the last two bytes indicate the length of the transaction.  Since
-# we only support 32-bit reads and writes, this is always 4.  On big endian
-# USB, this has the value {04, 00}.
+# Finally, the last two bytes indicate the length of the transaction.  Devices
+# only supporting 32-bit reads and writes expect 4 ({04, 00} on USB).  Devices
+# supporting multi-word transfers accept a multiple of 4 and access consecutive
+# addresses: set `burst_length` to the maximum number of words per transfer to
+# use them.
+
+
+class CommUSBBatch:
+    """Queue of reads/writes executed on flush
+
+    Consecutive operations of the same type on contiguous addresses are coalesced, so that
+    they are executed with as few (multi-word) transfers as possible.
+    """
+    def __init__(self, comm):
+        self.comm = comm
+        self.operations = []
+
+    def read(self, addr, length=None):
+        future = RemoteFuture(self, length)
+        self.operations.append(["read", addr, 1 if length is None else length, [future]])
+        return future
+
+    def write(self, addr, data):
+        data = data if isinstance(data, list) else [data]
+        self.operations.append(["write", addr, list(data)])
+
+    def _coalesce(self):
+        operations = []
+        for operation in self.operations:
+            if operations:
+                last = operations[-1]
+                if operation[0] == last[0] == "read" and operation[1] == last[1] + 4*last[2]:
+                    last[2] += operation[2]
+                    last[3] += operation[3]
+                    continue
+                if operation[0] == last[0] == "write" and operation[1] == last[1] + 4*len(last[2]):
+                    last[2] += operation[2]
+                    continue
+            if operation[0] == "read":
+                operations.append(["read", operation[1], operation[2], list(operation[3])])
+            else:
+                operations.append(["write", operation[1], list(operation[2])])
+        return operations
+
+    def flush(self):
+        operations = self._coalesce()
+        self.operations = []
+        for operation in operations:
+            if operation[0] == "read":
+                _, addr, length, futures = operation
+                data = self.comm.read(addr, length)
+                for future in futures:
+                    n = 1 if future.length is None else future.length
+                    future.datas, data = data[:n], data[n:]
+            else:
+                _, addr, data = operation
+                self.comm.write(addr, data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.flush()
+
 
 class CommUSB:
-    def __init__(self, vid=None, pid=None, max_retries=10, debug=False):
+    # read(addr, length) reads length consecutive words.
+    block_reads = True
+
+    def __init__(self, vid=None, pid=None, max_retries=10, debug=False, burst_length=1,
+        transfer_retries=5, transfer_backoff=0.01):
         self.vid = vid
         self.pid = pid
         self.debug = debug
         self.max_retries = max_retries
-        self.MAX_RECURSION_COUNT = 5
+        self.burst_length = burst_length
+        self.transfer_retries = transfer_retries
+        self.transfer_backoff = transfer_backoff
 
     def open(self):
         if hasattr(self, "dev"):
@@ -87,68 +158,73 @@ class CommUSB:
             return
         del self.dev
 
+    def batch(self):
+        return CommUSBBatch(self)
+
     def read(self, addr, length=None):
         data = []
         length_int = 1 if length is None else length
-        for i in range(length_int):
-            value = self.usb_read(addr)
+        for offset in range(0, length_int, self.burst_length):
+            size = min(length_int - offset, self.burst_length)
+            values = self.usb_read(addr + 4*offset, size)
             # Note that sometimes, the value ends up as None when the device
             # disconnects during a transaction.  Paper over this fact by
             # replacing it with a sentinal.
-            if value is None:
-                value = 0xffffffff
+            if values is None:
+                values = [0xffffffff]*size
             if self.debug:
-                print("read {:08x} @ {:08x}".format(value, addr))
-            if length is None:
-                return value
-            data.append(value)
-        return data
-
-    def usb_read(self, addr, depth=0):
-        try:
-            value = self.dev.ctrl_transfer(bmRequestType=0xc3,
-                        bRequest=0x00,
-                        wValue=addr & 0xffff,
-                        wIndex=(addr >> 16) & 0xffff,
-                        data_or_wLength=4)
-            if value is None:
-                raise TypeError
-            return int.from_bytes(value, byteorder="little")
-        except usb.core.USBError as e:
-            if e.errno == 13:
-                print("Access Denied. Maybe try using sudo?")
-            self.close()
-            self.open()
-            if depth < self.MAX_RECURSION_COUNT:
-                return self.usb_read(addr, depth+1)
-        except TypeError:
-            self.close()
-            self.open()
-            if depth < self.MAX_RECURSION_COUNT:
-                return self.usb_read(addr, depth+1)
+                for i, value in enumerate(values):
+                    print("read {:08x} @ {:08x}".format(value, addr + 4*(offset + i)))
+            data.extend(values)
+        return data[0] if length is None else data
 
     def write(self, addr, data):
         data = data if isinstance(data, list) else [data]
-        length = len(data)
-        for i, value in enumerate(data):
-            self.usb_write(addr, value)
+        for offset in range(0, len(data), self.burst_length):
+            values = data[offset:offset + self.burst_length]
+            self.usb_write(addr + 4*offset, values)
             if self.debug:
-                print("write {:08x} @ {:08x}".format(value, addr + 4*i))
+                for i, value in enumerate(values):
+                    print("write {:08x} @ {:08x}".format(value, addr + 4*(offset + i)))
 
-    def usb_write(self, addr, value, depth=0):
-        try:
-            value = self.dev.ctrl_transfer(bmRequestType=0x43, bRequest=0x00,
+    def _transfer(self, check=None, **kwargs):
+        # Retries with an exponential backoff, re-opening the device between the tries.
+        backoff = self.transfer_backoff
+        for t in range(self.transfer_retries + 1):
+            try:
+                r = self.dev.ctrl_transfer(**kwargs)
+                if check is None or check(r):
+                    return r
+            except usb.core.USBError as e:
+                if e.errno == 13:
+                    print("Access Denied. Maybe try using sudo?")
+            except AttributeError:
+                # Device not opened (or lost).
+                pass
+            self.close()
+            if t < self.transfer_retries:
+                time.sleep(backoff)
+                backoff *= 2
+                self.open()
+        return None
+
+    def usb_read(self, addr, length=None):
+        length_int = 1 if length is None else length
+        value = self._transfer(bmRequestType=0xc3,
+                    bRequest=0x00,
                     wValue=addr & 0xffff,
                     wIndex=(addr >> 16) & 0xffff,
-                    data_or_wLength=bytes([(value >> 0) & 0xff,
-                                           (value >> 8) & 0xff,
-                                           (value >> 16) & 0xff,
-                                           (value >> 24) & 0xff]
-                                          ), timeout=None)
-        except usb.core.USBError as e:
-            if e.errno == 13:
-                print("Access Denied. Maybe try using sudo?")
-            self.close()
-            self.open()
-            if depth < self.MAX_RECURSION_COUNT:
-                return self.usb_write(addr, value, depth+1)
+                    data_or_wLength=4*length_int,
+                    check=lambda r: r is not None and len(r) == 4*length_int)
+        if value is None:
+            return None
+        values = [int.from_bytes(value[4*i:4*(i + 1)], byteorder="little") for i in range(length_int)]
+        return values[0] if length is None else values
+
+    def usb_write(self, addr, value):
+        values = value if isinstance(value, list) else [value]
+        return self._transfer(bmRequestType=0x43, bRequest=0x00,
+                    wValue=addr & 0xffff,
+                    wIndex=(addr >> 16) & 0xffff,
+                    data_or_wLength=b"".join(v.to_bytes(4, byteorder="little") for v in values),
+                    timeout=None)
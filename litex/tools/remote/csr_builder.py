@@ -2,7 +2,11 @@
 # This file is Copyright (c) 2016 Tim 'mithro' Ansell <mithro@mithis.com>
 # License: BSD
 
+import os
 import csv
+import json
+import hashlib
+import inspect
 
 
 class CSRElements:
@@ -31,10 +35,7 @@ class CSRRegister:
         self.data_width = data_width
         self.mode = mode
 
-    def read(self):
-        if self.mode not in ["rw", "ro"]:
-            raise KeyError(self.name + "register not readable")
-        datas = self.readfn(self.addr, length=self.length)
+    def decode(self, datas):
         if isinstance(datas, int):
             return datas
         else:
@@ -44,13 +45,61 @@ class CSRRegister:
                 data |= datas[i]
             return data
 
+    async def _decode_async(self, datas):
+        return self.decode(await datas)
+
+    def read(self):
+        """Read the register, returns an awaitable with an asyncio readfn."""
+        if self.mode not in ["rw", "ro"]:
+            raise KeyError(self.name + "register not readable")
+        datas = self.readfn(self.addr, length=self.length)
+        if inspect.isawaitable(datas):
+            return self._decode_async(datas)
+        return self.decode(datas)
+
     def write(self, value):
+        """Write the register, returns an awaitable with an asyncio writefn."""
         if self.mode not in ["rw", "wo"]:
             raise KeyError(self.name + "register not writable")
         datas = []
         for i in range(self.length):
             datas.append((value >> ((self.length-1-i)*self.data_width)) & (2**self.data_width-1))
-        self.writefn(self.addr, datas)
+        return self.writefn(self.addr, datas)
+
+
+class CSRBank:
+    """Registers of a CSR bank, read together in a single burst
+
+    All the registers of the bank are read, including those with read side effects (ex: FIFOs
+    popped on read).
+    """
+    def __init__(self, readfn, name, registers):
+        self.readfn = readfn
+        self.name = name
+        self.registers = sorted(registers, key=lambda r: r.addr)
+        if self.registers:
+            self.addr = self.registers[0].addr
+            last = self.registers[-1]
+            self.length = (last.addr - self.addr)//4 + last.length
+
+    def decode(self, datas):
+        values = {}
+        for register in self.registers:
+            offset = (register.addr - self.addr)//4
+            values[register.name] = register.decode(datas[offset:offset + register.length])
+        return CSRElements(values)
+
+    async def _decode_async(self, datas):
+        return self.decode(await datas)
+
+    def read(self):
+        """Snapshot of the registers of the bank, returns an awaitable with an asyncio readfn."""
+        if not self.registers:
+            return CSRElements({})
+        datas = self.readfn(self.addr, length=self.length)
+        if inspect.isawaitable(datas):
+            return self._decode_async(datas)
+        return self.decode(datas)
 
 
 class CSRMemoryRegion:
@@ -77,11 +126,43 @@ class CSRBuilder:
         self.csr_data_width = csr_data_width
         self.bases = self.build_bases()
         self.regs = self.build_registers(comm.read, comm.write)
+        self.banks = self.build_banks(comm.read)
         self.mems = self.build_memories()
 
+    # Parsed CSR maps, cached in memory and in JSON files of the user's cache directory (named
+    # after the CSV path), keyed on the CSV file modification time and size.
+    csr_items_cache = {}
+    csr_items_cache_dir = os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+        "litex", "csr")
+
     @staticmethod
     def get_csr_items(csr_csv):
-        return list(csv.reader(filter(lambda row: row[0] != "#", open(csr_csv))))
+        st = os.stat(csr_csv)
+        key = [st.st_mtime_ns, st.st_size]
+        path = os.path.abspath(csr_csv)
+        cache = CSRBuilder.csr_items_cache.get(path, None)
+        if cache is not None and cache["key"] == key:
+            return cache["items"]
+        cache_file = os.path.join(CSRBuilder.csr_items_cache_dir,
+            hashlib.sha1(path.encode()).hexdigest() + ".json")
+        try:
+            with open(cache_file, "r") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = None
+        if cache is None or cache.get("key", None) != key:
+            with open(csr_csv, "r") as f:
+                items = list(csv.reader(filter(lambda row: row[0] != "#", f)))
+            cache = {"key": key, "items": items}
+            try:
+                os.makedirs(CSRBuilder.csr_items_cache_dir, exist_ok=True)
+                with open(cache_file, "w") as f:
+                    json.dump(cache, f)
+            except OSError:
+                pass
+        CSRBuilder.csr_items_cache[path] = cache
+        return cache["items"]
 
     def build_bases(self):
         d = {}
@@ -101,6 +182,19 @@ class CSRBuilder:
                 d[name] = CSRRegister(readfn, writefn, name, addr, length, self.csr_data_width, mode)
         return CSRElements(d)
 
+    def build_banks(self, readfn):
+        # Registers are assigned to the bank with the closest base below them.
+        bases = sorted(self.bases.d.items(), key=lambda b: b[1])
+        registers = {name: [] for name, base in bases}
+        for register in self.regs.d.values():
+            owner = None
+            for name, base in bases:
+                if base <= register.addr:
+                    owner = name
+            if owner is not None:
+                registers[owner].append(register)
+        return CSRElements({name: CSRBank(readfn, name, registers[name]) for name, base in bases})
+
     def build_constants(self):
         d = {}
         for item in self.items:
@@ -61,13 +61,45 @@ def get_field_data(field, datas):
     v = merge_bytes(datas[field.byte:field.byte+math.ceil(field.width/8)])
     return (v >> field.offset) & (2**field.width-1)
 
+# Codec --------------------------------------------------------------------------------------------
+
+# Packets are encoded to/decoded from bytes with struct: the list based classes below are kept as a
+# facade over it, to_bytes/from_bytes avoid the list conversions altogether.
+
+def _header_codec(header):
+    fields = sorted(header.fields.items())
+    def encode(obj):
+        data = 0
+        for k, v in fields:
+            data |= (getattr(obj, k) & (2**v.width-1)) << (8*(header.length - v.byte - math.ceil(v.width/8)) + v.offset)
+        return data.to_bytes(header.length, byteorder="big")
+    def decode(obj, data, offset):
+        for k, v in fields:
+            setattr(obj, k, get_field_data(v, data[offset:offset+header.length]))
+    return encode, decode
+
+_encode_packet_header, _decode_packet_header = _header_codec(etherbone_packet_header)
+_encode_record_header, _decode_record_header = _header_codec(etherbone_record_header)
+
+
+def _pack_words(words):
+    return struct.pack(">{}I".format(len(words)), *words)
+
+
+def _unpack_words(data, offset, n):
+    return struct.unpack_from(">{}I".format(n), data, offset)
+
 
 class Packet(list):
     def __init__(self, init=[]):
         self.ongoing = False
         self.done = False
-        for data in init:
-            self.append(data)
+        self.extend(init)
+
+    def _take(self):
+        data = bytes(self)
+        del self[:]
+        return data
 
 
 class EtherboneWrite:
@@ -90,43 +122,35 @@ class EtherboneWrites(Packet):
     def __init__(self, init=[], base_addr=0, datas=[]):
         Packet.__init__(self, init)
         self.base_addr = base_addr
-        self.writes = []
+        self.writes = [EtherboneWrite(data) for data in datas]
         self.encoded = init != []
-        for data in datas:
-            self.add(EtherboneWrite(data))
 
     def add(self, write):
         self.writes.append(write)
 
     def get_datas(self):
-        datas = []
-        for write in self.writes:
-            datas.append(write.data)
-        return datas
+        return [write.data for write in self.writes]
+
+    def to_bytes(self):
+        return _pack_words([self.base_addr] + self.get_datas())
+
+    def _decode_from(self, data, offset, count):
+        words = _unpack_words(data, offset, count + 1)
+        self.base_addr = words[0]
+        self.writes = [EtherboneWrite(word) for word in words[1:]]
+        return offset + 4*(count + 1)
 
     def encode(self):
         if self.encoded:
             raise ValueError
-        for byte in split_bytes(self.base_addr, 4):
-            self.append(byte)
-        for write in self.writes:
-            for byte in split_bytes(write.data, 4):
-                self.append(byte)
+        self.extend(self.to_bytes())
         self.encoded = True
 
     def decode(self):
         if not self.encoded:
             raise ValueError
-        base_addr = []
-        for i in range(4):
-            base_addr.append(self.pop(0))
-        self.base_addr = merge_bytes(base_addr)
-        self.writes = []
-        while len(self) != 0:
-            write = []
-            for i in range(4):
-                write.append(self.pop(0))
-            self.writes.append(EtherboneWrite(merge_bytes(write)))
+        data = self._take()
+        self._decode_from(data, 0, len(data)//4 - 1)
         self.encoded = False
 
     def __repr__(self):
@@ -142,43 +166,35 @@ class EtherboneReads(Packet):
     def __init__(self, init=[], base_ret_addr=0, addrs=[]):
         Packet.__init__(self, init)
         self.base_ret_addr = base_ret_addr
-        self.reads = []
+        self.reads = [EtherboneRead(addr) for addr in addrs]
         self.encoded = init != []
-        for addr in addrs:
-            self.add(EtherboneRead(addr))
 
     def add(self, read):
         self.reads.append(read)
 
     def get_addrs(self):
-        addrs = []
-        for read in self.reads:
-            addrs.append(read.addr)
-        return addrs
+        return [read.addr for read in self.reads]
+
+    def to_bytes(self):
+        return _pack_words([self.base_ret_addr] + self.get_addrs())
+
+    def _decode_from(self, data, offset, count):
+        words = _unpack_words(data, offset, count + 1)
+        self.base_ret_addr = words[0]
+        self.reads = [EtherboneRead(word) for word in words[1:]]
+        return offset + 4*(count + 1)
 
     def encode(self):
         if self.encoded:
             raise ValueError
-        for byte in split_bytes(self.base_ret_addr, 4):
-            self.append(byte)
-        for read in self.reads:
-            for byte in split_bytes(read.addr, 4):
-                self.append(byte)
+        self.extend(self.to_bytes())
         self.encoded = True
 
     def decode(self):
         if not self.encoded:
             raise ValueError
-        base_ret_addr = []
-        for i in range(4):
-            base_ret_addr.append(self.pop(0))
-        self.base_ret_addr = merge_bytes(base_ret_addr)
-        self.reads = []
-        while len(self) != 0:
-            read = []
-            for i in range(4):
-                read.append(self.pop(0))
-            self.reads.append(EtherboneRead(merge_bytes(read)))
+        data = self._take()
+        self._decode_from(data, 0, len(data)//4 - 1)
         self.encoded = False
 
     def __repr__(self):
@@ -206,68 +222,70 @@ class EtherboneRecord(Packet):
         self.rcount = 0
         self.encoded = init != []
 
-
     def get_writes(self):
         if self.wcount == 0:
             return None
         else:
-            writes = []
-            for i in range((self.wcount+1)*4):
-                writes.append(self.pop(0))
+            n = (self.wcount+1)*4
+            writes = self[:n]
+            del self[:n]
             return EtherboneWrites(writes)
 
     def get_reads(self):
         if self.rcount == 0:
             return None
         else:
-            reads = []
-            for i in range((self.rcount+1)*4):
-                reads.append(self.pop(0))
+            n = (self.rcount+1)*4
+            reads = self[:n]
+            del self[:n]
             return EtherboneReads(reads)
 
+    def _decode_from(self, data, offset):
+        _decode_record_header(self, data, offset)
+        offset += etherbone_record_header.length
+        self.writes = None
+        if self.wcount:
+            self.writes = EtherboneWrites()
+            offset = self.writes._decode_from(data, offset, self.wcount)
+        self.reads = None
+        if self.rcount:
+            self.reads = EtherboneReads()
+            offset = self.reads._decode_from(data, offset, self.rcount)
+        return offset
+
     def decode(self):
         if not self.encoded:
             raise ValueError
-        header = []
-        for byte in self[:etherbone_record_header.length]:
-            header.append(self.pop(0))
-        for k, v in sorted(etherbone_record_header.fields.items()):
-            setattr(self, k, get_field_data(v, header))
-        self.writes = self.get_writes()
-        if self.writes is not None:
-            self.writes.decode()
-        self.reads = self.get_reads()
-        if self.reads is not None:
-            self.reads.decode()
+        data = self._take()
+        offset = self._decode_from(data, 0)
+        # Keep what follows the record (next records of the packet).
+        self.extend(data[offset:])
         self.encoded = False
 
     def set_writes(self, writes):
         self.wcount = len(writes.writes)
         writes.encode()
-        for byte in writes:
-            self.append(byte)
+        self.extend(writes)
 
     def set_reads(self, reads):
         self.rcount = len(reads.reads)
         reads.encode()
-        for byte in reads:
-            self.append(byte)
+        self.extend(reads)
+
+    def to_bytes(self):
+        data = []
+        if self.writes is not None:
+            self.wcount = len(self.writes.writes)
+            data.append(self.writes.to_bytes())
+        if self.reads is not None:
+            self.rcount = len(self.reads.reads)
+            data.append(self.reads.to_bytes())
+        return _encode_record_header(self) + b"".join(data)
 
     def encode(self):
         if self.encoded:
             raise ValueError
-        if self.writes is not None:
-            self.set_writes(self.writes)
-        if self.reads is not None:
-            self.set_reads(self.reads)
-        header = 0
-        for k, v in sorted(etherbone_record_header.fields.items()):
-            value = merge_bytes(split_bytes(getattr(self, k),
-                                            math.ceil(v.width/8)),
-                                            "little")
-            header += (value << v.offset+(v.byte*8))
-        for d in split_bytes(header, etherbone_record_header.length):
-            self.insert(0, d)
+        self.extend(self.to_bytes())
         self.encoded = True
 
     def __repr__(self, n=0):
@@ -300,44 +318,48 @@ class EtherbonePacket(Packet):
         self.pr = 0
         self.pf = 0
 
+    @classmethod
+    def from_bytes(cls, data):
+        packet = cls()
+        packet._decode_from(memoryview(data))
+        return packet
+
+    def _decode_from(self, data):
+        _decode_packet_header(self, data, 0)
+        offset = etherbone_packet_header.length
+        self.records = []
+        while offset < len(data):
+            record = EtherboneRecord()
+            offset = record._decode_from(data, offset)
+            self.records.append(record)
+
     def get_records(self):
         records = []
-        done = False
-        payload = self
-        while len(payload) != 0:
-            record = EtherboneRecord(payload)
-            record.decode()
+        data = self._take()
+        offset = 0
+        while offset < len(data):
+            record = EtherboneRecord()
+            offset = record._decode_from(data, offset)
             records.append(record)
-            payload = record[:]
         return records
 
     def decode(self):
         if not self.encoded:
             raise ValueError
-        header = []
-        for byte in self[:etherbone_packet_header.length]:
-            header.append(self.pop(0))
-        for k, v in sorted(etherbone_packet_header.fields.items()):
-            setattr(self, k, get_field_data(v, header))
-        self.records = self.get_records()
+        self._decode_from(self._take())
         self.encoded = False
 
     def set_records(self, records):
         for record in records:
-            record.encode()
-            for byte in record:
-                self.append(byte)
+            self.extend(record.to_bytes())
+
+    def to_bytes(self):
+        return _encode_packet_header(self) + b"".join(record.to_bytes() for record in self.records)
 
     def encode(self):
         if self.encoded:
             raise ValueError
-        self.set_records(self.records)
-        header = 0
-        for k, v in sorted(etherbone_packet_header.fields.items()):
-            value = merge_bytes(split_bytes(getattr(self, k), math.ceil(v.width/8)), "little")
-            header += (value << v.offset+(v.byte*8))
-        for d in split_bytes(header, etherbone_packet_header.length):
-            self.insert(0, d)
+        self.extend(self.to_bytes())
         self.encoded = True
 
     def __repr__(self):
@@ -360,7 +382,7 @@ class EtherboneIPC:
 
     def receive_packet(self, socket):
         header_length = etherbone_packet_header_length + etherbone_record_header_length
-        packet = bytes()
+        packet = bytearray()
         while len(packet) < header_length:
             chunk = socket.recv(header_length - len(packet))
             if len(chunk) == 0:
@@ -368,12 +390,26 @@ class EtherboneIPC:
             else:
                 packet += chunk
         wcount, rcount = struct.unpack(">BB", packet[header_length-2:])
-        counts = wcount + rcount
-        packet_size = header_length + 4*(counts + 1)
+        packet_size = header_length
+        if wcount:
+            packet_size += 4*(wcount + 1)
+        if rcount:
+            packet_size += 4*(rcount + 1)
         while len(packet) < packet_size:
             chunk = socket.recv(packet_size - len(packet))
             if len(chunk) == 0:
                 return 0
             else:
                 packet += chunk
-        return packet
+        return bytes(packet)
+
+    async def async_receive_packet(self, reader):
+        header_length = etherbone_packet_header_length + etherbone_record_header_length
+        packet = await reader.readexactly(header_length)
+        wcount, rcount = struct.unpack(">BB", packet[header_length-2:])
+        payload_length = 0
+        if wcount:
+            payload_length += 4*(wcount + 1)
+        if rcount:
+            payload_length += 4*(rcount + 1)
+        return packet + await reader.readexactly(payload_length)
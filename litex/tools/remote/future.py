@@ -0,0 +1,17 @@
+# License: BSD
+
+
+class RemoteFuture:
+    """Result of a read queued in a RemoteBatch"""
+    def __init__(self, batch, length):
+        self.batch = batch
+        self.length = length
+        self.datas = None
+
+    def done(self):
+        return self.datas is not None
+
+    def result(self):
+        if self.datas is None:
+            self.batch.flush()
+        return self.datas[0] if self.length is None else self.datas
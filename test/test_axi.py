@@ -360,3 +360,161 @@ class TestAXI(unittest.TestCase):
         dut = DUT()
         run_simulation(dut, [generator(dut)], vcd_name="toto.vcd")
         self.assertEqual(dut.errors, 0)
+
+    def axi_write(self, bus, addr, datas, id=0):
+        # Incrementing burst write, returns the response.
+        size = log2_int(bus.data_width//8)
+        yield bus.aw.valid.eq(1)
+        yield bus.aw.addr.eq(addr)
+        yield bus.aw.burst.eq(BURST_INCR)
+        yield bus.aw.len.eq(len(datas) - 1)
+        yield bus.aw.size.eq(size)
+        yield bus.aw.id.eq(id)
+        yield
+        while not (yield bus.aw.ready):
+            yield
+        yield bus.aw.valid.eq(0)
+        for i, data in enumerate(datas):
+            yield bus.w.valid.eq(1)
+            yield bus.w.data.eq(data)
+            yield bus.w.strb.eq(2**(bus.data_width//8) - 1)
+            yield bus.w.last.eq(i == len(datas) - 1)
+            yield
+            while not (yield bus.w.ready):
+                yield
+        yield bus.w.valid.eq(0)
+        yield bus.b.ready.eq(1)
+        yield
+        while not (yield bus.b.valid):
+            yield
+        resp = (yield bus.b.resp)
+        self.assertEqual((yield bus.b.id), id)
+        yield bus.b.ready.eq(0)
+        return resp
+
+    def axi_read(self, bus, addr, length, id=0):
+        # Incrementing burst read, returns (datas, resp).
+        size = log2_int(bus.data_width//8)
+        yield bus.ar.valid.eq(1)
+        yield bus.ar.addr.eq(addr)
+        yield bus.ar.burst.eq(BURST_INCR)
+        yield bus.ar.len.eq(length - 1)
+        yield bus.ar.size.eq(size)
+        yield bus.ar.id.eq(id)
+        yield
+        while not (yield bus.ar.ready):
+            yield
+        yield bus.ar.valid.eq(0)
+        yield bus.r.ready.eq(1)
+        datas = []
+        resp  = RESP_OKAY
+        while len(datas) < length:
+            yield
+            if (yield bus.r.valid):
+                datas.append((yield bus.r.data))
+                resp |= (yield bus.r.resp)
+                self.assertEqual((yield bus.r.id), id)
+                self.assertEqual((yield bus.r.last), len(datas) == length)
+        yield bus.r.ready.eq(0)
+        return datas, resp
+
+    def converter_test(self, master_data_width, slave_data_width):
+        class DUT(Module):
+            def __init__(self):
+                self.master = AXIInterface(master_data_width, id_width=4)
+                slave = AXIInterface(slave_data_width, id_width=4)
+                wb    = wishbone.Interface(slave_data_width, 32 - log2_int(slave_data_width//8))
+                self.submodules.converter    = AXIConverter(self.master, slave)
+                self.submodules.axi2wishbone = AXI2Wishbone(slave, wb)
+                self.submodules.sram         = wishbone.SRAM(1024, bus=wb)
+        dut   = DUT()
+        mask  = 2**master_data_width - 1
+        datas = [(0x0123456789abcdef*(i + 1)) & mask for i in range(8)]
+        step  = master_data_width//8
+        def generator():
+            self.assertEqual((yield from self.axi_write(dut.master, 0x100, datas, id=3)), RESP_OKAY)
+            reads, resp = yield from self.axi_read(dut.master, 0x100, len(datas), id=5)
+            self.assertEqual(reads, datas)
+            # Single beats, unaligned on the wider side.
+            reads, resp = yield from self.axi_read(dut.master, 0x100 + 3*step, 1)
+            self.assertEqual(reads, datas[3:4])
+            yield from self.axi_write(dut.master, 0x100 + 5*step, [0x5a5a5a5a])
+            reads, resp = yield from self.axi_read(dut.master, 0x100 + 4*step, 3)
+            self.assertEqual(reads, [datas[4], 0x5a5a5a5a, datas[6]])
+        run_simulation(dut, generator())
+
+    def test_axi_up_converter(self):
+        self.converter_test(32, 64)
+        self.converter_test(32, 128)
+
+    def test_axi_down_converter(self):
+        self.converter_test(64, 32)
+        self.converter_test(128, 32)
+
+    def test_axi_down_converter_long_bursts(self):
+        # Master bursts longer than 256/ratio beats are split in several slave bursts.
+        for master_data_width, length in [(64, 200), (128, 256)]:
+            class DUT(Module):
+                def __init__(self):
+                    self.master = AXIInterface(master_data_width, id_width=4)
+                    self.slave  = AXIInterface(32, id_width=4)
+                    wb = wishbone.Interface(32, 30)
+                    self.submodules.converter    = AXIDownConverter(self.master, self.slave)
+                    self.submodules.axi2wishbone = AXI2Wishbone(self.slave, wb)
+                    self.submodules.sram         = wishbone.SRAM(8192, bus=wb)
+            dut   = DUT()
+            mask  = 2**master_data_width - 1
+            datas = [(0x0123456789abcdef*(i + 1)) & mask for i in range(length)]
+            bursts = {"aw": 0, "ar": 0}
+            def generator():
+                self.assertEqual((yield from self.axi_write(dut.master, 0x0, datas, id=3)), RESP_OKAY)
+                reads, resp = yield from self.axi_read(dut.master, 0x0, length, id=5)
+                self.assertEqual((reads, resp), (datas, RESP_OKAY))
+                # Short bursts after a split one.
+                reads, resp = yield from self.axi_read(dut.master, 0x100, 4, id=2)
+                self.assertEqual(reads, datas[0x100*8//master_data_width:][:4])
+            @passive
+            def monitor():
+                while True:
+                    for name in bursts.keys():
+                        ax = getattr(dut.slave, name)
+                        if (yield ax.valid) and (yield ax.ready):
+                            self.assertLessEqual((yield ax.len), 255)
+                            bursts[name] += 1
+                    yield
+            run_simulation(dut, [generator(), monitor()])
+            chunks = -(-length*master_data_width//(32*256))
+            self.assertEqual(bursts, {"aw": chunks, "ar": chunks + 1})
+
+    def test_axi_interconnects(self):
+        class DUT(Module):
+            def __init__(self, interconnect):
+                self.masters = [AXIInterface(id_width=2) for i in range(2)]
+                slaves = []
+                for n in range(2):
+                    bus = AXIInterface(id_width=3)
+                    wb  = wishbone.Interface()
+                    sram = wishbone.SRAM(1024, bus=wb)
+                    self.submodules += AXI2Wishbone(bus, wb, base_address=0x1000*n), sram
+                    # Word addresses: sram0 @ 0x0000, sram1 @ 0x1000.
+                    slaves.append((lambda a, n=n: a[10:] == n, bus))
+                self.submodules.interconnect = interconnect(self.masters, slaves, timeout_cycles=64)
+
+        for interconnect in [AXIInterconnectShared, AXICrossbar]:
+            dut = DUT(interconnect)
+            done = []
+            def generator(n):
+                master = dut.masters[n]
+                for base in [0x0000, 0x1000]:
+                    datas = [0x10000*n + base + i for i in range(4)]
+                    addr  = base + 0x100*n
+                    self.assertEqual((yield from self.axi_write(master, addr, datas, id=n)), RESP_OKAY)
+                    reads, resp = yield from self.axi_read(master, addr, len(datas), id=n + 1)
+                    self.assertEqual((reads, resp), (datas, RESP_OKAY))
+                # Unmapped accesses.
+                self.assertEqual((yield from self.axi_write(master, 0x2000, [0, 1])), RESP_DECERR)
+                reads, resp = yield from self.axi_read(master, 0x2000, 2)
+                self.assertEqual(resp, RESP_DECERR)
+                done.append(n)
+            run_simulation(dut, [generator(0), generator(1)])
+            self.assertEqual(sorted(done), [0, 1])
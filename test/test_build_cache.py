@@ -0,0 +1,149 @@
+# License: BSD
+
+import unittest
+import os
+import tempfile
+from unittest import mock
+
+from litex.build.sim import SimPlatform
+from litex.soc.integration.builder import Builder
+from litex.soc.integration.build_cache import BuildCache
+
+
+class DummyPlatform:
+    def __init__(self):
+        self.sources = []
+        self.verilog_include_paths = []
+        self.runs = 0
+
+    def build(self, build_dir, design, run=True):
+        os.makedirs(build_dir, exist_ok=True)
+        v_file = os.path.join(build_dir, "top.v")
+        with open(v_file, "w") as f:
+            f.write("// Auto-generated by LiteX on 2020-01-01 00:00:00\n" + design)
+        self.sources = [(v_file, "verilog", "work")]
+        if run:
+            self.runs += 1
+            with open(os.path.join(build_dir, "top.bit"), "w") as f:
+                f.write("bitstream " + design)
+
+
+class DummySimPlatform(DummyPlatform, SimPlatform):
+    # run executes the simulation.
+    pass
+
+
+class TestBuildCache(unittest.TestCase):
+    def build(self, cache, platform, build_dir, design):
+        run = cache.gateware_run(platform, build_dir)
+        platform.build(build_dir, design, run=run)
+        run.done()
+        with open(os.path.join(build_dir, "top.bit")) as f:
+            return f.read()
+
+    def test_gateware(self):
+        with tempfile.TemporaryDirectory() as d:
+            cache = BuildCache(os.path.join(d, "cache"))
+            platform = DummyPlatform()
+            self.assertEqual(self.build(cache, platform, os.path.join(d, "a"), "a"), "bitstream a")
+            self.assertEqual(self.build(cache, platform, os.path.join(d, "a"), "b"), "bitstream b")
+            self.assertEqual(platform.runs, 2)
+            # Same inputs: outputs restored from the cache, toolchain not run.
+            self.assertEqual(self.build(cache, platform, os.path.join(d, "a"), "a"), "bitstream a")
+            self.assertEqual(self.build(cache, platform, os.path.join(d, "b"), "b"), "bitstream b")
+            self.assertEqual(self.build(cache, platform, os.path.join(d, "b"), "b"), "bitstream b")
+            self.assertEqual(platform.runs, 2)
+            run = cache.gateware_run(platform, os.path.join(d, "c"), run=False)
+            self.assertFalse(run)
+
+    def builder_build(self, platform, output_dir, cache_dir):
+        soc = mock.Mock()
+        soc.platform = platform
+        soc.cpu_type = None
+        soc.build = lambda build_dir, run=True: platform.build(build_dir, "a", run=run)
+        builder = Builder(soc, output_dir=output_dir, build_cache=cache_dir)
+        with mock.patch.object(Builder, "_generate_includes"), \
+             mock.patch.object(Builder, "_generate_csr_map"), \
+             mock.patch.object(Builder, "_generate_mem_region_map"):
+            builder.build()
+
+    def test_builder_gateware(self):
+        with tempfile.TemporaryDirectory() as d:
+            platform = DummyPlatform()
+            for i in range(2):
+                self.builder_build(platform, os.path.join(d, "build"), os.path.join(d, "cache"))
+            self.assertEqual(platform.runs, 1)
+            # Simulations are always run.
+            platform = DummySimPlatform()
+            for i in range(2):
+                self.builder_build(platform, os.path.join(d, "sim"), os.path.join(d, "cache"))
+            self.assertEqual(platform.runs, 2)
+
+    def test_software(self):
+        with tempfile.TemporaryDirectory() as d:
+            cache = BuildCache(os.path.join(d, "cache"))
+            generated_dir = os.path.join(d, "generated")
+            src_dir = os.path.join(d, "src")
+            dst_dir = os.path.join(d, "bios")
+            for directory, filename, content in [
+                (generated_dir, "csr.h", "// Auto-generated on 2020-01-01 00:00:00\n"),
+                (src_dir, "main.c", "int main(void) {}\n"),
+                (dst_dir, "bios.bin", "binary"),
+                (dst_dir, "main.d", "main.o: main.c")]:
+                os.makedirs(directory, exist_ok=True)
+                with open(os.path.join(directory, filename), "w") as f:
+                    f.write(content)
+            key = cache.software_key(generated_dir, "bios", src_dir)
+            self.assertFalse(cache.load_software(key, dst_dir))
+            cache.store_software(key, dst_dir)
+            with open(os.path.join(generated_dir, "csr.h"), "w") as f:
+                f.write("// Auto-generated on 2020-01-02 00:00:00\n")
+            self.assertEqual(cache.software_key(generated_dir, "bios", src_dir), key)
+            restored_dir = os.path.join(d, "restored")
+            self.assertTrue(cache.load_software(key, restored_dir))
+            self.assertEqual(sorted(os.listdir(restored_dir)), ["bios.bin"])
+            with open(os.path.join(src_dir, "main.c"), "w") as f:
+                f.write("int main(void) { return 0; }\n")
+            self.assertNotEqual(cache.software_key(generated_dir, "bios", src_dir), key)
+
+    def test_software_dependencies(self):
+        with tempfile.TemporaryDirectory() as d:
+            cache = BuildCache(os.path.join(d, "cache"))
+            generated_dir = os.path.join(d, "generated")
+            bin_dir = os.path.join(d, "bin")
+            src_dir = os.path.join(d, "bios")
+            libbase_dir = os.path.join(d, "libbase")
+            include_dir = os.path.join(d, "include")
+            for directory, filename, content in [
+                (generated_dir, "variables.mak", "TRIPLE=fake\n"),
+                (bin_dir, "fake-gcc", "#!/bin/sh\necho fake-gcc 1.0\n"),
+                (src_dir, "main.c", "int main(void) {}\n"),
+                (libbase_dir, "uart.c", "void uart_init(void) {}\n"),
+                (include_dir, "base.h", "#define FOO 1\n")]:
+                os.makedirs(directory, exist_ok=True)
+                with open(os.path.join(directory, filename), "w") as f:
+                    f.write(content)
+            os.chmod(os.path.join(bin_dir, "fake-gcc"), 0o755)
+            path = os.environ["PATH"]
+            os.environ["PATH"] = bin_dir + os.pathsep + path
+            try:
+                def key():
+                    return cache.software_key(generated_dir, "bios", src_dir,
+                        [libbase_dir, include_dir])
+                keys = [key()]
+                self.assertEqual(key(), keys[0])
+                # Edited dependency.
+                with open(os.path.join(libbase_dir, "uart.c"), "w") as f:
+                    f.write("void uart_init(void) { return; }\n")
+                keys.append(key())
+                # Edited shared include.
+                with open(os.path.join(include_dir, "base.h"), "w") as f:
+                    f.write("#define FOO 2\n")
+                keys.append(key())
+                # Other compiler version.
+                with open(os.path.join(bin_dir, "fake-gcc"), "w") as f:
+                    f.write("#!/bin/sh\necho fake-gcc 2.0\n")
+                keys.append(key())
+                self.assertEqual(len(set(keys)), 4)
+            finally:
+                os.environ["PATH"] = path
@@ -0,0 +1,39 @@
+# License: BSD
+
+import unittest
+import os
+import tempfile
+
+from litex.boards.platforms import arty
+from litex.build.io import CRG
+from litex.soc.integration.soc_core import SoCCore
+
+from litex.tools.litex_build_many import build_many, summary
+
+
+class BaseSoC(SoCCore):
+    def __init__(self, with_timer=True):
+        platform = arty.Platform()
+        SoCCore.__init__(self, platform, clk_freq=int(100e6), cpu_type=None, with_timer=with_timer)
+        self.submodules.crg = CRG(platform.request("clk100"))
+
+
+class TestBuildMany(unittest.TestCase):
+    def test_build_many(self):
+        variants = [
+            {"name": "timer",    "target": __name__, "soc_kwargs": {"with_timer": True}},
+            {"name": "no_timer", "target": __name__, "soc_kwargs": {"with_timer": False}},
+            {"name": "broken",   "target": __name__, "soc": "UnknownSoC"},
+        ]
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as d:
+            results = build_many(variants, d, jobs=2)
+            self.assertEqual([r["name"] for r in results], ["timer", "no_timer", "broken"])
+            self.assertEqual([r["status"] for r in results], ["ok", "ok", "failed"])
+            with open(os.path.join(d, "timer", "gateware", "top.v")) as f:
+                self.assertIn("timer_en_storage", f.read())
+            with open(os.path.join(d, "no_timer", "gateware", "top.v")) as f:
+                self.assertNotIn("timer_en_storage", f.read())
+            self.assertIn("AttributeError", results[2]["error"])
+            self.assertIn("3 variant(s), 1 failed", summary(results))
+        self.assertEqual(os.getcwd(), cwd)
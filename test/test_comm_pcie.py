@@ -0,0 +1,31 @@
+# License: BSD
+
+import unittest
+import os
+import tempfile
+from array import array
+
+from litex.tools.remote.comm_pcie import CommPCIe
+
+
+class TestCommPCIe(unittest.TestCase):
+    def test_block_access(self):
+        for aligned in [False, True]:
+            with tempfile.TemporaryDirectory() as d:
+                bar = os.path.join(d, "resource0")
+                with open(bar, "wb") as f:
+                    f.write(bytes(4096))
+                comm = CommPCIe(bar, aligned=aligned)
+                comm.open()
+                comm.write(0x10, 0x12345678)
+                comm.write_block(0x100, range(256))
+                self.assertEqual(comm.read(0x10), 0x12345678)
+                self.assertEqual(comm.read(0x10, 2), [0x12345678, 0])
+                data = comm.read_block(0x100, 256)
+                self.assertIsInstance(data, array)
+                self.assertEqual(data.tolist(), list(range(256)))
+                with self.assertRaises(ValueError):
+                    comm.read_block(4096 - 4, 2)
+                comm.close()
+                with open(bar, "rb") as f:
+                    self.assertEqual(f.read()[0x10:0x14], bytes([0x78, 0x56, 0x34, 0x12]))
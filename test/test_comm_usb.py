@@ -0,0 +1,69 @@
+# License: BSD
+
+import unittest
+
+try:
+    import usb.core
+    from litex.tools.remote.comm_usb import CommUSB
+except ImportError:
+    usb = None
+
+
+class FakeDevice:
+    """USB bridge supporting multi-word transfers, failing on the first `errors` transfers."""
+    def __init__(self, errors=0):
+        self.memory    = {}
+        self.errors    = errors
+        self.transfers = 0
+
+    def ctrl_transfer(self, bmRequestType, bRequest, wValue, wIndex, data_or_wLength, timeout=None):
+        self.transfers += 1
+        if self.errors:
+            self.errors -= 1
+            raise usb.core.USBError("error", errno=5)
+        addr = (wIndex << 16) | wValue
+        if bmRequestType == 0xc3:
+            return b"".join(self.memory.get(addr + i, 0).to_bytes(4, "little")
+                for i in range(0, data_or_wLength, 4))
+        for i in range(0, len(data_or_wLength), 4):
+            self.memory[addr + i] = int.from_bytes(data_or_wLength[i:i+4], "little")
+
+
+@unittest.skipIf(usb is None, "pyusb not available")
+class TestCommUSB(unittest.TestCase):
+    def comm(self, device, **kwargs):
+        comm = CommUSB(transfer_backoff=0, **kwargs)
+        comm.dev = device
+        comm.open = lambda: setattr(comm, "dev", device)
+        return comm
+
+    def test_read_write(self):
+        for burst_length, transfers in [(1, 2048), (64, 32)]:
+            device = FakeDevice()
+            comm = self.comm(device, burst_length=burst_length)
+            comm.write(0x1000, list(range(1024)))
+            self.assertEqual(comm.read(0x1000, 1024), list(range(1024)))
+            self.assertEqual(comm.read(0x1004), 1)
+            self.assertEqual(device.transfers, transfers + 1)
+
+    def test_retry(self):
+        device = FakeDevice(errors=3)
+        comm = self.comm(device, transfer_retries=3)
+        comm.write(0x10, 0x12345678)
+        self.assertEqual(comm.read(0x10), 0x12345678)
+        device.errors = 10
+        self.assertEqual(comm.read(0x10), 0xffffffff)
+
+    def test_batch(self):
+        device = FakeDevice()
+        comm = self.comm(device, burst_length=16)
+        with comm.batch() as batch:
+            for i in range(16):
+                batch.write(0x100 + 4*i, i)
+            a = batch.read(0x100, 4)
+            b = batch.read(0x110)
+            c = batch.read(0x114, 11)
+        self.assertEqual(device.transfers, 2)
+        self.assertEqual(a.result(), [0, 1, 2, 3])
+        self.assertEqual(b.result(), 4)
+        self.assertEqual(c.result(), list(range(5, 16)))
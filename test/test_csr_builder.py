@@ -0,0 +1,126 @@
+# License: BSD
+
+import unittest
+import os
+import asyncio
+import tempfile
+from unittest import mock
+
+from litex.tools.remote.csr_builder import CSRBuilder
+from litex.tools.litex_server import RemoteServer
+from litex.tools.litex_client import AsyncRemoteClient
+
+
+csr_csv = """\
+#--------------------------------------------------------------------------------
+# Auto-generated by Migen
+#--------------------------------------------------------------------------------
+csr_base,ctrl,0x82000000,,
+csr_base,timer0,0x82002800,,
+csr_register,ctrl_reset,0x82000000,1,rw
+csr_register,ctrl_scratch,0x82000004,1,rw
+csr_register,timer0_load,0x82002800,1,rw
+csr_register,timer0_value,0x82002814,2,ro
+constant,config_csr_data_width,32,,
+memory_region,rom,0x00000000,32768,cached
+"""
+
+
+class FakeComm:
+    def __init__(self):
+        self.memory = {}
+        self.reads = 0
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def read(self, addr, length=None):
+        self.reads += 1
+        datas = [self.memory.get(addr + 4*i, 0) for i in range(1 if length is None else length)]
+        return datas[0] if length is None else datas
+
+    def write(self, addr, datas):
+        for i, data in enumerate(datas):
+            self.memory[addr + 4*i] = data
+
+
+class TestCSRBuilder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.csr_csv = os.path.join(self.directory.name, "csr.csv")
+        with open(self.csr_csv, "w") as f:
+            f.write(csr_csv)
+        self.cache_dir = os.path.join(self.directory.name, "cache")
+        self.cache_dir_patch = mock.patch.object(CSRBuilder, "csr_items_cache_dir", self.cache_dir)
+        self.cache_dir_patch.start()
+
+    def tearDown(self):
+        self.cache_dir_patch.stop()
+        self.directory.cleanup()
+
+    def test_cache(self):
+        items = CSRBuilder.get_csr_items(self.csr_csv)
+        # Nothing written next to the CSV.
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ["cache", "csr.csv"])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        self.assertIs(CSRBuilder.get_csr_items(self.csr_csv), items)
+        # Cached map from the JSON file.
+        CSRBuilder.csr_items_cache.clear()
+        self.assertEqual(CSRBuilder.get_csr_items(self.csr_csv), items)
+        # Modified CSV.
+        with open(self.csr_csv, "a") as f:
+            f.write("constant,foo,1,,\n")
+        self.assertEqual(CSRBuilder.get_csr_items(self.csr_csv)[-1], ["constant", "foo", "1", "", ""])
+
+    def test_bank_snapshot(self):
+        comm = FakeComm()
+        csrs = CSRBuilder(comm, self.csr_csv)
+        csrs.regs.timer0_load.write(0x1234)
+        comm.write(0x82002814, [0x1, 0x2])
+        snapshot = csrs.banks.timer0.read()
+        self.assertEqual(comm.reads, 1)
+        self.assertEqual(snapshot.timer0_load, 0x1234)
+        self.assertEqual(snapshot.timer0_value, 0x100000002)
+        self.assertEqual(csrs.regs.timer0_value.read(), 0x100000002)
+        self.assertEqual(sorted(csrs.banks.ctrl.read().d.keys()), ["ctrl_reset", "ctrl_scratch"])
+
+    def test_async_client(self):
+        comm = FakeComm()
+        server = RemoteServer(comm, "localhost", 0)
+        server.open()
+        server.start()
+        port = server.socket.getsockname()[1]
+
+        async def run():
+            client = AsyncRemoteClient(port=port, csr_csv=self.csr_csv)
+            await client.open()
+            await client.regs.ctrl_scratch.write(0x5678)
+            values = await asyncio.gather(*[client.read(0x82000004) for i in range(32)])
+            scratch = await client.regs.ctrl_scratch.read()
+            snapshot = await client.banks.ctrl.read()
+            await client.close()
+            return values, scratch, snapshot
+
+        values, scratch, snapshot = asyncio.new_event_loop().run_until_complete(run())
+        self.assertEqual(values, [0x5678]*32)
+        self.assertEqual(scratch, 0x5678)
+        self.assertEqual(snapshot.ctrl_scratch, 0x5678)
+
+    def test_async_client_close(self):
+        async def run():
+            # Server never replying: the read is still pending when the client is closed.
+            server = await asyncio.start_server(lambda reader, writer: None, "localhost", 0)
+            port = server.sockets[0].getsockname()[1]
+            client = AsyncRemoteClient(port=port, csr_csv=None, csr_data_width=32)
+            await client.open()
+            read = asyncio.ensure_future(client.read(0x82000004))
+            await asyncio.sleep(0.1)
+            await client.close()
+            server.close()
+            with self.assertRaises(ConnectionError):
+                await asyncio.wait_for(read, 5.0)
+
+        asyncio.new_event_loop().run_until_complete(run())
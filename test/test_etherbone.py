@@ -0,0 +1,56 @@
+# License: BSD
+
+import unittest
+
+from litex.tools.remote.etherbone import *
+
+
+packet_bytes = bytes.fromhex(
+    "4e6f114400000000"
+    "000f020000000300000000050000000604030002000000000000030000000304")
+
+
+class TestEtherbone(unittest.TestCase):
+    def packet(self):
+        writes = EtherboneRecord()
+        writes.writes = EtherboneWrites(base_addr=0x300, datas=[5, 6])
+        reads = EtherboneRecord()
+        reads.reads = EtherboneReads(addrs=[0x300, 0x304])
+        reads.rff = 1
+        reads.byte_enable = 0x3
+        packet = EtherbonePacket()
+        packet.records = [writes, reads]
+        packet.pf = 1
+        return packet
+
+    def check(self, packet):
+        self.assertEqual(packet.magic, etherbone_magic)
+        self.assertEqual(packet.pf, 1)
+        writes, reads = packet.records
+        self.assertEqual(writes.writes.base_addr, 0x300)
+        self.assertEqual(writes.writes.get_datas(), [5, 6])
+        self.assertEqual(reads.reads.get_addrs(), [0x300, 0x304])
+        self.assertEqual((reads.rff, reads.byte_enable), (1, 0x3))
+
+    def test_encode(self):
+        self.assertEqual(self.packet().to_bytes(), packet_bytes)
+        packet = self.packet()
+        packet.encode()
+        self.assertEqual(bytes(packet), packet_bytes)
+
+    def test_decode(self):
+        self.check(EtherbonePacket.from_bytes(packet_bytes))
+        packet = EtherbonePacket(packet_bytes)
+        packet.decode()
+        self.check(packet)
+
+    def test_record_facade(self):
+        record = EtherboneRecord()
+        record.set_writes(EtherboneWrites(base_addr=0x10, datas=[1, 2, 3]))
+        record.set_reads(EtherboneReads(base_ret_addr=0x20, addrs=[4]))
+        writes = record.get_writes()
+        writes.decode()
+        reads = record.get_reads()
+        reads.decode()
+        self.assertEqual((writes.base_addr, writes.get_datas()), (0x10, [1, 2, 3]))
+        self.assertEqual((reads.base_ret_addr, reads.get_addrs()), (0x20, [4]))
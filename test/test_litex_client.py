@@ -0,0 +1,86 @@
+# License: BSD
+
+import unittest
+
+from litex.tools.litex_server import RemoteServer
+from litex.tools.litex_client import RemoteClient
+
+
+class FakeComm:
+    block_reads = True
+
+    def __init__(self):
+        self.memory   = {}
+        self.accesses = []
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def read(self, addr, length=None):
+        self.accesses.append(("read", addr, 1 if length is None else length))
+        datas = [self.memory.get(addr + 4*i, 0) for i in range(1 if length is None else length)]
+        return datas[0] if length is None else datas
+
+    def write(self, addr, datas):
+        self.accesses.append(("write", addr, len(datas)))
+        for i, data in enumerate(datas):
+            self.memory[addr + 4*i] = data
+
+
+class TestRemoteBatch(unittest.TestCase):
+    def setUp(self):
+        self.comm = FakeComm()
+        self.server = RemoteServer(self.comm, "localhost", 0)
+        self.server.open()
+        self.server.start()
+        self.client = RemoteClient(port=self.server.socket.getsockname()[1], csr_csv=None,
+            csr_data_width=32)
+        self.client.open()
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_ordering(self):
+        with self.client.batch() as batch:
+            a = batch.read(0x100)
+            batch.write(0x100, 0x1234)
+            b = batch.read(0x100)
+            batch.write(0x100, [0x5678, 0x9abc])
+            c = batch.read(0x100, 2)
+        self.assertEqual((a.result(), b.result(), c.result()), (0, 0x1234, [0x5678, 0x9abc]))
+        self.assertEqual(self.comm.accesses, [("read", 0x100, 1), ("write", 0x100, 1),
+            ("read", 0x100, 1), ("write", 0x100, 2), ("read", 0x100, 2)])
+        self.assertEqual(self.client.read(0x104), 0x9abc)
+
+    def test_read_merging(self):
+        batch = self.client.batch()
+        # Scattered reads are merged in records of up to 255 reads.
+        futures = [batch.read(0x1000 + 8*i) for i in range(300)]
+        futures.append(batch.read(0x2000, 10))
+        records = [record for record, futures in batch._records()]
+        self.assertEqual([len(record.reads.reads) for record in records], [255, 55])
+        # Writes are split in records of up to 255 words.
+        batch.operations = []
+        batch.write(0x3000, list(range(600)))
+        records = [record for record, futures in batch._records()]
+        self.assertEqual([len(record.writes.writes) for record in records], [255, 255, 90])
+        self.assertEqual([record.writes.base_addr for record in records],
+            [0x3000, 0x3000 + 4*255, 0x3000 + 4*510])
+
+    def test_result_flush(self):
+        batch = self.client.batch()
+        self.assertIs(batch.batch(), batch)
+        batch.write(0x200, list(range(300)))
+        future = batch.read(0x200, 300)
+        self.assertFalse(future.done())
+        # result() sends the pending operations.
+        self.assertEqual(future.result(), list(range(300)))
+        self.assertTrue(future.done())
+        self.assertEqual(batch.operations, [])
+        with batch.batch() as nested:
+            nested.write(0x10, 1)
+            future = nested.read(0x10)
+        self.assertEqual(future.result(), 1)
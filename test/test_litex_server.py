@@ -0,0 +1,86 @@
+# License: BSD
+
+import unittest
+
+from litex.tools.remote.etherbone import EtherboneRecord, EtherboneReads, EtherboneWrites
+from litex.tools.litex_server import RemoteServer
+from litex.tools.litex_client import RemoteClient
+
+
+class FakeComm:
+    def __init__(self, block_reads=True):
+        self.block_reads = block_reads
+        self.memory   = {}
+        self.accesses = []
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def read(self, addr, length=None):
+        assert self.block_reads or length is None
+        self.accesses.append(("read", addr, 1 if length is None else length))
+        datas = [self.memory.get(addr + 4*i, addr + 4*i) for i in range(1 if length is None else length)]
+        return datas[0] if length is None else datas
+
+    def write(self, addr, datas):
+        self.accesses.append(("write", addr, len(datas)))
+        for i, data in enumerate(datas):
+            self.memory[addr + 4*i] = data
+
+
+def read_record(addrs):
+    record = EtherboneRecord()
+    record.reads = EtherboneReads(addrs=addrs)
+    return record
+
+
+def write_record(addr, datas):
+    record = EtherboneRecord()
+    record.writes = EtherboneWrites(base_addr=addr, datas=datas)
+    return record
+
+
+class TestRemoteServer(unittest.TestCase):
+    def test_execute(self):
+        comm = FakeComm()
+        server = RemoteServer(comm, "localhost", 0)
+        records = [
+            read_record([0x100, 0x104]),
+            read_record([0x108]),               # merged with the previous record
+            write_record(0x100, [1, 2]),
+            write_record(0x108, [3]),           # merged with the previous record
+            read_record([0x100 + 4*i for i in range(300)]),
+        ]
+        results = server._execute(records)
+        self.assertEqual(results[:2], [[0x100, 0x104], [0x108]])
+        self.assertEqual(results[2:4], [[], []])
+        self.assertEqual(results[4], [1, 2, 3] + [0x100 + 4*i for i in range(3, 300)])
+        self.assertEqual(comm.accesses, [
+            ("read", 0x100, 3), ("write", 0x100, 3), ("read", 0x100, 255), ("read", 0x100 + 4*255, 45)])
+
+    def test_execute_no_block_reads(self):
+        comm = FakeComm(block_reads=False)
+        server = RemoteServer(comm, "localhost", 0)
+        results = server._execute([read_record([0x100, 0x104])])
+        self.assertEqual(results, [[0x100, 0x104]])
+        self.assertEqual(comm.accesses, [("read", 0x100, 1), ("read", 0x104, 1)])
+
+    def test_clients(self):
+        comm = FakeComm()
+        server = RemoteServer(comm, "localhost", 0)
+        server.open()
+        server.start(4) # nthreads is ignored, kept for compatibility.
+        port = server.socket.getsockname()[1]
+        clients = [RemoteClient(port=port, csr_csv=None, csr_data_width=32) for i in range(2)]
+        for client in clients:
+            client.open()
+        for n, client in enumerate(clients):
+            client.write(0x1000*n, list(range(16)))
+        for n, client in enumerate(clients):
+            self.assertEqual(client.read(0x1000*n, 16), list(range(16)))
+            self.assertEqual(client.read(0x1000*n + 0x40), 0x1000*n + 0x40)
+        for client in clients:
+            client.close()
@@ -0,0 +1,137 @@
+# License: BSD
+
+import os
+import unittest
+import tempfile
+from unittest import mock
+
+from litex.tools import litex_term
+from litex.tools.litex_term import *
+
+
+def reference_crc16(data):
+    crc = 0
+    for d in data:
+        x = ((crc >> 8) ^ d) & 0xff
+        x ^= x >> 4
+        crc = ((crc << 8) ^ (x << 12) ^ (x << 5) ^ x) & 0xffff
+    return crc
+
+
+class FakeBIOS:
+    """SFL side of the BIOS: frames are processed when the host waits for a reply.
+
+    On a CRC error, the BIOS discards its input until the line is idle (`resync`) or, for older
+    BIOSes, only flushes the bytes already in its 128 bytes receive ring.
+    """
+    def __init__(self, memory_size, info=True, corrupt=[], resync=True):
+        self.memory   = bytearray(memory_size)
+        self.info     = info
+        self.resync   = resync
+        self.corrupt  = list(corrupt) # Indexes of the received frames to corrupt.
+        self.rx       = bytearray()
+        self.tx       = bytearray()
+        self.frames   = 0
+        self.timeout  = None
+
+    def write(self, data):
+        self.rx += data
+
+    def _process(self):
+        while len(self.rx) >= 4 and len(self.rx) >= 4 + self.rx[0]:
+            length = self.rx[0]
+            crc    = int.from_bytes(self.rx[1:3], "big")
+            cmd    = self.rx[3:4]
+            payload = bytes(self.rx[4:4 + length])
+            del self.rx[:4 + length]
+            index = self.frames
+            self.frames += 1
+            if index in self.corrupt:
+                crc ^= 1
+            if cmd != sfl_cmd_load_no_crc and crc != reference_crc16(cmd + payload):
+                if self.resync:
+                    self.rx.clear()
+                else:
+                    del self.rx[:128]
+                self.tx += sfl_ack_crcerror
+            elif cmd in [sfl_cmd_load, sfl_cmd_load_no_crc]:
+                address = int.from_bytes(payload[:4], "big")
+                self.memory[address:address + length - 4] = payload[4:]
+                if cmd == sfl_cmd_load:
+                    self.tx += sfl_ack_success
+            elif cmd == sfl_cmd_info and self.info:
+                self.tx += sfl_ack_success + bytes([sfl_payload_length_max])
+            else:
+                self.tx += sfl_ack_unknown
+
+    def read(self, size=1):
+        self._process()
+        data = bytes(self.tx[:size])
+        del self.tx[:size]
+        return data
+
+
+class TestLiteXTerm(unittest.TestCase):
+    def term(self, bios, **kwargs):
+        with mock.patch.object(litex_term, "Console"), mock.patch.object(litex_term.signal, "signal"):
+            term = LiteXTerm(False, None, None, None, False, False, **kwargs)
+        term.port = bios
+        return term
+
+    def upload(self, term, data):
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, "image.bin")
+            with open(filename, "wb") as f:
+                f.write(data)
+            with mock.patch("sys.stdout"):
+                return term.upload(filename, 0x100)
+
+    def test_crc16(self):
+        for n in range(64):
+            data = os.urandom(n*5)
+            self.assertEqual(crc16(data), reference_crc16(data))
+
+    def test_detect(self):
+        stream = os.urandom(1000) + sfl_magic_req + os.urandom(1000)
+        for chunk in [1, 3, len(sfl_magic_req), 100, len(stream)]:
+            term = self.term(FakeBIOS(0))
+            found = [term.detect_magic(stream[i:i + chunk]) for i in range(0, len(stream), chunk)]
+            self.assertEqual(found.count(True), 1)
+            self.assertTrue(found[(1000 + len(sfl_magic_req) - 1)//chunk])
+            self.assertLess(len(term.magic_detect_buffer), len(sfl_magic_req))
+
+    def test_negotiate(self):
+        for info, payload_length in [(True, sfl_payload_length_max), (False, sfl_payload_length)]:
+            term = self.term(FakeBIOS(0, info=info))
+            with mock.patch("sys.stdout"):
+                term.negotiate()
+            self.assertEqual(term.payload_length, payload_length)
+
+    def test_upload(self):
+        data = os.urandom(10000)
+        for kwargs, resync in [({}, False), ({"safe": True}, False), ({"window": 32}, True)]:
+            for corrupt in [[], [3, 7, 8, 20]]:
+                bios = FakeBIOS(0x100 + len(data), corrupt=corrupt, resync=resync)
+                term = self.term(bios, **kwargs)
+                term.payload_length = sfl_payload_length_max
+                self.assertEqual(self.upload(term, data), len(data))
+                self.assertEqual(bytes(bios.memory[0x100:]), data)
+                self.assertEqual(bios.rx, b"")
+                self.assertEqual(bios.tx, b"")
+
+    def test_upload_no_crc(self):
+        data = os.urandom(1000)
+        bios = FakeBIOS(0x100 + len(data))
+        with mock.patch.object(litex_term, "Console"), mock.patch.object(litex_term.signal, "signal"):
+            term = LiteXTerm(False, None, None, None, True, False)
+        term.port = bios
+        self.assertEqual(self.upload(term, data), len(data))
+        bios.read(0)
+        self.assertEqual(bytes(bios.memory[0x100:]), data)
+
+    def test_upload_error(self):
+        bios = FakeBIOS(0x1000)
+        term = self.term(bios)
+        bios.info = False
+        term.flash = True # Unknown to the fake BIOS.
+        self.assertEqual(self.upload(term, bytes(100)), None)
@@ -0,0 +1,55 @@
+# License: BSD
+
+import unittest
+import os
+import json
+import struct
+import tempfile
+
+from litex.boards.platforms import arty
+from litex.soc.integration.common import get_mem_data
+from litex.soc.integration.soc_core import SoCCore
+
+
+def reference_mem_data(regions, endianness):
+    data_size = max(int(base, 16) + os.path.getsize(filename) for filename, base in regions.items())
+    data = [0]*((data_size + 3)//4)
+    for filename, base in regions.items():
+        with open(filename, "rb") as f:
+            content = f.read()
+        content += bytes(-len(content) % 4)
+        fmt = "<I" if endianness == "little" else ">I"
+        for i in range(len(content)//4):
+            data[int(base, 16)//4 + i] = struct.unpack(fmt, content[4*i:4*i + 4])[0]
+    return data
+
+
+class TestMemData(unittest.TestCase):
+    def test_get_mem_data(self):
+        with tempfile.TemporaryDirectory() as d:
+            regions = {}
+            for name, size, base in [("a.bin", 1001, 0x000), ("b.bin", 30, 0x100), ("c.bin", 0, 0x10)]:
+                filename = os.path.join(d, name)
+                with open(filename, "wb") as f:
+                    f.write(os.urandom(size))
+                regions[filename] = "0x{:08x}".format(base)
+            regions_json = os.path.join(d, "regions.json")
+            with open(regions_json, "w") as f:
+                json.dump(regions, f)
+            a_bin = os.path.join(d, "a.bin")
+            for endianness in ["big", "little"]:
+                self.assertEqual(list(get_mem_data(regions_json, endianness)),
+                    reference_mem_data(regions, endianness))
+                self.assertEqual(list(get_mem_data(a_bin, endianness)),
+                    reference_mem_data({a_bin: "0x00000000"}, endianness))
+            self.assertEqual(get_mem_data(a_bin).itemsize, 4)
+
+    def test_rom_initialized(self):
+        with tempfile.TemporaryDirectory() as d:
+            empty = os.path.join(d, "empty.bin")
+            with open(empty, "wb") as f:
+                f.write(bytes(4))
+            for init, initialized in [([], False), (get_mem_data(empty)[:0], False), (get_mem_data(empty), True)]:
+                soc = SoCCore(arty.Platform(), clk_freq=int(100e6), cpu_type=None,
+                    integrated_rom_size=0x100, integrated_rom_init=init)
+                self.assertEqual(soc.integrated_rom_initialized, initialized)
@@ -0,0 +1,61 @@
+# License: BSD
+
+import unittest
+import os
+from unittest import mock
+
+from litex.build import tools
+
+
+class TestProvenance(unittest.TestCase):
+    def tearDown(self):
+        tools.set_reproducible(False)
+        tools.set_build_time()
+
+    def test_git_revision_cached(self):
+        revision = tools.get_litex_git_revision()
+        with mock.patch("subprocess.check_output") as check_output:
+            self.assertEqual(tools.get_litex_git_revision(), revision)
+            tools.generated_banner()
+            check_output.assert_not_called()
+
+    def test_build_time(self):
+        with mock.patch.dict(os.environ, {"SOURCE_DATE_EPOCH": "1600000000"}):
+            tools.set_build_time()
+            self.assertEqual(tools.format_build_time(), "2020-09-13 12:26:40")
+            self.assertIn(" on 2020-09-13 12:26:40\n", tools.generated_banner())
+
+    def test_soc_build_time(self):
+        from litex.boards.platforms import arty
+        from litex.soc.integration.soc_core import SoCCore
+        # Captured once per SoC: the identifier and the generated files share it.
+        for t, date in [(1600000000, "2020-09-13"), (1700000000, "2023-11-14")]:
+            with mock.patch.dict(os.environ, {"SOURCE_DATE_EPOCH": str(t)}):
+                soc = SoCCore(arty.Platform(), clk_freq=int(100e6), cpu_type=None,
+                    ident="test", ident_version=True)
+                self.assertEqual(tools.get_build_time(), t)
+                self.assertIn(date.encode(), bytes(soc.identifier.mem.init))
+
+    def test_reproducible(self):
+        tools.set_reproducible()
+        banner = tools.generated_banner("#")
+        self.assertNotIn(" on ", banner)
+        self.assertEqual(banner, tools.generated_banner("#"))
+
+    def test_reproducible_outputs(self):
+        with tools.reproducible_outputs():
+            self.assertNotIn(" on ", tools.generated_banner())
+            with tools.reproducible_outputs(False):
+                self.assertIn(" on ", tools.generated_banner())
+            self.assertTrue(tools.is_reproducible())
+        self.assertFalse(tools.is_reproducible())
+        self.assertIn(" on ", tools.generated_banner())
+
+    def test_builder_reproducible(self):
+        from litex.soc.integration.builder import Builder
+        soc = mock.Mock()
+        soc.platform.name = "dummy"
+        builder = Builder(soc, output_dir="build", reproducible=True)
+        # The setting only applies to the files generated by builder.build().
+        self.assertFalse(tools.is_reproducible())
+        self.assertTrue(builder.reproducible)
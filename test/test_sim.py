@@ -0,0 +1,269 @@
+# License: BSD
+
+import unittest
+import os
+import gzip
+import tempfile
+from functools import reduce
+from operator import or_
+
+from migen import *
+
+from litex.gen.sim import *
+
+
+class SimDUT(Module):
+    def __init__(self):
+        self.a = Signal(8)
+        self.b = Signal((8, True))
+        self.sel = Signal(2)
+        self.counter = Signal(16)
+        self.comb_out = Signal(16)
+        self.signed_out = Signal((10, True))
+        self.cat_lo = Signal(4)
+        self.cat_hi = Signal(4)
+        self.sliced = Signal(8)
+        self.array_out = Signal(8)
+        self.array_in = Array(Signal(8, reset=i) for i in range(4))
+        self.case_out = Signal(8)
+        self.mem_out = Signal(8)
+        self.reduce_out = Signal()
+        self.fsm_state = Signal(2)
+
+        # # #
+
+        self.sync += [
+            self.counter.eq(self.counter + 1),
+            Cat(self.cat_lo, self.cat_hi).eq(self.a + self.counter),
+            self.sliced[2:6].eq(self.counter[1:5]),
+            self.array_in[self.sel].eq(self.a),
+            If(self.counter[0],
+                self.fsm_state.eq(self.fsm_state + 1)
+            ).Elif(self.counter[1],
+                self.fsm_state.eq(0)
+            )
+        ]
+        self.comb += [
+            self.comb_out.eq(Cat(self.a, Replicate(self.counter[3], 8))),
+            self.signed_out.eq(self.b - self.a),
+            self.array_out.eq(self.array_in[self.sel]),
+            self.reduce_out.eq(reduce(or_, [self.counter[i] & self.a[i % 8] for i in range(16)])),
+            Case(self.fsm_state, {
+                0: self.case_out.eq(0x12),
+                1: self.case_out.eq(Mux(self.a[0], 0x34, 0x56)),
+                "default": self.case_out.eq(self.counter[8:]),
+            })
+        ]
+
+        mem = Memory(8, 16, init=[i*3 for i in range(16)])
+        port = mem.get_port(write_capable=True, async_read=True)
+        self.specials += mem, port
+        self.comb += [
+            port.adr.eq(self.counter[:4]),
+            port.we.eq(self.a[7]),
+            port.dat_w.eq(self.a),
+            self.mem_out.eq(port.dat_r),
+        ]
+
+
+def run(engine, cycles=200):
+    dut = SimDUT()
+    trace = []
+    probes = [dut.counter, dut.comb_out, dut.signed_out, dut.cat_lo, dut.cat_hi,
+        dut.sliced, dut.array_out, dut.case_out, dut.mem_out, dut.reduce_out]
+    def generator():
+        for i in range(cycles):
+            yield dut.a.eq(i*37)
+            yield dut.b.eq(i*11 - 128)
+            yield dut.sel.eq(i//3)
+            yield
+            values = []
+            for probe in probes:
+                values.append((yield probe))
+            trace.append(values)
+    run_simulation(dut, generator(), engine=engine)
+    return trace
+
+
+class TestSim(unittest.TestCase):
+    def test_engines_match(self):
+        self.assertEqual(run("interpreted"), run("compiled"))
+
+    def test_compiled_multi_clock(self):
+        def generate(engine):
+            dut = Module()
+            counters = {cd: Signal(8) for cd in ["sys", "slow"]}
+            dut.sync.sys  += counters["sys"].eq(counters["sys"] + 1)
+            dut.sync.slow += counters["slow"].eq(counters["slow"] + counters["sys"])
+            trace = []
+            def generator():
+                for i in range(64):
+                    yield
+                    trace.append(((yield counters["sys"]), (yield counters["slow"])))
+            run_simulation(dut, {"sys": generator()}, {"sys": 10, "slow": 34}, engine=engine)
+            return trace
+        self.assertEqual(generate("interpreted"), generate("compiled"))
+
+    def test_comb_propagation(self):
+        def generate(engine):
+            dut = Module()
+            a, b, c, d, e, f = [Signal(8) for i in range(6)]
+            dut.comb += [
+                # Out of order chain.
+                d.eq(c + 1),
+                c.eq(b + 1),
+                b.eq(a + 1),
+                # Statement reading its own targets.
+                If(a[0],
+                    e.eq(d),
+                    f.eq(e)
+                )
+            ]
+            trace = []
+            def generator():
+                for i in range(16):
+                    yield a.eq(i)
+                    # Comb driven signal, restored by comb logic.
+                    yield b.eq(0xff)
+                    yield
+                    trace.append(((yield b), (yield d), (yield f)))
+            run_simulation(dut, generator(), engine=engine)
+            return trace
+        for engine in ["interpreted", "compiled"]:
+            trace = generate(engine)
+            for i, (b, d, f) in enumerate(trace):
+                self.assertEqual(b, i + 1)
+                self.assertEqual(d, i + 3)
+                self.assertEqual(f, d if i & 1 else 0)
+
+    def test_quiescent_domain(self):
+        for engine in ["interpreted", "compiled"]:
+            dut = Module()
+            enable = Signal()
+            counter = Signal(8)
+            dut.sync.slow += If(enable, counter.eq(counter + 1))
+            trace = []
+            quiescent = []
+            def generator():
+                for i in range(120):
+                    yield enable.eq((i < 30) | (i >= 90))
+                    yield
+                    trace.append((yield counter))
+                    quiescent.append("slow" in sim.quiescent)
+            with Simulator(dut, generator(), {"sys": 10, "slow": 30}, engine=engine) as sim:
+                sim.run()
+            self.assertEqual(quiescent[40:90], [True]*50)
+            self.assertEqual(quiescent[100:], [False]*20)
+            self.assertEqual(trace[30:90], [trace[30]]*60)
+            self.assertEqual(trace[30], 10)
+            self.assertEqual(trace[-1], 20)
+
+    def test_vcd(self):
+        for filename in ["sim.vcd", "sim.vcd.gz"]:
+            dut = Module()
+            dut.traced = Signal(4, name_override="traced_counter")
+            dut.other = Signal(4, name_override="other_counter")
+            dut.sync += dut.traced.eq(dut.traced + 1), dut.other.eq(dut.other + 1)
+            def generator():
+                for i in range(8):
+                    yield
+            with tempfile.TemporaryDirectory() as d:
+                vcd_name = os.path.join(d, filename)
+                run_simulation(dut, generator(), vcd_name=vcd_name, vcd_filter="traced_*")
+                with (gzip.open if filename.endswith(".gz") else open)(vcd_name, "rb") as f:
+                    vcd = f.read().decode()
+            self.assertIn("$var wire 4 ! traced_counter $end", vcd)
+            self.assertNotIn("other_counter", vcd)
+            self.assertIn("#65\nb111 !\n", vcd)
+
+    def test_vcd_new_signals(self):
+        from litex.gen.sim.vcd import VCDWriter
+        for filename in ["sim.vcd", "sim.vcd.gz"]:
+            a = Signal(4, name_override="a")
+            b = Signal(4, name_override="b")
+            with tempfile.TemporaryDirectory() as d:
+                vcd_name = os.path.join(d, filename)
+                writer = VCDWriter(vcd_name, buffer_size=1)
+                writer.init([a])
+                for i in range(1, 4):
+                    writer.delay(10)
+                    writer.set(a, i)
+                # New signal: the header is rewritten before the dumped values.
+                writer.set(b, 5)
+                writer.close()
+                self.assertEqual(os.listdir(d), [filename])
+                with (gzip.open if filename.endswith(".gz") else open)(vcd_name, "rb") as f:
+                    vcd = f.read().decode()
+            header, body = vcd.split("$enddefinitions $end\n")
+            self.assertIn("$var wire 4 ! a $end", header)
+            self.assertIn("$var wire 4 \" b $end", header)
+            self.assertIn("#10\nb1 !\n#20\nb10 !\n#30\nb11 !\nb101 \"\n", body)
+
+    def test_run_sharded(self):
+        class Adder(Module):
+            def __init__(self):
+                self.a = Signal(8)
+                self.b = Signal(8)
+                self.o = Signal(9)
+                self.sync += self.o.eq(self.a + self.b)
+
+        def testbench(dut, vectors, results):
+            for a, b in vectors:
+                yield dut.a.eq(a)
+                yield dut.b.eq(b)
+                yield
+                yield
+                results.append((yield dut.o))
+
+        vectors = [(a, b) for a in range(0, 256, 7) for b in range(0, 256, 13)]
+        for nworkers in [1, 4]:
+            results = run_sharded(Adder(), testbench, vectors, nworkers=nworkers, engine="compiled")
+            self.assertEqual(results, [a + b for a, b in vectors])
+
+    def test_snapshot(self):
+        class DUT(Module):
+            def __init__(self):
+                self.value = Signal(8)
+                self.counter = Signal(16)
+                self.acc = Signal(16)
+                self.sync += self.counter.eq(self.counter + 1)
+                self.sync.slow += self.acc.eq(self.acc + self.value)
+
+        def boot(dut):
+            for i in range(50):
+                yield dut.value.eq(i)
+                yield
+
+        def scenario(dut, trace):
+            for i in range(10):
+                yield dut.value.eq(3)
+                yield
+                trace.append(((yield dut.counter), (yield dut.acc)))
+
+        clocks = {"sys": 10, "slow": 14}
+        for engine in ["interpreted", "compiled"]:
+            dut = DUT()
+            sim = Simulator(dut, boot(dut), clocks, engine=engine)
+            sim.run()
+            snapshot = sim.snapshot()
+            with tempfile.TemporaryDirectory() as d:
+                filename = os.path.join(d, "boot.ckpt")
+                snapshot.save(filename)
+                snapshot = SimulatorSnapshot.load(filename)
+
+            trace = []
+            sim.restore(snapshot, scenario(dut, trace))
+            sim.run()
+
+            restored_dut = DUT()
+            restored_trace = []
+            restored_sim = Simulator(restored_dut, [], clocks, engine=engine)
+            restored_sim.restore(snapshot, scenario(restored_dut, restored_trace))
+            restored_sim.run()
+
+            self.assertEqual(trace, restored_trace)
+            self.assertEqual(trace[0][0], 52)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            run_simulation(Module(), [], engine="unknown")
@@ -0,0 +1,44 @@
+# License: BSD
+
+import unittest
+
+from migen import *
+
+from litex.gen.fhdl import verilog
+
+
+class TestVerilog(unittest.TestCase):
+    def test_simulation_comb(self):
+        dut = Module()
+        a = Signal(4)
+        b = Signal(4)
+        c = Signal(4)
+        e = a + 1
+        dut.comb += If(a[0], b.eq(e), c.eq(e)).Else(c.eq(2))
+        v = str(verilog.convert(dut, ios={a, b, c}, regular_comb=False, dummy_signal=False))
+        self.assertIn(
+            "always @(*) begin\n"
+            "\tb <= 4'd0;\n"
+            "\tif (a[0]) begin\n"
+            "\t\tb <= (a + 1'd1);\n"
+            "\tend else begin\n"
+            "\tend\n"
+            "end\n", v)
+        self.assertIn(
+            "\tif (a[0]) begin\n"
+            "\t\tc <= (a + 1'd1);\n"
+            "\tend else begin\n"
+            "\t\tc <= 2'd2;\n"
+            "\tend\n", v)
+
+    def test_regular_comb(self):
+        dut = Module()
+        a = Signal(4)
+        b = Signal(4)
+        c = Signal(4)
+        dut.comb += b.eq(a + 1)
+        dut.sync += c.eq(b)
+        v = str(verilog.convert(dut, ios={a, b, c}))
+        self.assertIn("assign b = (a + 1'd1);\n", v)
+        self.assertIn("always @(posedge sys_clk) begin\n\tc <= b;\n", v)
+        self.assertIn("endmodule\n", v)
@@ -0,0 +1,371 @@
+# License: BSD
+
+import unittest
+import random
+
+from migen import *
+
+from litex.soc.interconnect import wishbone
+
+
+class InterconnectDUT(Module):
+    def __init__(self, interconnect):
+        self.masters = [wishbone.Interface() for i in range(2)]
+        self.srams   = [wishbone.SRAM(256) for i in range(3)]
+        self.submodules += self.srams
+        # Word addresses: sram0 @ 0x000, sram1 @ 0x100, sram2 @ 0x200.
+        slaves = [(lambda a, n=n: a[8:] == n, sram.bus) for n, sram in enumerate(self.srams)]
+        if interconnect == "shared":
+            self.submodules.interconnect = wishbone.InterconnectShared(self.masters, slaves,
+                register=True, timeout_cycles=32)
+        elif interconnect == "crossbar":
+            self.submodules.interconnect = wishbone.Crossbar(self.masters, slaves,
+                register=True, timeout_cycles=32)
+        elif interconnect == "hybrid":
+            self.submodules.interconnect = wishbone.InterconnectHybrid(self.masters,
+                [[slaves[0]], slaves[1:]], register=True, timeout_cycles=32)
+
+
+class TestWishbone(unittest.TestCase):
+    def run_masters(self, interconnect, accesses):
+        # accesses: list (per master) of (adr, dat) writes, read back afterwards.
+        dut = InterconnectDUT(interconnect)
+        reads = [[] for master in dut.masters]
+        elapsed = []
+
+        def generator(n):
+            master = dut.masters[n]
+            for adr, dat in accesses[n]:
+                yield from master.write(adr, dat)
+            for adr, dat in accesses[n]:
+                reads[n].append((yield from master.read(adr)))
+
+        def timed(n):
+            # Forwards the commands (and their results) of the generator, counting the cycles.
+            cycles = 0
+            gen    = generator(n)
+            result = None
+            try:
+                while True:
+                    command = gen.send(result)
+                    cycles += command is None
+                    result = yield command
+            except StopIteration:
+                elapsed.append(cycles)
+
+        run_simulation(dut, [timed(0), timed(1)])
+        return reads, max(elapsed)
+
+    def test_interconnects(self):
+        accesses = [
+            [(0x000 + i, 0x1000 + i) for i in range(16)],
+            [(0x100 + i, 0x2000 + i) for i in range(16)],
+        ]
+        results = {}
+        for interconnect in ["shared", "crossbar", "hybrid"]:
+            reads, elapsed = self.run_masters(interconnect, accesses)
+            self.assertEqual(reads[0], [dat for adr, dat in accesses[0]])
+            self.assertEqual(reads[1], [dat for adr, dat in accesses[1]])
+            results[interconnect] = elapsed
+        # Masters accessing different slaves are not serialized.
+        self.assertLess(results["crossbar"], results["shared"])
+        self.assertEqual(results["hybrid"], results["crossbar"])
+
+    def test_crossbar_timeout(self):
+        for interconnect in ["crossbar", "hybrid"]:
+            reads, elapsed = self.run_masters(interconnect, [[(0x300, 0x1234)], [(0x200, 0x5678)]])
+            self.assertEqual(reads, [[0xffffffff], [0x5678]])
+
+    def burst(self, bus, adr, writes=None, length=None, wait_states=[]):
+        # Incrementing burst with registered feedback cycles, returns (reads, cycles). The master
+        # inserts a wait state (stb low) after the beats listed in wait_states.
+        reads  = []
+        cycles = 0
+        length = len(writes) if writes is not None else length
+        yield bus.cyc.eq(1)
+        yield bus.stb.eq(1)
+        yield bus.we.eq(writes is not None)
+        yield bus.sel.eq(2**len(bus.sel) - 1)
+        for i in range(length):
+            yield bus.adr.eq(adr + i)
+            if writes is not None:
+                yield bus.dat_w.eq(writes[i])
+            yield bus.cti.eq(wishbone.CTI_BURST_END if i == length - 1 else
+                wishbone.CTI_BURST_INCREMENTING)
+            yield
+            cycles += 1
+            while not (yield bus.ack):
+                yield
+                cycles += 1
+            reads.append((yield bus.dat_r))
+            if i in wait_states:
+                yield bus.stb.eq(0)
+                yield
+                cycles += 1
+                self.assertEqual((yield bus.ack), 0)
+                yield bus.stb.eq(1)
+        yield bus.cyc.eq(0)
+        yield bus.stb.eq(0)
+        yield bus.cti.eq(0)
+        yield
+        return reads, cycles
+
+    def test_sram_burst(self):
+        dut = wishbone.SRAM(256)
+        datas = [0x1000 + i for i in range(16)]
+        def generator():
+            reads, cycles = yield from self.burst(dut.bus, 0x10, writes=datas)
+            self.assertLessEqual(cycles, len(datas) + 1)
+            reads, cycles = yield from self.burst(dut.bus, 0x10, length=len(datas))
+            self.assertEqual(reads, datas)
+            self.assertLessEqual(cycles, len(datas) + 1)
+            # Wait states.
+            reads, cycles = yield from self.burst(dut.bus, 0x30, writes=datas[:4], wait_states=[1])
+            reads, cycles = yield from self.burst(dut.bus, 0x30, length=4, wait_states=[0, 1])
+            self.assertEqual(reads, datas[:4])
+            # Classic cycles still work.
+            self.assertEqual((yield from dut.bus.read(0x13)), 0x1003)
+        run_simulation(dut, generator())
+
+    def test_sram_burst_wrap(self):
+        dut = wishbone.SRAM(256, init=list(range(64)))
+        def generator():
+            # Wrap-4 burst starting at 0x0e: 0x0e, 0x0f, 0x0c, 0x0d.
+            yield dut.bus.cyc.eq(1)
+            yield dut.bus.stb.eq(1)
+            yield dut.bus.bte.eq(1)
+            reads = []
+            for i, adr in enumerate([0x0e, 0x0f, 0x0c, 0x0d]):
+                yield dut.bus.adr.eq(adr)
+                yield dut.bus.cti.eq(wishbone.CTI_BURST_END if i == 3 else
+                    wishbone.CTI_BURST_INCREMENTING)
+                yield
+                while not (yield dut.bus.ack):
+                    yield
+                reads.append((yield dut.bus.dat_r))
+            self.assertEqual(reads, [0x0e, 0x0f, 0x0c, 0x0d])
+        run_simulation(dut, generator())
+
+    def converter_test(self, master_data_width, slave_data_width):
+        class DUT(Module):
+            def __init__(self):
+                self.master = wishbone.Interface(master_data_width)
+                slave = wishbone.Interface(slave_data_width)
+                self.submodules.sram      = wishbone.SRAM(1024, bus=slave)
+                self.submodules.converter = wishbone.Converter(self.master, slave)
+        dut = DUT()
+        mask  = 2**master_data_width - 1
+        datas = [(0x0123456789abcdef*(i + 1)) & mask for i in range(16)]
+        cycles = {}
+        def generator():
+            yield from self.burst(dut.master, 0x20, writes=datas)
+            reads, cycles["burst"] = yield from self.burst(dut.master, 0x20, length=len(datas))
+            self.assertEqual(reads, datas)
+            reads, _ = yield from self.burst(dut.master, 0x23, length=2)
+            self.assertEqual(reads, datas[3:5])
+            self.assertEqual((yield from dut.master.read(0x25)), datas[5])
+        run_simulation(dut, generator())
+        return cycles["burst"]
+
+    def test_converter_burst(self):
+        # Down-conversion: a single slave burst for the whole master burst.
+        self.assertLessEqual(self.converter_test(64, 32), 2*16 + 2)
+        # Up-conversion: a refill per slave word, then a word per cycle.
+        self.assertLessEqual(self.converter_test(32, 64), 8*(2 + 3) + 1)
+
+    def test_cache_burst(self):
+        class DUT(Module):
+            def __init__(self):
+                self.master = wishbone.Interface()
+                slave = wishbone.Interface(128)
+                self.submodules.sram  = wishbone.SRAM(4096, bus=slave)
+                self.submodules.cache = wishbone.Cache(64, self.master, slave)
+        dut = DUT()
+        datas = [0x1000 + i for i in range(32)]
+        def generator():
+            yield from self.burst(dut.master, 0x40, writes=datas)
+            # Evicts the lines written above.
+            yield from self.burst(dut.master, 0x40 + 64, length=len(datas))
+            reads, cycles = yield from self.burst(dut.master, 0x40, length=len(datas))
+            self.assertEqual(reads, datas)
+            # Hits: a word per cycle.
+            reads, cycles = yield from self.burst(dut.master, 0x40, length=len(datas))
+            self.assertEqual(reads, datas)
+            self.assertLessEqual(cycles, len(datas) + 2)
+            self.assertEqual((yield from dut.master.read(0x43)), datas[3])
+        run_simulation(dut, generator())
+
+    def pipelined(self, bus, requests):
+        # Issues (adr, dat) requests (reads when dat is None) back to back, returns (reads, cycles).
+        reads  = []
+        cycles = 0
+        issued = 0
+        yield bus.cyc.eq(1)
+        yield bus.sel.eq(2**len(bus.sel) - 1)
+        while len(reads) < len(requests):
+            if issued < len(requests):
+                adr, dat = requests[issued]
+                yield bus.stb.eq(1)
+                yield bus.adr.eq(adr)
+                yield bus.we.eq(dat is not None)
+                yield bus.dat_w.eq(dat or 0)
+            else:
+                yield bus.stb.eq(0)
+            yield
+            cycles += 1
+            if issued < len(requests) and not (yield bus.stall):
+                issued += 1
+            if (yield bus.ack):
+                reads.append((yield bus.dat_r))
+        yield bus.cyc.eq(0)
+        yield bus.stb.eq(0)
+        yield
+        return reads, cycles
+
+    def test_sram_pipelined(self):
+        dut = wishbone.SRAM(256, bus=wishbone.Interface(pipelined=True))
+        datas = [0x1000 + i for i in range(16)]
+        def generator():
+            reads, cycles = yield from self.pipelined(dut.bus,
+                [(0x10 + i, data) for i, data in enumerate(datas)])
+            self.assertEqual(cycles, len(datas) + 1)
+            reads, cycles = yield from self.pipelined(dut.bus,
+                [(0x10 + i, None) for i in range(len(datas))])
+            self.assertEqual(reads, datas)
+            self.assertEqual(cycles, len(datas) + 1)
+            self.assertEqual((yield from dut.bus.read(0x13)), 0x1003)
+        run_simulation(dut, generator())
+
+    def test_pipelined_interconnects(self):
+        class DUT(Module):
+            def __init__(self, interconnect):
+                self.masters = [wishbone.Interface(pipelined=True) for i in range(2)]
+                # sram0 is pipelined, sram1 is classic (through an adapter).
+                sram0 = wishbone.SRAM(256, bus=wishbone.Interface(pipelined=True))
+                sram1 = wishbone.SRAM(256)
+                sram1_bus = wishbone.Interface(pipelined=True)
+                self.submodules += sram0, sram1, wishbone.PipelinedToClassic(sram1_bus, sram1.bus)
+                slaves = [
+                    (lambda a: a[8:] == 0, sram0.bus),
+                    (lambda a: a[8:] == 1, sram1_bus),
+                ]
+                self.submodules.interconnect = interconnect(self.masters, slaves,
+                    register=True, timeout_cycles=32)
+
+        for interconnect in [wishbone.InterconnectShared, wishbone.Crossbar]:
+            dut = DUT(interconnect)
+            results = {}
+            def generator(n):
+                # Requests alternating between the slaves.
+                adrs = [(0x000 if i%2 else 0x100) + 16*n + i for i in range(8)]
+                yield from self.pipelined(dut.masters[n], [(adr, 0x100*n + adr) for adr in adrs])
+                results[n], _ = yield from self.pipelined(dut.masters[n], [(adr, None) for adr in adrs])
+                self.assertEqual(results[n], [0x100*n + adr for adr in adrs])
+                # Timeout on unmapped address.
+                reads, _ = yield from self.pipelined(dut.masters[n], [(adrs[1], None), (0x300, None)])
+                self.assertEqual(reads, [0x100*n + adrs[1], 0xffffffff])
+            run_simulation(dut, [generator(0), generator(1)])
+            self.assertEqual(len(results), 2)
+
+    def test_classic_to_pipelined(self):
+        class DUT(Module):
+            def __init__(self):
+                self.master = wishbone.Interface()
+                self.submodules.sram = wishbone.SRAM(256, bus=wishbone.Interface(pipelined=True))
+                self.submodules.adapter = wishbone.ClassicToPipelined(self.master, self.sram.bus)
+        dut = DUT()
+        def generator():
+            for i in range(4):
+                yield from dut.master.write(0x20 + i, 0x5000 + i)
+            for i in range(4):
+                self.assertEqual((yield from dut.master.read(0x20 + i)), 0x5000 + i)
+        run_simulation(dut, generator())
+
+    def cache_test(self, accesses, ways=1, replacement="lru", cachesize=64, slave_data_width=128):
+        # Runs the (adr, dat) accesses (reads when dat is None) against a memory model, returns the
+        # number of refills.
+        class DUT(Module):
+            def __init__(self):
+                self.master = wishbone.Interface()
+                self.slave  = wishbone.Interface(slave_data_width)
+                self.submodules.sram  = wishbone.SRAM(8192, bus=self.slave)
+                self.submodules.cache = wishbone.Cache(cachesize, self.master, self.slave,
+                    ways=ways, replacement=replacement)
+        dut    = DUT()
+        model  = {}
+        counts = {"refills": 0}
+        def generator():
+            for adr, dat in accesses:
+                if dat is None:
+                    self.assertEqual((yield from dut.master.read(adr)), model.get(adr, 0))
+                else:
+                    yield from dut.master.write(adr, dat)
+                    model[adr] = dat
+        @passive
+        def monitor():
+            while True:
+                if ((yield dut.slave.cyc) & (yield dut.slave.ack) & ~(yield dut.slave.we) &
+                    ((yield dut.slave.cti) == wishbone.CTI_BURST_END)):
+                    counts["refills"] += 1
+                yield
+        run_simulation(dut, [generator(), monitor()])
+        return counts["refills"]
+
+    def test_cache_ways(self):
+        prng = random.Random(42)
+        accesses = []
+        for i in range(256):
+            adr = prng.randrange(512)
+            accesses.append((adr, prng.randrange(2**32) if prng.randrange(2) else None))
+        accesses += [(adr, None) for adr in range(512)]
+        for ways, replacement in [(1, "lru"), (2, "lru"), (4, "lru"), (4, "plru")]:
+            self.cache_test(accesses, ways, replacement)
+        self.cache_test(accesses, 2, "lru", slave_data_width=32)
+
+    def test_cache_replacement(self):
+        # 4 lines of the same set (64 words, 4 ways: 4 sets of 4 words lines).
+        lines = [0x000, 0x010, 0x020, 0x030, 0x040]
+        # Alternating accesses to 2 lines thrash the direct-mapped cache only.
+        accesses = [(0x040*(i%2), None) for i in range(16)]
+        self.assertEqual(self.cache_test(accesses, ways=1), 16)
+        self.assertEqual(self.cache_test(accesses, ways=2), 2)
+        # Line 4 replaces line 1 (least recently used) or line 2 (pseudo-LRU: the tree points to
+        # the half of the ways not accessed last, then to its least recently used way).
+        accesses = [(adr, None) for adr in lines[:4] + [lines[0], lines[4], lines[0]]]
+        for replacement, victim in [("lru", 1), ("plru", 2)]:
+            for line in lines:
+                refills = self.cache_test(accesses + [(line, None)], ways=4, replacement=replacement)
+                self.assertEqual(refills, 6 if line == lines[victim] else 5)
+
+    def test_cache_write_buffer(self):
+        class DUT(Module):
+            def __init__(self):
+                self.master = wishbone.Interface()
+                slave = wishbone.Interface(128)
+                self.submodules.sram  = wishbone.SRAM(4096, bus=slave)
+                self.submodules.cache = wishbone.Cache(64, self.master, slave, ways=2)
+        dut = DUT()
+        def generator():
+            # Dirty lines in both ways of a set.
+            for adr in [0x000, 0x020]:
+                yield from dut.master.write(adr, 0x1000 + adr)
+            # The refill starts right away when the dirty victim is evicted to the write buffer.
+            cycles = 0
+            yield dut.master.cyc.eq(1)
+            yield dut.master.stb.eq(1)
+            yield dut.master.we.eq(0)
+            yield dut.master.adr.eq(0x040)
+            yield
+            while not (yield dut.master.ack):
+                cycles += 1
+                yield
+            yield dut.master.cyc.eq(0)
+            yield dut.master.stb.eq(0)
+            yield
+            self.assertLessEqual(cycles, 6)
+            # Hits while the evicted line is written back.
+            self.assertEqual((yield from dut.master.read(0x020)), 0x1020)
+            # The evicted line is read back from the slave.
+            for adr in [0x000, 0x020, 0x040]:
+                self.assertEqual((yield from dut.master.read(adr)), 0x1000 + adr if adr < 0x40 else 0)
+        run_simulation(dut, generator())
@@ -0,0 +1,116 @@
+# License: BSD
+
+import unittest
+import random
+import struct
+
+from migen import *
+
+from litex.soc.interconnect import wishbone
+from litex.soc.interconnect import stream
+from litex.soc.interconnect.wishbonebridge import WishboneStreamingBridge
+from litex.tools.remote.comm_uart import CommUART
+
+
+class BridgeModel:
+    """Serial port replaced by a model of the bridge (and of a 4KB memory)."""
+    def __init__(self):
+        self.memory  = [0]*1024
+        self.written = bytearray()
+        self.replies = bytearray()
+        self.replied = bytearray()
+
+    def inWaiting(self):
+        return 0
+
+    def write(self, data):
+        self.written += data
+        data = bytes(data)
+        n = len(data)
+        while data:
+            cmd, length, addr = struct.unpack(">BBI", data[:6])
+            length = length or 256
+            addrs  = [addr + (0 if cmd & 0x4 else i) for i in range(length)]
+            data   = data[6:]
+            if cmd & 0x1:
+                for i, addr in enumerate(addrs):
+                    self.memory[addr] = struct.unpack(">I", data[4*i:4*i+4])[0]
+                data = data[4*length:]
+            else:
+                reply = struct.pack(">{}I".format(length), *[self.memory[a] for a in addrs])
+                self.replies += reply
+                self.replied += reply
+        return n
+
+    def read(self, length):
+        r = bytes(self.replies[:length])
+        del self.replies[:length]
+        return r
+
+
+class TestWishboneBridge(unittest.TestCase):
+    def accesses(self, comm):
+        comm.write(0x000, list(range(1, 301)))
+        comm.write(0x800, [0xdeadbeef] + [0x12345678]*9)
+        comm.write(0xc00, list(range(16)), burst="fixed")
+        return [
+            comm.read(0x000, 300),
+            comm.read(0x800),
+            comm.read(0xc00, 3),
+            comm.read(0x004, 20, burst="fixed"),
+        ]
+
+    def comm(self, **kwargs):
+        comm = CommUART("loop://", **kwargs)
+        comm.port = BridgeModel()
+        return comm
+
+    def test_comm_uart(self):
+        for burst_length in [8, 256]:
+            comm = self.comm(burst_length=burst_length, outstanding=4)
+            reads = self.accesses(comm)
+            self.assertEqual(reads[0], list(range(1, 301)))
+            self.assertEqual(reads[1], 0xdeadbeef)
+            self.assertEqual(reads[2], [15, 0, 0])
+            self.assertEqual(reads[3], [2]*20)
+
+    def test_bridge(self):
+        comm = self.comm(burst_length=256, outstanding=6)
+        self.accesses(comm)
+        rx_bytes = comm.port.written
+        tx_bytes = []
+
+        class DUT(Module):
+            def __init__(self):
+                self.phy = phy = Module()
+                phy.source = stream.Endpoint([("data", 8)])
+                phy.sink   = stream.Endpoint([("data", 8)])
+                self.submodules.bridge = WishboneStreamingBridge(phy, clk_freq=int(1e6))
+                self.submodules.sram = wishbone.SRAM(4096)
+                self.comb += self.bridge.wishbone.connect(self.sram.bus)
+
+        def rx_generator(dut):
+            # UART-like source: bytes are presented for one cycle, without waiting for ready.
+            for b in rx_bytes:
+                yield dut.phy.source.valid.eq(1)
+                yield dut.phy.source.data.eq(b)
+                yield
+                yield dut.phy.source.valid.eq(0)
+                for i in range(random.randrange(4, 8)):
+                    yield
+            # Wait for the replies.
+            for i in range(10000):
+                yield
+
+        @passive
+        def tx_generator(dut):
+            while True:
+                yield dut.phy.sink.ready.eq(random.randrange(4) == 0)
+                yield
+                if (yield dut.phy.sink.valid) and (yield dut.phy.sink.ready):
+                    tx_bytes.append((yield dut.phy.sink.data))
+
+        random.seed(0)
+        dut = DUT()
+        run_simulation(dut, [rx_generator(dut), tx_generator(dut)])
+        self.assertEqual(bytes(tx_bytes), bytes(comm.port.replied))